@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Audio output backends for Roland S-1 Controller
+Every backend drives the same AudioEngine.audio_callback with the
+sounddevice stream contract (callback(outdata, frames, time, status),
+.start/.stop/.close, .time, .latency), so the engine runs unchanged on a
+sound card, a headless server or a CI box.
+
+  sounddevice  the sound card (PortAudio)
+  null         discards audio, paced in real time by a timer thread
+  wav          writes a WAV file (as fast as possible unless realtime=True)
+  stdout       raw interleaved PCM on stdout, for piping into an encoder
+  manual       no thread: the caller pulls blocks (tests, benchmarks)
+"""
+
+import os
+import sys
+import time
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+BACKENDS = ('sounddevice', 'null', 'wav', 'stdout', 'manual')
+
+_audio_stdout = None  # The real stdout once claimed for audio (fd 1 then points at stderr)
+
+
+def claim_stdout():
+    """
+    Keep the real stdout for raw audio and point fd 1 at stderr, so every later
+    print and terminal frame goes to stderr. Call it before anything prints.
+    Idempotent; returns the audio output.
+    """
+    global _audio_stdout
+    if _audio_stdout is None:
+        sys.stdout.flush()
+        _audio_stdout = os.fdopen(os.dup(1), 'wb', buffering=0)
+        os.dup2(2, 1)
+    return _audio_stdout
+
+
+@contextmanager
+def stdout_for_child():
+    """Point fd 1 back at the audio output while spawning a process that inherits it."""
+    if _audio_stdout is None:
+        yield
+        return
+    sys.stdout.flush()
+    os.dup2(_audio_stdout.fileno(), 1)
+    try:
+        yield
+    finally:
+        os.dup2(2, 1)
+
+
+class CallbackTime:
+    """The `time` argument of a sounddevice callback, from the stream clock."""
+
+    def __init__(self, current_time, dac_time):
+        self.currentTime = current_time
+        self.outputBufferDacTime = dac_time
+        self.inputBufferAdcTime = 0.0
+
+
+class _SoftStream:
+    """
+    Base for the software backends: one callback per block on a thread.
+    Real-time pacing uses absolute deadlines on the perf_counter clock, so
+    sleep jitter never accumulates into drift.
+    """
+
+    # Pacing clock (tests swap in a virtual one)
+    clock = staticmethod(time.perf_counter)
+    sleep = staticmethod(time.sleep)
+
+    def __init__(self, samplerate, blocksize, channels, callback, realtime=True, duration=None):
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.channels = channels
+        self.callback = callback
+        self.realtime = realtime
+        self.max_frames = int(duration * samplerate) if duration else None  # Stop after this much audio
+        self.latency = blocksize / samplerate  # One block in flight
+        self.frames = 0          # Frames delivered so far
+        self.underruns = 0       # Blocks that missed their real-time deadline
+        self.active = False
+        self._outdata = np.zeros((blocksize, channels), dtype=np.float32)
+        self._thread = None
+        self._start_time = None
+
+    @property
+    def time(self):
+        """Stream clock in seconds (same timebase as the callback's DAC times)."""
+        return self.clock()
+
+    @property
+    def finished(self):
+        return self.max_frames is not None and self.frames >= self.max_frames
+
+    def start(self):
+        if self.active:
+            return
+        self.active = True
+        self._start_time = self.clock()
+        self._thread = threading.Thread(target=self._run, name=f"{type(self).__name__}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.active = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def close(self):
+        self.stop()
+
+    def wait(self, timeout=None):
+        """Block until a duration-limited stream has delivered all its audio."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _render_block(self, dac_time, status=None):
+        frames = self.blocksize
+        if self.max_frames is not None:
+            frames = min(frames, self.max_frames - self.frames)
+        outdata = self._outdata[:frames]
+        self.callback(outdata, frames, CallbackTime(self.clock(), dac_time), status)
+        self._write(outdata)
+        self.frames += frames
+
+    def _run(self):
+        block_seconds = self.blocksize / self.samplerate
+        deadline = self._start_time
+        status = None
+        while self.active and not self.finished:
+            if self.realtime:
+                # Block n is due at start + n blocks; sleep to it (no spinning: the
+                # scheduler's wakeup jitter is far below a block and never accumulates)
+                deadline += block_seconds
+                remaining = deadline - self.clock()
+                if remaining > 0:
+                    self.sleep(remaining)
+                if self.clock() - deadline > block_seconds:
+                    # Fell more than a block behind: report it and re-anchor rather than burst
+                    self.underruns += 1
+                    status = 'output underflow'
+                    deadline = self.clock()
+                self._render_block(deadline + self.latency, status)
+                status = None
+            else:
+                self._render_block(self._start_time + self.frames / self.samplerate)
+        self._finish()
+        self.active = False
+
+    def _write(self, outdata):
+        """Deliver one rendered block."""
+
+    def _finish(self):
+        """Flush after the last block."""
+
+
+class NullStream(_SoftStream):
+    """Discards audio; the timer thread keeps callbacks at the real-time rate."""
+
+
+class WavFileStream(_SoftStream):
+    """Writes the output to a WAV file (float32 or 16-bit PCM)."""
+
+    def __init__(self, samplerate, blocksize, channels, callback, path='output.wav',
+                 subtype='PCM_16', realtime=False, duration=None):
+        super().__init__(samplerate, blocksize, channels, callback, realtime, duration)
+        self.path = path
+        self.subtype = subtype
+        self._file = None
+
+    def start(self):
+        if not self.active:
+            import soundfile as sf
+            self._file = sf.SoundFile(self.path, 'w', self.samplerate, self.channels, self.subtype)
+        super().start()
+
+    def _write(self, outdata):
+        self._file.write(outdata)
+
+    def _finish(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class StdoutStream(_SoftStream):
+    """
+    Raw interleaved PCM (s16le or f32le) on stdout.
+    The real stdout is claimed for audio when the stream is built (see
+    claim_stdout; main.py claims it before its first print), so the rest of
+    the program's prints cannot corrupt the stream.
+    """
+
+    def __init__(self, samplerate, blocksize, channels, callback, sample_format='s16le',
+                 realtime=True, duration=None, output=None):
+        super().__init__(samplerate, blocksize, channels, callback, realtime, duration)
+        if sample_format not in ('s16le', 'f32le'):
+            raise ValueError(f"Unsupported sample format: {sample_format}")
+        self.sample_format = sample_format
+        self._output = claim_stdout() if output is None else output
+        self._pcm = np.zeros((blocksize, channels), dtype='<i2' if sample_format == 's16le' else '<f4')
+
+    def _write(self, outdata):
+        pcm = self._pcm[:len(outdata)]
+        if self.sample_format == 's16le':
+            np.multiply(outdata, 32767, out=pcm, casting='unsafe')
+        else:
+            pcm[:] = outdata
+        try:
+            self._output.write(pcm.tobytes())
+        except BrokenPipeError:
+            self.active = False  # Reader went away (encoder exited)
+
+    def _finish(self):
+        try:
+            self._output.flush()
+        except (BrokenPipeError, ValueError):
+            pass
+
+
+class ManualStream(_SoftStream):
+    """No thread and no clock: render(blocks) runs the callback on the caller's thread."""
+
+    def start(self):
+        self.active = True
+        self._start_time = self.clock()
+
+    def stop(self):
+        self.active = False
+
+    def render(self, blocks):
+        """Run the callback for `blocks` blocks and return the audio ((frames, channels) float32)."""
+        audio = np.zeros((blocks * self.blocksize, self.channels), dtype=np.float32)
+        for index in range(blocks):
+            self._render_block(None)
+            audio[index * self.blocksize:(index + 1) * self.blocksize] = self._outdata
+        return audio
+
+
+def open_stream(backend, samplerate, blocksize, channels, callback, **options):
+    """Create an output stream for `backend` (started by the caller)."""
+    if backend == 'sounddevice':
+        import sounddevice as sd
+        return sd.OutputStream(samplerate=samplerate, blocksize=blocksize, channels=channels,
+                               dtype=np.float32, callback=callback, **options)
+    if backend == 'null':
+        return NullStream(samplerate, blocksize, channels, callback, **options)
+    if backend == 'wav':
+        return WavFileStream(samplerate, blocksize, channels, callback, **options)
+    if backend == 'stdout':
+        return StdoutStream(samplerate, blocksize, channels, callback, **options)
+    if backend == 'manual':
+        return ManualStream(samplerate, blocksize, channels, callback, **options)
+    raise ValueError(f"Unknown audio backend: {backend} (choose from {', '.join(BACKENDS)})")
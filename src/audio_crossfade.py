@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 """
 Audio Engine with Crossfade Looping
+Real-time crossfading loop player: renders loop seams on the fly from
+read-only decoded clips instead of pre-rendering long buffers, so it
+can stand in for the pre-render AudioEngine on low-memory hosts.
 """
 
 import sounddevice as sd
@@ -10,18 +13,29 @@ import json
 import os
 import time
 
+from loop_renderer import LoopRenderer
+from library_manifest import read_config
+
+class LoopVoice:
+    """A loop renderer and its play position, installed as one object (one reference swap)."""
+    
+    __slots__ = ('renderer', 'position')
+    
+    def __init__(self, renderer):
+        self.renderer = renderer
+        self.position = 0
+
 class CrossfadeAudioEngine:
-    """Audio engine with configurable crossfade looping."""
+    """Audio engine with configurable crossfade looping (no pre-rendered buffers)."""
     
     def __init__(self, sample_rate=44100, buffer_size=1024):
         self.sample_rate = sample_rate
         self.buffer_size = buffer_size
+        self.channels = 2  # Stereo
         
-        # Audio data and state
-        self.ambient_data = None
-        self.rhythm_data = None
-        self.ambient_position = 0
-        self.rhythm_position = 0
+        # Loop voices: renderer (read-only clip + seam precomputed at load) + position
+        self.ambient_voice = None
+        self.rhythm_voice = None
         
         # Crossfade configurations
         self.ambient_config = {"crossfade_ms": 2000, "strategy": "crossfade"}
@@ -30,31 +44,55 @@ class CrossfadeAudioEngine:
         # Volume
         self.ambient_volume = 0.5
         self.rhythm_volume = 0.5
+        self.crossfader = 0.5
+        
+        # File info (filename, crossfade_ms, filepath) - same shape as AudioEngine
+        self.current_ambient_file = None
+        self.current_rhythm_file = None
+        
+        # Preallocated callback buffers (no allocation in the audio thread)
+        self._mix = np.zeros((buffer_size, self.channels), dtype=np.float32)
+        self._chunk = np.zeros((buffer_size, self.channels), dtype=np.float32)
         
         # Playback
         self.is_playing = False
     
+    @property
+    def ambient_renderer(self):
+        voice = self.ambient_voice
+        return voice.renderer if voice else None
+    
+    @property
+    def rhythm_renderer(self):
+        voice = self.rhythm_voice
+        return voice.renderer if voice else None
+    
+    @property
+    def ambient_data(self):
+        """Decoded ambient clip (read-only)."""
+        return self.ambient_renderer.audio if self.ambient_renderer else None
+    
+    @property
+    def rhythm_data(self):
+        """Decoded rhythm clip (read-only)."""
+        return self.rhythm_renderer.audio if self.rhythm_renderer else None
+    
     def load_config(self, wav_path):
-        """Load configuration from .txt file if it exists."""
-        config_path = wav_path.replace('.wav', '.txt')
+        """Load configuration from the library manifest or .txt file if it exists."""
         default = {"crossfade_ms": 1000, "strategy": "crossfade"}
         
-        if os.path.exists(config_path):
-            try:
-                with open(config_path, 'r') as f:
-                    config = json.load(f)
-                    print(f"Loaded config: {config}")
-                    return config
-            except:
-                print(f"Error loading {config_path}, using defaults")
+        config = read_config(wav_path)
+        if config is not None:
+            print(f"Loaded config: {config}")
+            return config
         
         return default
     
-    def load_audio_file(self, filepath, track='ambient'):
-        """Load WAV file with its configuration."""
+    def load_audio_file(self, filepath, track='ambient', crossfade_ms=None):
+        """Load audio file with its configuration and build its loop renderer."""
         try:
-            # Load audio
-            data, sr = sf.read(filepath, always_2d=True)
+            # Load audio (float32: the only copy kept in memory)
+            data, sr = sf.read(filepath, dtype='float32', always_2d=True)
             
             # Resample if needed
             if sr != self.sample_rate:
@@ -71,22 +109,26 @@ class CrossfadeAudioEngine:
             
             # Load configuration
             config = self.load_config(filepath)
+            if crossfade_ms is not None:
+                config['crossfade_ms'] = crossfade_ms
             
-            # Store
+            # Fade tables (the seam) are computed here, once, not in the callback
+            crossfade_samples = int(config.get('crossfade_ms', 1000) * self.sample_rate / 1000)
+            renderer = LoopRenderer(data, crossfade_samples)
+            
+            # Store: renderer and position swap in together, so the callback
+            # sees either the old voice or the new one, never a mix of both
             if track == 'ambient':
-                self.ambient_data = data
                 self.ambient_config = config
-                self.ambient_position = 0
-                print(f"Loaded ambient: {os.path.basename(filepath)}")
-                print(f"  Duration: {len(data)/self.sample_rate:.1f}s")
-                print(f"  Crossfade: {config['crossfade_ms']}ms")
+                self.ambient_voice = LoopVoice(renderer)
             else:
-                self.rhythm_data = data
                 self.rhythm_config = config
-                self.rhythm_position = 0
-                print(f"Loaded rhythm: {os.path.basename(filepath)}")
-                print(f"  Duration: {len(data)/self.sample_rate:.1f}s")
-                print(f"  Crossfade: {config['crossfade_ms']}ms")
+                self.rhythm_voice = LoopVoice(renderer)
+            
+            print(f"Loaded {track}: {os.path.basename(filepath)}")
+            print(f"  Duration: {len(data)/self.sample_rate:.1f}s")
+            print(f"  Crossfade: {config['crossfade_ms']}ms")
+            print(f"  Memory: {renderer.nbytes / (1024 * 1024):.1f}MB")
             
             return True
             
@@ -94,71 +136,68 @@ class CrossfadeAudioEngine:
             print(f"Error loading {filepath}: {e}")
             return False
     
-    def _get_chunk_with_crossfade(self, data, position, config):
-        """Get audio chunk with crossfade at loop points."""
-        frames = self.buffer_size
-        crossfade_samples = int(config.get('crossfade_ms', 1000) * self.sample_rate / 1000)
-        
-        end_pos = position + frames
-        
-        # Normal playback (no loop needed)
-        if end_pos <= len(data):
-            return data[position:end_pos], end_pos
-        
-        # Need to loop with crossfade
-        remaining = len(data) - position
-        wrap_amount = frames - remaining
-        
-        # Get the two segments
-        end_segment = data[position:]
-        start_segment = data[:wrap_amount]
-        
-        # Apply crossfade if we have enough samples
-        if crossfade_samples > 0 and remaining >= crossfade_samples and wrap_amount >= crossfade_samples:
-            # Create fade curves
-            fade_out = np.linspace(1.0, 0.0, crossfade_samples).reshape(-1, 1)
-            fade_in = np.linspace(0.0, 1.0, crossfade_samples).reshape(-1, 1)
-            
-            # Apply fades
-            end_segment[-crossfade_samples:] *= fade_out
-            start_segment[:crossfade_samples] *= fade_in
-        
-        # Combine segments
-        chunk = np.vstack((end_segment, start_segment))
-        new_position = wrap_amount
-        
-        return chunk, new_position
+    # ===== AudioEngine-compatible control API =====
+    
+    def load_initial_ambient(self, file_info):
+        """Load ambient from a FileManager tuple (filename, crossfade_ms, filepath)."""
+        filename, crossfade_ms, filepath = file_info
+        if self.load_audio_file(filepath, 'ambient', crossfade_ms):
+            self.current_ambient_file = file_info
+            return True
+        return False
+    
+    def load_initial_rhythm(self, file_info):
+        """Load rhythm from a FileManager tuple (filename, crossfade_ms, filepath)."""
+        filename, crossfade_ms, filepath = file_info
+        if self.load_audio_file(filepath, 'rhythm', crossfade_ms):
+            self.current_rhythm_file = file_info
+            return True
+        return False
+    
+    def set_crossfader(self, amount):
+        """Set crossfader position (0.0 = ambient, 1.0 = rhythm), x^1.5 curve."""
+        self.crossfader = max(0.0, min(1.0, amount))
+        self.ambient_volume = (1.0 - self.crossfader) ** 1.5
+        self.rhythm_volume = self.crossfader ** 1.5
+    
+    def memory_bytes(self):
+        """Bytes held for playback (clips + seams)."""
+        return sum(r.nbytes for r in (self.ambient_renderer, self.rhythm_renderer) if r is not None)
+    
+    # ===== AUDIO CALLBACK =====
+    
+    def _ensure_buffers(self, frames):
+        """Grow the scratch buffers if the host asks for a larger block."""
+        if len(self._mix) < frames:
+            self._mix = np.zeros((frames, self.channels), dtype=np.float32)
+            self._chunk = np.zeros((frames, self.channels), dtype=np.float32)
     
     def audio_callback(self, outdata, frames, time, status):
-        """Audio callback with crossfade looping."""
+        """Audio callback with crossfade looping (seams may straddle blocks)."""
         if status:
             print(f"Audio status: {status}")
         
-        output = np.zeros((frames, 2), dtype=np.float32)
+        self._ensure_buffers(frames)
+        mix = self._mix[:frames]
+        chunk = self._chunk[:frames]
+        mix.fill(0.0)
         
         # Process ambient track
-        if self.ambient_data is not None:
-            chunk, new_pos = self._get_chunk_with_crossfade(
-                self.ambient_data, 
-                self.ambient_position,
-                self.ambient_config
-            )
-            self.ambient_position = new_pos
-            output += chunk * self.ambient_volume
+        voice = self.ambient_voice
+        if voice is not None and self.ambient_volume > 0:
+            voice.position = voice.renderer.render_block(chunk, voice.position)
+            chunk *= self.ambient_volume
+            mix += chunk
         
         # Process rhythm track
-        if self.rhythm_data is not None:
-            chunk, new_pos = self._get_chunk_with_crossfade(
-                self.rhythm_data,
-                self.rhythm_position,
-                self.rhythm_config
-            )
-            self.rhythm_position = new_pos
-            output += chunk * self.rhythm_volume
+        voice = self.rhythm_voice
+        if voice is not None and self.rhythm_volume > 0:
+            voice.position = voice.renderer.render_block(chunk, voice.position)
+            chunk *= self.rhythm_volume
+            mix += chunk
         
         # Clip and output
-        output = np.clip(output, -1.0, 1.0)
-        outdata[:] = output
+        np.clip(mix, -1.0, 1.0, out=outdata)
     
     def set_volumes(self, ambient_vol, rhythm_vol):
         self.ambient_volume = max(0.0, min(1.0, ambient_vol))
@@ -170,7 +209,7 @@ class CrossfadeAudioEngine:
             self.stream = sd.OutputStream(
                 samplerate=self.sample_rate,
                 blocksize=self.buffer_size,
-                channels=2,
+                channels=self.channels,
                 callback=self.audio_callback,
                 dtype=np.float32
             )
@@ -183,6 +222,10 @@ class CrossfadeAudioEngine:
             self.stream.stop()
             self.stream.close()
             print("Audio playback stopped")
+    
+    # AudioEngine-compatible names
+    start_playback = play
+    stop_playback = stop
 
 # Test function
 def test_crossfade():
@@ -1,60 +1,118 @@
 #!/usr/bin/env python3
 """
 Real Audio Engine for Roland S-1 Controller
-Now with FIXED-TIME loop crossfades (300s buffers), delay/reverb effects,
-and 4-BUFFER SYSTEM for glitch-free track switching.
+Each layer's loop is pre-rendered once with its crossfade seams into a
+buffer of whole loop periods (at least target_buffer_seconds, 150s;
+float32 or half-size int16/float16); a freshly loaded current loop plays
+from the decoded clip until that render is done, and labelled region
+loops render their seams on the fly. An N-layer mixer (current + next
+Track per layer) gives glitch-free track switching; delay/reverb effects
+load on first use.
 """
 
-import sounddevice as sd
-import soundfile as sf
 import numpy as np
-import threading
-import time
-import pedalboard  # For effects
+import weakref
+from time import perf_counter
+
+from event_queue import EventRing, EVENT_CROSSFADER, EVENT_VOLUME, EVENT_DELAY, EVENT_REVERB
+from mixer import Channel, Mixer, RegionLoop, prepare_loop, prepare_progressive, prepare_regions
+from audio_backends import open_stream
+from engine_status import EngineStatus, LayerStatus
+
+
+def _layer_attr(layer, attr):
+    """Property forwarding a legacy ambient/rhythm attribute to a mixer layer (read-only if the layer's is)."""
+    def fget(self):
+        return getattr(self.mixer[layer], attr)
+    
+    view = getattr(Channel, attr, None)
+    if isinstance(view, property) and view.fset is None:
+        return property(fget)  # Track views (buffer, file, gain...) and derived values
+    
+    def fset(self, value):
+        setattr(self.mixer[layer], attr, value)
+    
+    return property(fget, fset)
+
 
 class AudioEngine:
-    """Real audio engine with 4-buffer system for glitch-free switching."""
+    """Real audio engine: N-layer mixer with current + next buffers per layer."""
+    
+    # Two-channel names kept for the display, main loop and tools
+    current_ambient_buffer = _layer_attr('ambient', 'buffer')
+    current_rhythm_buffer = _layer_attr('rhythm', 'buffer')
+    current_ambient_buffer_position = _layer_attr('ambient', 'position')
+    current_rhythm_buffer_position = _layer_attr('rhythm', 'position')
+    next_ambient_buffer = _layer_attr('ambient', 'next_buffer')
+    next_rhythm_buffer = _layer_attr('rhythm', 'next_buffer')
+    next_ambient_buffer_position = _layer_attr('ambient', 'next_position')
+    next_rhythm_buffer_position = _layer_attr('rhythm', 'next_position')
+    current_ambient_file = _layer_attr('ambient', 'file')
+    current_rhythm_file = _layer_attr('rhythm', 'file')
+    next_ambient_file = _layer_attr('ambient', 'next_file')
+    next_rhythm_file = _layer_attr('rhythm', 'next_file')
+    ambient_crossfade_ms = _layer_attr('ambient', 'crossfade_ms')
+    rhythm_crossfade_ms = _layer_attr('rhythm', 'crossfade_ms')
+    ambient_volume = _layer_attr('ambient', 'volume')
+    rhythm_volume = _layer_attr('rhythm', 'volume')
+    ambient_gain = _layer_attr('ambient', 'gain')
+    rhythm_gain = _layer_attr('rhythm', 'gain')
+    next_ambient_gain = _layer_attr('ambient', 'next_gain')
+    next_rhythm_gain = _layer_attr('rhythm', 'next_gain')
+    rhythm_bpm = _layer_attr('rhythm', 'bpm')
+    rhythm_grid = _layer_attr('rhythm', 'grid')
+    rhythm_rate = _layer_attr('rhythm', 'rate')
     
-    def __init__(self, sample_rate=44100, buffer_size=1024):
+    def __init__(self, sample_rate=44100, buffer_size=1024, backend='sounddevice', backend_options=None,
+                 storage='float32'):
         self.sample_rate = sample_rate
         self.buffer_size = buffer_size
         self.channels = 2  # Stereo
         
-        # Audio data and positions
-        self.ambient_data = None
-        self.rhythm_data = None
+        # Output backend (audio_backends): sound card, null, wav, stdout or manual
+        self.backend = backend
+        self.backend_options = backend_options or {}
+        
+        # Audio data positions (legacy, unused by the mixer)
         self.ambient_position = 0
         self.rhythm_position = 0
-        self.ambient_crossfade_ms = 0
-        self.rhythm_crossfade_ms = 0
-        
-        # === 4-BUFFER SYSTEM ===
-        # Current playing buffers
-        self.current_ambient_buffer = None
-        self.current_rhythm_buffer = None
-        self.current_ambient_buffer_position = 0
-        self.current_rhythm_buffer_position = 0
-        
-        # Pre-loaded next buffers (ready for instant switching)
-        self.next_ambient_buffer = None
-        self.next_rhythm_buffer = None
-        self.next_ambient_buffer_position = 0
-        self.next_rhythm_buffer_position = 0
-        
-        self.target_buffer_seconds = 150  # 5 minutes fixed buffer
-        
-        # Volume controls (0.0 to 1.0)
-        self.ambient_volume = 1.0  # Start with 100% ambient
-        self.rhythm_volume = 0.0   # Start with 0% rhythm
-        
-        # File info
-        self.current_ambient_file = None  # (filename, crossfade_ms, filepath)
-        self.current_rhythm_file = None   # (filename, crossfade_ms, filepath)
-        self.next_ambient_file = None     # Next ambient ready to play
-        self.next_rhythm_file = None      # Next rhythm ready to play
+        
+        # === MIXER ===
+        # Each layer holds a current + pre-loaded next buffer for glitch-free switching
+        self.mixer = Mixer(self.channels, buffer_size)
+        self.mixer.add_channel('ambient')
+        self.mixer.add_channel('rhythm', tempo_synced=True, quantized=True)
+        self.mixer['ambient'].volume = 1.0  # Start with 100% ambient
+        self.mixer['rhythm'].volume = 0.0   # Start with 0% rhythm
+        
+        self.target_buffer_seconds = 150  # Minimum pre-rendered loop buffer (2.5 minutes)
+        self.storage = storage  # Loop buffer sample type: float32, or int16/float16 (half the memory)
+        self.progressive = True  # 'current' loads play from the clip while pre-rendering in the background
+        self.region_layers = set()  # Layers that loop labelled regions of a file (see select_region)
+        
+        # Loudness normalisation gains (precomputed per file, applied at mix time)
+        self.gain_lookup = None  # Callable: filepath -> linear gain (e.g. FileManager.get_gain)
+        self.label_lookup = None  # Callable: filepath -> Labels or None (e.g. FileManager.get_labels)
+        
+        # Pre-loaded next loops per layer (MemoryBudget drops this to 0 under critical pressure)
+        self.preload_depth = 1
+        
+        # Loaded Tracks by file: loading a file that is already in a slot shares it
+        self._tracks = weakref.WeakValueDictionary()
+        
+        # MIDI clock sync: tempo_synced layers are resampled to the S-1's tempo
+        self.tempo_source = None     # ClockTempoTracker (None = play at native speed)
         
         # Playback state
         self.is_playing = False
+        self.stream = None
+        self.output_taps = []  # Callables fed every output block (e.g. StreamServer.push); must not block
+        
+        # Sample-accurate control: events stamped in stream sample time
+        self.events = EventRing()
+        self.sample_time = 0          # Stream sample index of the next block's first frame
+        self.control_latency = None   # Seconds from a control change to it sounding (None = output latency + 1 block)
+        self._dac_anchor = None       # (outputBufferDacTime, sample_time) of the latest block
         
         # === EFFECTS SYSTEM ===
         # Crossfader position (0.0 = 100% ambient, 1.0 = 100% rhythm)
@@ -63,108 +121,180 @@ class AudioEngine:
         # Effects amounts (0.0 to 1.0)
         self.delay_amount = 0.0  # Start with delay off
         self.reverb_amount = 0.0  # Start with reverb off
+        self._delay_level = 0.0   # Amounts currently applied in the callback
+        self._reverb_level = 0.0
         
-        # Pedalboard effects
-        self.delay = pedalboard.Delay(
-            delay_seconds=0.2,  # Will be updated based on knob
-            feedback=0.3,       # Will be updated based on knob
-            mix=0.0            # Controlled by delay_amount
-        )
+        # Pedalboard effects: built the first time an effect is turned up (slow import)
+        self.delay = None
+        self.reverb = None
         
-        self.reverb = pedalboard.Reverb(
-            room_size=0.7,
-            damping=0.5,
-            wet_level=0.0,     # Controlled by reverb_amount
-            dry_level=1.0
-        )
+        # Startup timing
+        self.first_audio_at = None  # perf_counter() of the first callback
+        
+        # Callback timing (read by status_snapshot)
+        self.callback_seconds = 0.0   # Duration of the last callback
+        self.callback_count = 0       # Callbacks run; only the callback writes it (and the ring)
+        self._callback_times = np.zeros(64)  # Recent durations, slot callback_count % 64
+        self._peak_from = 0           # callback_count at the previous snapshot (status thread)
+        self.status_errors = 0        # Callbacks the backend flagged (e.g. output underflow)
         
         print(f"AudioEngine initialized: {sample_rate}Hz, buffer: {buffer_size}")
-        print(f"Fixed buffer duration: {self.target_buffer_seconds}s (1min)")
-        print(f"4-BUFFER SYSTEM: Current + Next buffers for glitch-free switching")
-        print(f"Effects system: Delay + Reverb (Pedalboard)")
+        print(f"Loop buffer duration: at least {self.target_buffer_seconds}s (whole loop periods)")
+        print(f"MIXER: {len(self.mixer)} layers, current + next buffers for glitch-free switching")
+        print(f"Effects system: Delay + Reverb (Pedalboard, loaded on first use)")
     
     # ===== EFFECTS METHODS =====
     
     def set_crossfader(self, amount):
         """Set crossfader position (0.0 to 1.0) and update volumes."""
         self.crossfader = max(0.0, min(1.0, amount))
-        self._update_volumes_from_crossfader()
+        self._schedule(EVENT_CROSSFADER, self.crossfader)
     
-    def _update_volumes_from_crossfader(self):
+    def _update_volumes_from_crossfader(self, position):
         """Calculate volumes based on crossfader position with x^1.5 curve."""
         # Ambient volume: fades from 1 to 0 as crossfader goes 0→1
-        ambient_raw = 1.0 - self.crossfader
+        ambient_raw = 1.0 - position
         self.ambient_volume = ambient_raw ** 1.5
         
         # Rhythm volume: fades from 0 to 1 as crossfader goes 0→1
-        rhythm_raw = self.crossfader
+        rhythm_raw = position
         self.rhythm_volume = rhythm_raw ** 1.5
         
         # Check if we should switch to next buffers (volume hit 0%)
         self._check_buffer_switching()
     
     def _check_buffer_switching(self):
-        """Switch to next buffers if current channel volume is 0%."""
-        # Switch ambient if volume is 0 and we have a next buffer ready
-        if self.ambient_volume == 0 and self.next_ambient_buffer is not None:
-            self._switch_to_next_ambient()
-        
-        # Switch rhythm if volume is 0 and we have a next buffer ready
-        if self.rhythm_volume == 0 and self.next_rhythm_buffer is not None:
-            self._switch_to_next_rhythm()
-    
-    def _switch_to_next_ambient(self):
-        """Switch from current ambient to pre-loaded next ambient."""
-        if self.next_ambient_buffer is None:
-            return
-        
-        print(f"🔁 Switching ambient: {self.current_ambient_file[0] if self.current_ambient_file else 'None'} → {self.next_ambient_file[0] if self.next_ambient_file else 'None'}")
-        
-        # Switch buffers
-        self.current_ambient_buffer = self.next_ambient_buffer
-        self.current_ambient_buffer_position = self.next_ambient_buffer_position
-        self.current_ambient_file = self.next_ambient_file
-        self.ambient_crossfade_ms = self.next_ambient_file[1] if self.next_ambient_file else 0
+        """Switch layers to their next buffers once their volume is 0%."""
+        for channel in self.mixer:
+            channel.check_switch(self.is_playing)
+    
+    # ===== LAYERS =====
+    
+    def add_layer(self, name, tempo_synced=False, quantized=False):
+        """Add a mixer layer (pads, textures, drums, field recordings...)."""
+        return self.mixer.add_channel(name, tempo_synced=tempo_synced, quantized=quantized)
+    
+    def set_layer_volume(self, name, volume):
+        """Set one layer's volume (0.0 to 1.0), sample-accurately while streaming."""
+        self._schedule(EVENT_VOLUME, (name, max(0.0, min(1.0, volume))))
+    
+    # ===== MEMORY =====
+    
+    def memory_inventory(self):
+        """Live (name, nbytes, residency) of every buffer, scratch and queue the engine holds."""
+        entries = self.mixer.memory_inventory()
+        entries.append(('events', self.events.nbytes, 'resident'))
+        for tap in self.output_taps:
+            owner = getattr(tap, '__self__', None)  # e.g. StreamServer.push → its block queue
+            if hasattr(owner, 'memory_inventory'):
+                entries.extend(owner.memory_inventory())
+        return entries
+    
+    def release_retired(self):
+        """Free Tracks the audio thread switched out (control thread). Returns bytes freed."""
+        return self.mixer.release_retired()
+    
+    def evict_caches(self):
+        """Free everything playback no longer references. Returns bytes freed."""
+        return self.release_retired()
+    
+    def drop_preloaded(self):
+        """Forget pre-loaded next loops that are not about to switch in. Returns bytes freed."""
+        for channel in self.mixer:
+            channel.drop_next()
+        return self.release_retired()
+    
+    # ===== STATUS =====
+    
+    def status_snapshot(self):
+        """Immutable EngineStatus of the layers, controls and callback timing (status publisher thread)."""
+        layers = []
+        for channel in self.mixer:
+            track, next_track = channel.current, channel.next  # Read once: the audio thread may switch
+            buffer = track.buffer if track is not None else None
+            loop_seconds = position_seconds = region = None
+            if buffer is not None:
+                period = buffer.period
+                loop_seconds = period / self.sample_rate
+                position_seconds = (channel.position % period) / self.sample_rate
+            if isinstance(buffer, RegionLoop) and track.labels is not None:
+                region = track.labels.descriptions[buffer.label_index(buffer.active)]
+            layers.append(LayerStatus(
+                name=channel.name,
+                filename=track.file_info[0] if track is not None and track.file_info else None,
+                next_filename=next_track.file_info[0] if next_track is not None and next_track.file_info else None,
+                crossfade_ms=track.file_info[1] if track is not None and track.file_info else 0,
+                volume=channel.volume,
+                gain=track.gain if track is not None else 1.0,
+                loop_seconds=loop_seconds,
+                position_seconds=position_seconds,
+                bpm=track.bpm if track is not None else None,
+                rate=channel.rate,
+                region=region,
+            ))
         
-        # Clear next buffer (will be re-loaded if needed)
-        self.next_ambient_buffer = None
-        self.next_ambient_file = None
+        block_seconds = self.buffer_size / self.sample_rate
+        # Worst callback since the previous snapshot, read from the duration ring: the callback
+        # never loses a write to a reset, as long as fewer than 64 blocks pass between snapshots
+        count = self.callback_count
+        ring = self._callback_times
+        recent = min(count - self._peak_from, len(ring))
+        self._peak_from = count
+        peak = max((ring[i % len(ring)] for i in range(count - recent, count)), default=0.0)
+        return EngineStatus(
+            layers=tuple(layers),
+            crossfader=self.crossfader,
+            delay_amount=self.delay_amount,
+            reverb_amount=self.reverb_amount,
+            clock_bpm=self.tempo_source.bpm if self.tempo_source is not None else None,
+            playing=self.is_playing,
+            sample_time=self.sample_time,
+            callback_load=self.callback_seconds / block_seconds if self.is_playing else None,
+            callback_peak=peak / block_seconds if self.is_playing else None,
+            status_errors=self.status_errors,
+        )
     
-    def _switch_to_next_rhythm(self):
-        """Switch from current rhythm to pre-loaded next rhythm."""
-        if self.next_rhythm_buffer is None:
+    def _ensure_effects(self):
+        """Import pedalboard and build the effects (control thread, before the first non-zero event)."""
+        if self.delay is not None:
             return
+        import pedalboard
         
-        print(f"🔁 Switching rhythm: {self.current_rhythm_file[0] if self.current_rhythm_file else 'None'} → {self.next_rhythm_file[0] if self.next_rhythm_file else 'None'}")
-        
-        # Switch buffers
-        self.current_rhythm_buffer = self.next_rhythm_buffer
-        self.current_rhythm_buffer_position = self.next_rhythm_buffer_position
-        self.current_rhythm_file = self.next_rhythm_file
-        self.rhythm_crossfade_ms = self.next_rhythm_file[1] if self.next_rhythm_file else 0
+        self.delay = pedalboard.Delay(
+            delay_seconds=0.2,  # Will be updated based on knob
+            feedback=0.3,       # Will be updated based on knob
+            mix=0.0            # Controlled by delay_amount
+        )
         
-        # Clear next buffer (will be re-loaded if needed)
-        self.next_rhythm_buffer = None
-        self.next_rhythm_file = None
+        self.reverb = pedalboard.Reverb(
+            room_size=0.7,
+            damping=0.5,
+            wet_level=0.0,     # Controlled by reverb_amount
+            dry_level=1.0
+        )
     
     def set_delay_amount(self, amount):
         """Set delay amount (0.0 to 1.0) - Roland S-1 style."""
         self.delay_amount = max(0.0, min(1.0, amount))
-        self._update_delay_params()
+        if self.delay_amount > 0:
+            self._ensure_effects()
+        self._schedule(EVENT_DELAY, self.delay_amount)
     
-    def _update_delay_params(self):
+    def _update_delay_params(self, amount):
         """Update delay parameters based on knob position (Roland S-1 style)."""
-        if self.delay_amount == 0:
+        self._delay_level = amount
+        if amount == 0:
             # Delay is off - set mix to 0
-            self.delay.mix = 0.0
+            if self.delay is not None:
+                self.delay.mix = 0.0
             return
         
         # Roland S-1 style: knob controls both time and feedback together
-        if self.delay_amount <= 0.3:
+        if amount <= 0.3:
             # Short delays (0-30% knob)
             self.delay.delay_seconds = 0.2  # 200ms
             self.delay.feedback = 0.3       # 30% feedback
-        elif self.delay_amount <= 0.7:
+        elif amount <= 0.7:
             # Medium delays (31-70% knob)
             self.delay.delay_seconds = 0.4  # 400ms
             self.delay.feedback = 0.5       # 50% feedback
@@ -174,269 +304,254 @@ class AudioEngine:
             self.delay.feedback = 0.7       # 70% feedback
         
         # Mix follows the knob position directly
-        self.delay.mix = self.delay_amount
+        self.delay.mix = amount
     
     def set_reverb_amount(self, amount):
         """Set reverb amount (0.0 to 1.0)."""
         self.reverb_amount = max(0.0, min(1.0, amount))
-        self._update_reverb_params()
+        if self.reverb_amount > 0:
+            self._ensure_effects()
+        self._schedule(EVENT_REVERB, self.reverb_amount)
     
-    def _update_reverb_params(self):
+    def _update_reverb_params(self, amount):
         """Update reverb parameters based on knob position."""
-        self.reverb.wet_level = self.reverb_amount
-        self.reverb.dry_level = 1.0 - self.reverb_amount
+        self._reverb_level = amount
+        if self.reverb is None:
+            return  # Never enabled (amount is 0)
+        self.reverb.wet_level = amount
+        self.reverb.dry_level = 1.0 - amount
     
     def _apply_effects(self, audio):
         """Apply delay and reverb effects to audio."""
         try:
-            # Apply delay if active
-            if self.delay_amount > 0:
-                audio = self.delay.process(audio, self.sample_rate)
+            # Effects stream across segments and blocks (reset=False keeps their tails)
+            if self._delay_level > 0:
+                audio = self.delay.process(audio, self.sample_rate, reset=False)
             
-            # Apply reverb if active
-            if self.reverb_amount > 0:
-                audio = self.reverb.process(audio, self.sample_rate)
+            if self._reverb_level > 0:
+                audio = self.reverb.process(audio, self.sample_rate, reset=False)
             
             return audio
         except Exception as e:
             print(f"Error applying effects: {e}")
             return audio
     
+    # ===== CONTROL EVENTS =====
+    
+    def _schedule(self, kind, value):
+        """Queue a control change for the callback, or apply it now if not streaming."""
+        if not self.is_playing:
+            self._apply_event(kind, value)
+            return
+        # Never applied from here while streaming: a full ring coalesces per control
+        key = (kind, value[0]) if kind == EVENT_VOLUME else kind
+        self.events.push(self._event_sample_time(), kind, value, key)
+    
+    def _event_sample_time(self):
+        """Stream sample time at which a change made now should sound."""
+        anchor = self._dac_anchor
+        if anchor is None or self.stream is None:
+            return self.sample_time  # No DAC clock: start of the next block
+        
+        dac_time, anchor_sample = anchor
+        latency = self.control_latency
+        if latency is None:
+            latency = self.stream.latency + self.buffer_size / self.sample_rate
+        target = self.stream.time + latency
+        return anchor_sample + int(round((target - dac_time) * self.sample_rate))
+    
+    def _apply_event(self, kind, value):
+        """Apply one control change (callback thread while streaming)."""
+        if kind == EVENT_CROSSFADER:
+            self._update_volumes_from_crossfader(value)
+        elif kind == EVENT_VOLUME:
+            name, volume = value
+            self.mixer[name].volume = volume
+            self.mixer[name].check_switch(self.is_playing)
+        elif kind == EVENT_DELAY:
+            self._update_delay_params(value)
+        elif kind == EVENT_REVERB:
+            self._update_reverb_params(value)
+    
     # ===== 4-BUFFER AUDIO CALLBACK =====
     
     def audio_callback(self, outdata, frames, time, status):
         """Callback function for real-time audio playback with 4-buffer system."""
+        started = perf_counter()
         if status:
             print(f"Audio status: {status}")
+            self.status_errors += 1
+        if self.first_audio_at is None:
+            self.first_audio_at = started
+        
+        # Anchor stream sample time to the DAC clock for event stamping
+        if time is not None and time.outputBufferDacTime:
+            self._dac_anchor = (time.outputBufferDacTime, self.sample_time)
         
         # Initialize output buffer
         output = np.zeros((frames, self.channels), dtype=np.float32)
         
-        # Mix ambient track from current buffer
-        if self.current_ambient_buffer is not None and self.ambient_volume > 0:
-            ambient_output = self._get_audio_chunk(
-                self.current_ambient_buffer, 
-                self.current_ambient_buffer_position, 
-                frames
-            )
-            self.current_ambient_buffer_position = (self.current_ambient_buffer_position + frames) % len(self.current_ambient_buffer)
-            output += ambient_output * self.ambient_volume
-        
-        # Mix rhythm track from current buffer
-        if self.current_rhythm_buffer is not None and self.rhythm_volume > 0:
-            rhythm_output = self._get_audio_chunk(
-                self.current_rhythm_buffer, 
-                self.current_rhythm_buffer_position, 
-                frames
-            )
-            self.current_rhythm_buffer_position = (self.current_rhythm_buffer_position + frames) % len(self.current_rhythm_buffer)
-            output += rhythm_output * self.rhythm_volume
-        
-        # Apply effects to mixed output
-        if self.delay_amount > 0 or self.reverb_amount > 0:
-            output = self._apply_effects(output)
+        # Split the block at event offsets: apply due events, render up to the next one
+        block_start = self.sample_time
+        offset = 0
+        while offset < frames:
+            due = self.events.peek_time()
+            while due is not None and due <= block_start + offset:
+                self._apply_event(*self.events.pop())
+                due = self.events.peek_time()
+            if due is None:
+                # Ring drained: apply what coalesced while it was full
+                event = self.events.pop_latest()
+                while event is not None:
+                    self._apply_event(*event)
+                    event = self.events.pop_latest()
+            
+            end = frames if due is None else min(frames, due - block_start)
+            output[offset:end] = self._render_segment(output[offset:end])
+            offset = end
+        self.sample_time = block_start + frames
         
         # Clip to prevent distortion
         output = np.clip(output, -1.0, 1.0)
         
         # Write to output buffer
         outdata[:] = output
+        for tap in self.output_taps:
+            tap(outdata)
+        
+        self.callback_seconds = perf_counter() - started
+        self._callback_times[self.callback_count % len(self._callback_times)] = self.callback_seconds
+        self.callback_count += 1
     
-    def _get_audio_chunk(self, buffer, position, frames):
-        """Get audio chunk from buffer, handling wrap-around."""
-        buffer_len = len(buffer)
+    def _render_segment(self, output):
+        """Mix and process one stretch of a block with constant control values."""
+        # All layers in one vectorised mix (tempo-synced layers follow the MIDI clock)
+        clock_bpm = self.tempo_source.bpm if self.tempo_source is not None else None
+        self.mixer.mix(output, clock_bpm)
         
-        if position + frames <= buffer_len:
-            # Simple case: all frames fit without wrap
-            return buffer[position:position + frames]
-        else:
-            # Need to wrap around
-            remaining = buffer_len - position
-            chunk = np.vstack((
-                buffer[position:],
-                buffer[:frames - remaining]
-            ))
-            return chunk
+        # Apply effects to mixed output
+        if self._delay_level > 0 or self._reverb_level > 0:
+            output = self._apply_effects(output)
+        return output
     
     # ===== BUFFER MANAGEMENT =====
     
     def load_initial_ambient(self, file_info):
         """Load initial ambient file into current buffer."""
-        success = self._load_audio_to_buffer(file_info, 'ambient', 'current')
-        if success:
-            self.current_ambient_file = file_info
-            self.ambient_crossfade_ms = file_info[1]
-            print(f"✅ Initial ambient loaded: {file_info[0]}")
-        return success
+        return self.load_layer('ambient', file_info, 'current')
     
     def load_initial_rhythm(self, file_info):
         """Load initial rhythm file into current buffer."""
-        success = self._load_audio_to_buffer(file_info, 'rhythm', 'current')
-        if success:
-            self.current_rhythm_file = file_info
-            self.rhythm_crossfade_ms = file_info[1]
-            print(f"✅ Initial rhythm loaded: {file_info[0]}")
-        return success
+        return self.load_layer('rhythm', file_info, 'current')
     
     def preload_next_ambient(self, file_info):
         """Pre-load next ambient file into next buffer."""
-        success = self._load_audio_to_buffer(file_info, 'ambient', 'next')
-        if success:
-            self.next_ambient_file = file_info
-            print(f"📥 Ambient pre-loaded: {file_info[0]}")
-        return success
+        return self.load_layer('ambient', file_info, 'next')
     
     def preload_next_rhythm(self, file_info):
         """Pre-load next rhythm file into next buffer."""
-        success = self._load_audio_to_buffer(file_info, 'rhythm', 'next')
-        if success:
-            self.next_rhythm_file = file_info
-            print(f"📥 Rhythm pre-loaded: {file_info[0]}")
-        return success
-    
-    def _load_audio_to_buffer(self, file_info, track_type, buffer_type):
-        """Load audio file into specified buffer."""
+        return self.load_layer('rhythm', file_info, 'next')
+    
+    def load_layer(self, name, file_info, slot='current'):
+        """Load a file into a layer's 'current' or 'next' buffer (prepare and install on this thread)."""
+        self.release_retired()  # Free switched-out Tracks before allocating a new one
+        track = self.prepare_layer(name, file_info, slot)
+        return track is not None and self.install_layer(name, slot, track)
+    
+    def prepare_layer(self, name, file_info, slot='current'):
+        """
+        Decode and pre-render a file for a layer without touching the mixer, so it
+        can run on a worker thread. Returns the Track (None if skipped or failed).
+        """
+        if slot == 'next' and self.preload_depth < 1:
+            print(f"⏸️  {name.capitalize()} pre-load skipped (memory pressure): {file_info[0]}")
+            return None
         filename, crossfade_ms, filepath = file_info
-        target = 'current' if buffer_type == 'current' else 'next'
-        print(f"Loading {track_type} to {target} buffer: {filename} (xfade: {crossfade_ms}ms)")
-        
+        print(f"Loading {name} to {slot} buffer: {filename} (xfade: {crossfade_ms}ms)")
         try:
-            # Load audio file
-            audio_data, sr = sf.read(filepath, dtype=np.float32)
-            
-            if sr != self.sample_rate:
-                print(f"Warning: File sample rate {sr}Hz doesn't match engine {self.sample_rate}Hz")
-            
-            # Ensure stereo
-            if len(audio_data.shape) == 1:
-                audio_data = np.column_stack((audio_data, audio_data))
-            
-            # Store original data
-            if track_type == 'ambient':
-                self.ambient_data = audio_data
-                self.ambient_crossfade_ms = crossfade_ms
-            else:  # rhythm
-                self.rhythm_data = audio_data
-                self.rhythm_crossfade_ms = crossfade_ms
-            
-            # Pre-render buffer
-            buffer = self._pre_render_buffer(audio_data, crossfade_ms, f"{track_type} {target}")
-            
-            # Assign to correct buffer
-            if buffer_type == 'current':
-                if track_type == 'ambient':
-                    self.current_ambient_buffer = buffer
-                    self.current_ambient_buffer_position = 0
-                else:
-                    self.current_rhythm_buffer = buffer
-                    self.current_rhythm_buffer_position = 0
-            else:  # next buffer
-                if track_type == 'ambient':
-                    self.next_ambient_buffer = buffer
-                    self.next_ambient_buffer_position = 0
-                else:
-                    self.next_rhythm_buffer = buffer
-                    self.next_rhythm_buffer_position = 0
-            
-            print(f"  → {target} buffer ready: {len(buffer) / self.sample_rate:.1f}s")
-            return True
-            
+            return self.prepare_loop(name, file_info, slot)
         except Exception as e:
             print(f"Error loading {filepath}: {e}")
             import traceback
             traceback.print_exc()
-            return False
+            return None
     
-    def _pre_render_buffer(self, audio_data, crossfade_ms, buffer_name):
-        """Create pre-rendered buffer with loop crossfades (fixed 300s length)."""
-        crossfade_samples = int((crossfade_ms / 1000.0) * self.sample_rate)
-        loop_length = len(audio_data)
-        
-        print(f"  Pre-rendering {buffer_name} buffer:")
-        print(f"    Original: {loop_length} samples ({loop_length/self.sample_rate:.2f}s)")
-        print(f"    Crossfade: {crossfade_samples} samples ({crossfade_ms}ms)")
-        
-        # Calculate how many loops fit in 300 seconds
-        target_samples = self.target_buffer_seconds * self.sample_rate
-        loops_needed = int(np.ceil(target_samples / loop_length))
-        
-        print(f"    Loops needed for {self.target_buffer_seconds}s: {loops_needed}")
-        
-        # Create crossfade window (linear ramp)
-        if crossfade_samples > 0:
-            fade_in = np.linspace(0, 1, crossfade_samples).reshape(-1, 1)
-            fade_out = np.linspace(1, 0, crossfade_samples).reshape(-1, 1)
+    def install_layer(self, name, slot, track):
+        """Install a prepared Track (control thread: also frees switched-out Tracks)."""
+        self.release_retired()
+        self.mixer[name].assign(slot, track)
+        print(f"  → {slot} buffer ready: {len(track.buffer) / self.sample_rate:.1f}s")
+        if slot == 'current':
+            print(f"✅ Initial {name} loaded: {track.file_info[0]}")
         else:
-            fade_in = np.ones((0, 1))
-            fade_out = np.ones((0, 1))
-        
-        # Build the long buffer
-        buffer_parts = []
-        
-        for i in range(loops_needed):
-            if i == 0:
-                # First loop: no crossfade at start
-                buffer_parts.append(audio_data)
-            else:
-                # Subsequent loops: apply crossfade between end of previous and start of current
-                if crossfade_samples > 0:
-                    # Get the last crossfade_samples from the previous loop (in buffer_parts[-1])
-                    prev_end = buffer_parts[-1][-crossfade_samples:]
-                    
-                    # Apply fade-out to previous end
-                    prev_end_faded = prev_end * fade_out
-                    
-                    # Apply fade-in to current start
-                    current_start = audio_data[:crossfade_samples]
-                    current_start_faded = current_start * fade_in
-                    
-                    # Crossfaded section
-                    crossfaded_section = prev_end_faded + current_start_faded
-                    
-                    # Replace the last crossfade_samples in buffer_parts[-1]
-                    buffer_parts[-1] = np.vstack((
-                        buffer_parts[-1][:-crossfade_samples],
-                        crossfaded_section
-                    ))
-                    
-                    # Add the rest of the current loop (after crossfade)
-                    buffer_parts.append(audio_data[crossfade_samples:])
-                else:
-                    # No crossfade, just concatenate
-                    buffer_parts.append(audio_data)
-        
-        # Combine all parts
-        full_buffer = np.vstack(buffer_parts)
-        
-        # Trim or extend to exactly target_samples
-        if len(full_buffer) > target_samples:
-            full_buffer = full_buffer[:target_samples]
-        elif len(full_buffer) < target_samples:
-            # Repeat if needed (shouldn't happen with our calculation)
-            repeats = int(np.ceil(target_samples / len(full_buffer)))
-            full_buffer = np.tile(full_buffer, (repeats, 1))[:target_samples]
-        
-        print(f"    Final buffer: {len(full_buffer)} samples ({len(full_buffer)/self.sample_rate:.2f}s)")
-        return full_buffer
+            print(f"📥 {name.capitalize()} pre-loaded: {track.file_info[0]}")
+        return True
+    
+    def select_region(self, name, region=None):
+        """
+        Loop another labelled region of a layer's current file (default: the next one).
+        Takes effect on the next bar, without reloading. False if the layer has no regions.
+        """
+        track = self.mixer[name].current
+        if track is None or not isinstance(track.buffer, RegionLoop):
+            return False
+        loop = track.buffer
+        # Step from the queued region, so presses within one bar keep advancing
+        region = (loop.queued + 1 if region is None else region) % len(loop.regions)
+        loop.select(region)
+        description = track.labels.descriptions[loop.label_index(region)] if track.labels else region
+        print(f"🔂 {name.capitalize()} region → {description} (next bar)")
+        return True
+    
+    def prepare_loop(self, name, file_info, slot='current'):
+        """Decode and pre-render a file for a layer without installing it (reuses a loaded Track)."""
+        channel = self.mixer[name]
+        regions = name in self.region_layers
+        key = (tuple(file_info), channel.tempo_synced, channel.quantized, self.target_buffer_seconds, self.storage,
+               regions)
+        track = self._tracks.get(key)
+        if track is not None:
+            print(f"  Sharing loaded {name} track: {file_info[0]}")
+            return track
+        
+        gain = self.gain_lookup(file_info[2]) if self.gain_lookup else 1.0  # Cached loudness gain
+        labels = self.label_lookup(file_info[2]) if self.label_lookup else None  # Indexed at scan time
+        track = None
+        if regions and labels is not None:
+            # One decode feeds every labelled loop of the file (no pre-render)
+            track = prepare_regions(file_info, self.sample_rate, labels, gain=gain,
+                                    tempo_synced=channel.tempo_synced, quantized=channel.quantized,
+                                    label=f"{name} {slot}")
+        if track is None:
+            # Something must play now: don't wait for the pre-render (next loads have time)
+            prepare = prepare_progressive if slot == 'current' and self.progressive else prepare_loop
+            track = prepare(file_info, self.sample_rate, self.target_buffer_seconds, gain,
+                            tempo_synced=channel.tempo_synced, quantized=channel.quantized,
+                            label=f"{name} {slot}", storage=self.storage)
+        track.labels = labels
+        self._tracks[key] = track
+        return track
     
     def start_playback(self):
         """Start audio playback."""
         if not self.is_playing:
-            self.stream = sd.OutputStream(
-                samplerate=self.sample_rate,
-                blocksize=self.buffer_size,
-                channels=self.channels,
-                dtype=np.float32,
-                callback=self.audio_callback
+            self.stream = open_stream(
+                self.backend,
+                self.sample_rate,
+                self.buffer_size,
+                self.channels,
+                self.audio_callback,
+                **self.backend_options
             )
+            self.is_playing = True  # Before start: the first callback may run immediately
             self.stream.start()
-            self.is_playing = True
-            print("Audio playback started.")
+            print(f"Audio playback started ({self.backend}).")
     
     def stop_playback(self):
         """Stop audio playback."""
         if self.is_playing and self.stream:
             self.stream.stop()
             self.stream.close()
+            self.stream = None
             self.is_playing = False
             print("Audio playback stopped.")
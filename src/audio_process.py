@@ -0,0 +1,566 @@
+#!/usr/bin/env python3
+"""
+Process-isolated audio for Roland S-1 Controller
+Runs the AudioEngine (callback + mixer) in its own process so display
+rendering, terminal I/O, psutil calls and preloading in the UI process
+can never hold the GIL the audio callback needs.
+
+Control plane: knob values live in a seqlock-protected shared-memory block.
+Sample buffers: loops are pre-rendered by the UI process straight into
+shared memory and the audio process maps them without copying.
+"""
+
+import time
+import threading
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from mixer import prepare_loop
+from audio_backends import claim_stdout, stdout_for_child
+from engine_status import EngineStatus, LayerStatus
+
+CONTROL_NAMES = ('crossfader', 'delay', 'reverb', 'clock_bpm')
+STATUS_NAMES = ('sample_time', 'blocks', 'rhythm_rate', 'heartbeat', 'first_audio_at')
+DEFAULT_LAYERS = (('ambient', False, False), ('rhythm', True, True))
+
+
+# ===== SHARED BLOCKS =====
+
+class SharedControls:
+    """
+    Named float64 parameters in shared memory, written by one process and
+    read by another. Slot 0 is a sequence counter (odd while a write is in
+    progress), so the reader never sees a half-written update.
+    """
+
+    def __init__(self, names, name=None):
+        self.names = tuple(names)
+        self._index = {key: i + 1 for i, key in enumerate(self.names)}
+        size = 8 * (len(self.names) + 1)
+
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self._owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self._owner = False
+
+        self.values = np.ndarray(len(self.names) + 1, dtype=np.float64, buffer=self.shm.buf)
+        if self._owner:
+            self.values[:] = np.nan
+            self.values[0] = 0
+        self._lock = threading.Lock()  # Writer side: several threads may publish
+        self._last_seq = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def write(self, **updates):
+        """Publish one or more values atomically (writer process)."""
+        with self._lock:
+            self.values[0] += 1
+            for key, value in updates.items():
+                self.values[self._index[key]] = value
+            self.values[0] += 1
+
+    def get(self, key):
+        return float(self.values[self._index[key]])
+
+    def read_if_changed(self):
+        """Consistent {name: value} snapshot, or None if nothing changed (reader process)."""
+        for _ in range(100):
+            seq = self.values[0]
+            if seq == self._last_seq:
+                return None
+            if int(seq) % 2:
+                continue  # Writer mid-update
+            snapshot = self.values[1:].copy()
+            if self.values[0] == seq:
+                self._last_seq = seq
+                return dict(zip(self.names, snapshot.tolist()))
+        return None
+
+    def close(self):
+        del self.values
+        self.shm.close()
+        if self._owner:
+            self.shm.unlink()
+
+
+class _SharedTempo:
+    """Stands in for a ClockTempoTracker inside the audio process."""
+
+    def __init__(self, controls):
+        self.controls = controls
+
+    @property
+    def bpm(self):
+        bpm = self.controls.get('clock_bpm')
+        return None if np.isnan(bpm) else bpm
+
+
+def _control_names(layers):
+    return CONTROL_NAMES + tuple(f"volume:{name}" for name, _, _ in layers)
+
+
+# ===== AUDIO PROCESS =====
+
+def _audio_main(conn, controls_name, status_name, layers, sample_rate, buffer_size,
+                backend, backend_options, storage):
+    """Entry point of the audio process: owns the engine and the output stream."""
+    from audio_engine import AudioEngine
+    from loop_renderer import PreRenderedLoop
+    from mixer import Track
+
+    if backend == 'stdout':
+        claim_stdout()  # Before the engine prints: fd 1 carries only audio
+    engine = AudioEngine(sample_rate, buffer_size, backend, backend_options, storage)
+    for name, tempo_synced, quantized in layers:
+        if name not in engine.mixer:
+            engine.add_layer(name, tempo_synced=tempo_synced, quantized=quantized)
+
+    controls = SharedControls(_control_names(layers), name=controls_name)
+    status = SharedControls(STATUS_NAMES, name=status_name)
+    engine.tempo_source = _SharedTempo(controls)
+
+    attached = {}    # shm name -> (SharedMemory, PreRenderedLoop) mapped by this process
+    applied = {}     # control name -> last value applied
+    files = {channel.name: channel.file for channel in engine.mixer}
+    poll_interval = buffer_size / sample_rate / 2
+    started = False
+
+    def load(layer, slot, shm_name, shape, meta):
+        """Map a loop the UI process rendered into shared memory (no copy)."""
+        shm = shared_memory.SharedMemory(name=shm_name)
+        buffer = np.ndarray(shape, dtype=meta['dtype'], buffer=shm.buf)
+        buffer.flags.writeable = False
+        loop = PreRenderedLoop.from_buffer(buffer, meta['period'], meta['crossfade_samples'])
+        attached[shm_name] = (shm, loop)
+
+        channel = engine.mixer[layer]
+        channel.assign(slot, Track(meta['file_info'], loop, meta['start'],
+                                   meta['gain'], meta['bpm'], meta['grid']))
+        if slot == 'current':
+            files[layer] = channel.file
+
+    def apply_controls(values):
+        for key, value in values.items():
+            if key == 'clock_bpm' or np.isnan(value) or applied.get(key) == value:
+                continue
+            applied[key] = value
+            if key == 'crossfader':
+                engine.set_crossfader(value)
+            elif key == 'delay':
+                engine.set_delay_amount(value)
+            elif key == 'reverb':
+                engine.set_reverb_amount(value)
+            elif key.startswith('volume:'):
+                engine.set_layer_volume(key.split(':', 1)[1], value)
+
+    def release_unused():
+        """Unmap buffers no layer references any more and let the UI process free them."""
+        engine.release_retired()
+        live = [loop for channel in engine.mixer for loop in (channel.buffer, channel.next_buffer)
+                if loop is not None]
+        for shm_name, (shm, loop) in list(attached.items()):
+            if loop is not None and any(loop is other for other in live):
+                continue
+            attached[shm_name] = (shm, None)
+            del loop
+            try:
+                shm.close()
+            except BufferError:
+                continue  # A view is still alive somewhere; retry next pass
+            del attached[shm_name]
+            conn.send(('released', shm_name))
+
+    running = True
+    while running:
+        # Sleep until a command arrives (or half a block, to pick up knob changes),
+        # then drain every queued command so loads land before the controls are read
+        timeout = poll_interval if started else None
+        while running and conn.poll(timeout):
+            timeout = 0
+            message = conn.recv()
+            command = message[0]
+            if command == 'load':
+                load(*message[1:])
+                conn.send(('loaded', message[1], message[2], message[5]['file_info']))
+            elif command == 'start':
+                started = True
+                engine.start_playback()
+            elif command == 'render':
+                # Manual backend: render blocks on demand (tests, benchmarks)
+                values = controls.read_if_changed()
+                if values:
+                    apply_controls(values)
+                peak = float(np.abs(engine.stream.render(message[1])).max())
+                conn.send(('rendered', engine.sample_time, peak))
+            elif command == 'drop_next':
+                for channel in engine.mixer:
+                    if channel.drop_next():
+                        conn.send(('dropped', channel.name))
+            elif command == 'stop':
+                running = False
+
+        values = controls.read_if_changed()
+        if values:
+            apply_controls(values)
+
+        # Report switches made by the callback, then free buffers that dropped out
+        for channel in engine.mixer:
+            if channel.file != files[channel.name]:
+                files[channel.name] = channel.file
+                conn.send(('switched', channel.name, channel.file))
+        release_unused()
+
+        status.write(sample_time=engine.sample_time, blocks=engine.sample_time // buffer_size,
+                     rhythm_rate=engine.rhythm_rate, heartbeat=time.monotonic(),
+                     first_audio_at=engine.first_audio_at or np.nan)
+
+    engine.stop_playback()
+    for layer in engine.mixer:
+        layer.current = layer.next = None
+    release_unused()
+    controls.close()
+    status.close()
+    conn.send(('stopped',))
+
+
+# ===== UI PROCESS SIDE =====
+
+def _layer_file(layer, attr):
+    """Property mirroring a layer's file info as last reported by the audio process."""
+    def fget(self):
+        return self.layers[layer][attr]
+    return property(fget)
+
+
+class AudioProcess:
+    """
+    Same control surface as AudioEngine, with the engine running in a child
+    process. Loads are decoded and pre-rendered here (in the caller's thread),
+    so the audio process only maps finished buffers.
+    """
+    
+    current_ambient_file = _layer_file('ambient', 'file')
+    current_rhythm_file = _layer_file('rhythm', 'file')
+    next_ambient_file = _layer_file('ambient', 'next_file')
+    next_rhythm_file = _layer_file('rhythm', 'next_file')
+    next_ambient_buffer = _layer_file('ambient', 'next_buffer')  # shm name while a next loop is queued
+    next_rhythm_buffer = _layer_file('rhythm', 'next_buffer')
+    
+    def __init__(self, sample_rate=44100, buffer_size=1024, backend='sounddevice',
+                 backend_options=None, storage='float32', layers=DEFAULT_LAYERS):
+        self.sample_rate = sample_rate
+        self.buffer_size = buffer_size
+        self.backend = backend
+        self.target_buffer_seconds = 150
+        self.storage = storage
+        self.gain_lookup = None
+        self.label_lookup = None  # Accepted for AudioEngine parity; the child loops whole files
+        self.region_layers = set()  # Likewise: region looping needs the in-process engine
+        self.preload_depth = 1
+        self.tempo_source = None  # ClockTempoTracker in this process; its bpm is published
+        self.is_playing = False
+        
+        # Requested control values (what the UI shows)
+        self.crossfader = 0.0
+        self.delay_amount = 0.0
+        self.reverb_amount = 0.0
+        
+        self.layer_flags = {name: (tempo_synced, quantized) for name, tempo_synced, quantized in layers}
+        self.layers = {name: {'file': None, 'next_file': None, 'next_buffer': None} for name in self.layer_flags}
+        
+        self.controls = SharedControls(_control_names(layers))
+        self.status = SharedControls(STATUS_NAMES)
+        self._buffers = {}  # shm name -> SharedMemory owned here until the audio process releases it
+        self._lock = threading.Lock()
+        self._rendered = None
+        self._rendered_event = threading.Event()
+        
+        context = mp.get_context('spawn')
+        self._conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_audio_main,
+            args=(child_conn, self.controls.name, self.status.name, tuple(layers),
+                  sample_rate, buffer_size, backend, backend_options or {}, storage),
+            daemon=True,
+        )
+        with stdout_for_child():  # A stdout backend needs the real stdout as the child's fd 1
+            self.process.start()
+        
+        self._listener = threading.Thread(target=self._listen, daemon=True)
+        self._listener.start()
+        print(f"AudioProcess started: pid {self.process.pid} ({backend} backend)")
+    
+    # ===== CONTROLS (shared memory, no messages) =====
+    
+    def set_crossfader(self, amount):
+        self.crossfader = max(0.0, min(1.0, amount))
+        self.controls.write(crossfader=self.crossfader)
+    
+    def set_delay_amount(self, amount):
+        self.delay_amount = max(0.0, min(1.0, amount))
+        self.controls.write(delay=self.delay_amount)
+    
+    def set_reverb_amount(self, amount):
+        self.reverb_amount = max(0.0, min(1.0, amount))
+        self.controls.write(reverb=self.reverb_amount)
+    
+    def set_layer_volume(self, name, volume):
+        self.controls.write(**{f"volume:{name}": max(0.0, min(1.0, volume))})
+    
+    @property
+    def ambient_volume(self):
+        return (1.0 - self.crossfader) ** 1.5
+    
+    @property
+    def rhythm_volume(self):
+        return self.crossfader ** 1.5
+    
+    @property
+    def rhythm_rate(self):
+        rate = self.status.get('rhythm_rate')
+        return 1.0 if np.isnan(rate) else rate
+    
+    @property
+    def sample_time(self):
+        sample_time = self.status.get('sample_time')
+        return 0 if np.isnan(sample_time) else int(sample_time)
+    
+    @property
+    def first_audio_at(self):
+        """perf_counter() of the audio process's first callback (a system-wide monotonic clock), or None."""
+        first_audio_at = self.status.get('first_audio_at')
+        return None if np.isnan(first_audio_at) else first_audio_at
+    
+    @property
+    def ambient_crossfade_ms(self):
+        info = self.current_ambient_file
+        return info[1] if info else 0
+    
+    @property
+    def rhythm_crossfade_ms(self):
+        info = self.current_rhythm_file
+        return info[1] if info else 0
+    
+    # ===== LOADING (shared-memory buffers) =====
+    
+    def load_layer(self, name, file_info, slot='current'):
+        """Pre-render a file into shared memory and hand it to the audio process."""
+        prepared = self.prepare_layer(name, file_info, slot)
+        return prepared is not None and self.install_layer(name, slot, prepared)
+    
+    def prepare_layer(self, name, file_info, slot='current'):
+        """
+        Pre-render a file into a shared-memory segment (any thread).
+        Returns (segment, shape, meta) for install_layer, or None if skipped or failed.
+        """
+        if slot == 'next' and self.preload_depth < 1:
+            print(f"⏸️  {name.capitalize()} pre-load skipped (memory pressure): {file_info[0]}")
+            return None
+        tempo_synced, quantized = self.layer_flags[name]
+        gain = self.gain_lookup(file_info[2]) if self.gain_lookup else 1.0
+        segments = []
+        
+        def allocate(frames, channels, dtype):
+            shm = shared_memory.SharedMemory(create=True, size=frames * channels * dtype.itemsize)
+            segments.append(shm)
+            return np.ndarray((frames, channels), dtype=dtype, buffer=shm.buf)
+        
+        print(f"Loading {name} to {slot} buffer: {file_info[0]} (xfade: {file_info[1]}ms)")
+        try:
+            loop = prepare_loop(file_info, self.sample_rate, self.target_buffer_seconds, gain,
+                                tempo_synced=tempo_synced, quantized=quantized,
+                                label=f"{name} {slot}", allocate=allocate, storage=self.storage)
+        except Exception as e:
+            print(f"Error loading {file_info[2]}: {e}")
+            for shm in segments:
+                shm.close()
+                shm.unlink()
+            return None
+        
+        shm = segments[0]
+        meta = {
+            'file_info': file_info,
+            'period': loop.buffer.period,
+            'crossfade_samples': loop.buffer.crossfade_samples,
+            'start': loop.start,
+            'gain': loop.gain,
+            'bpm': loop.bpm,
+            'grid': loop.grid,
+            'dtype': loop.buffer.buffer.dtype.str,
+        }
+        shape = loop.buffer.buffer.shape
+        del loop  # Our view of the segment; the audio process maps its own
+        return shm, shape, meta
+    
+    def install_layer(self, name, slot, prepared):
+        """Hand a prepared segment to the audio process (control thread)."""
+        shm, shape, meta = prepared
+        file_info = meta['file_info']
+        with self._lock:
+            self._buffers[shm.name] = shm
+            if slot == 'next':
+                self.layers[name]['next_file'] = file_info
+                self.layers[name]['next_buffer'] = shm.name
+            else:
+                self.layers[name]['file'] = file_info
+            self._conn.send(('load', name, slot, shm.name, shape, meta))
+        
+        if slot == 'current':
+            print(f"✅ Initial {name} loaded: {file_info[0]}")
+        else:
+            print(f"📥 {name.capitalize()} pre-loaded: {file_info[0]}")
+        return True
+    
+    def load_initial_ambient(self, file_info):
+        return self.load_layer('ambient', file_info, 'current')
+    
+    def load_initial_rhythm(self, file_info):
+        return self.load_layer('rhythm', file_info, 'current')
+    
+    def preload_next_ambient(self, file_info):
+        return self.load_layer('ambient', file_info, 'next')
+    
+    def preload_next_rhythm(self, file_info):
+        return self.load_layer('rhythm', file_info, 'next')
+    
+    # ===== MEMORY =====
+    
+    def memory_inventory(self):
+        """(name, nbytes, residency) of the shared segments this process owns."""
+        with self._lock:
+            entries = [(f"shared.{name}", shm.size, 'mapped') for name, shm in self._buffers.items()]
+        entries.append(('shared.controls', self.controls.values.nbytes, 'mapped'))
+        entries.append(('shared.status', self.status.values.nbytes, 'mapped'))
+        return entries
+    
+    def release_retired(self):
+        """The audio process frees switched-out buffers itself (see release_unused)."""
+        return 0
+    
+    def evict_caches(self):
+        """Nothing to evict here: this process only owns the shared segments."""
+        return 0
+    
+    def drop_preloaded(self):
+        """Ask the audio process to forget pre-loaded next loops. Returns bytes that will be freed."""
+        with self._lock:
+            names = [layer['next_buffer'] for layer in self.layers.values() if layer['next_buffer']]
+            freed = sum(self._buffers[name].size for name in names if name in self._buffers)
+            self._conn.send(('drop_next',))
+        return freed
+    
+    def status_snapshot(self):
+        """EngineStatus from the mirrored layer files and the status block (no loop positions)."""
+        with self._lock:
+            layers = tuple(LayerStatus(
+                name=name,
+                filename=layer['file'][0] if layer['file'] else None,
+                next_filename=layer['next_file'][0] if layer['next_file'] else None,
+                crossfade_ms=layer['file'][1] if layer['file'] else 0,
+                volume=getattr(self, f"{name}_volume", 0.0),
+                rate=self.rhythm_rate if name == 'rhythm' else 1.0,
+            ) for name, layer in self.layers.items())
+        return EngineStatus(
+            layers=layers,
+            crossfader=self.crossfader,
+            delay_amount=self.delay_amount,
+            reverb_amount=self.reverb_amount,
+            clock_bpm=self.tempo_source.bpm if self.tempo_source is not None else None,
+            playing=self.is_playing,
+            sample_time=self.sample_time,
+        )
+    
+    def select_region(self, name, region=None):
+        """Region looping needs the in-process engine (see AudioEngine.select_region)."""
+        return False
+    
+    # ===== PROCESS MESSAGES =====
+    
+    def _listen(self):
+        """Mirror switches, free released buffers and publish the MIDI clock tempo."""
+        while True:
+            try:
+                if not self._conn.poll(0.05):
+                    self._publish_tempo()
+                    continue
+                message = self._conn.recv()
+            except (EOFError, OSError):
+                break
+            
+            kind = message[0]
+            if kind == 'switched':
+                _, name, file_info = message
+                with self._lock:
+                    layer = self.layers[name]
+                    layer['file'] = file_info
+                    if layer['next_file'] == file_info:
+                        layer['next_file'] = layer['next_buffer'] = None
+            elif kind == 'dropped':
+                with self._lock:
+                    layer = self.layers[message[1]]
+                    layer['next_file'] = layer['next_buffer'] = None
+            elif kind == 'released':
+                with self._lock:
+                    shm = self._buffers.pop(message[1], None)
+                if shm is not None:
+                    shm.close()
+                    shm.unlink()
+            elif kind == 'rendered':
+                self._rendered = message[1:]
+                self._rendered_event.set()
+            elif kind == 'stopped':
+                break
+        self._rendered_event.set()  # Never leave render() waiting on a dead process
+    
+    def _publish_tempo(self):
+        if self.tempo_source is None:
+            return
+        bpm = self.tempo_source.bpm
+        current = self.controls.get('clock_bpm')
+        value = np.nan if bpm is None else bpm
+        if not (np.isnan(value) and np.isnan(current)) and value != current:
+            self.controls.write(clock_bpm=value)
+    
+    def render(self, blocks):
+        """Manual backend: render blocks in the audio process. Returns (sample_time, peak)."""
+        self._rendered_event.clear()
+        self._rendered = None
+        with self._lock:
+            self._conn.send(('render', blocks))
+        self._rendered_event.wait()
+        if self._rendered is None:
+            raise RuntimeError("Audio process exited before rendering")
+        return self._rendered
+    
+    # ===== PLAYBACK =====
+    
+    def start_playback(self):
+        if not self.is_playing:
+            with self._lock:
+                self._conn.send(('start',))
+            self.is_playing = True
+            print("Audio playback started (isolated process).")
+    
+    def stop_playback(self):
+        if not self.process.is_alive():
+            return
+        with self._lock:
+            self._conn.send(('stop',))
+        self.process.join(timeout=5.0)
+        self._listener.join(timeout=1.0)
+        self.is_playing = False
+        
+        for shm in self._buffers.values():
+            shm.close()
+            shm.unlink()
+        self._buffers.clear()
+        self.controls.close()
+        self.status.close()
+        print("Audio playback stopped (isolated process).")
@@ -12,6 +12,8 @@ import soundfile as sf
 import argparse
 from typing import List, Tuple
 
+from tempo_sync import store_source_tempo
+
 class BeatDetector:
     def __init__(self, sample_rate: int = 44100):
         self.sample_rate = sample_rate
@@ -148,6 +150,11 @@ class BeatDetector:
                     f.write(f"{beat_time:.6f}\tBeat {i}\n")
             
             print(f"Beat positions saved to {beats_path}")
+
+            # Native tempo for MIDI clock sync (the beats file covers unconfigured files)
+            if not store_source_tempo(audio_path, tempo):
+                print(f"⚠️ No config for {os.path.basename(audio_path)}: tempo not stored "
+                      f"(clock sync will use {os.path.basename(beats_path)})")
             
             # Print summary
             print(f"\n=== SUMMARY ===")
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Beat grids for Roland S-1 Controller
+Bar boundaries of a rhythm loop, built from BeatDetector's _beats.txt, so
+track switches can be quantised to the next downbeat.
+"""
+
+import os
+import numpy as np
+
+
+def load_beat_times(audio_path):
+    """Beat times in seconds from BeatDetector's <name>_beats.txt (None if missing)."""
+    beats_path = os.path.splitext(audio_path)[0] + '_beats.txt'
+    try:
+        beats = np.loadtxt(beats_path, usecols=0, ndmin=1)
+    except (OSError, ValueError):
+        return None
+    return beats if len(beats) else None
+
+
+class BeatGrid:
+    """
+    Bar start positions (in samples) within one loop period.
+    Loop stream position p plays source sample p % period, so the next
+    bar after any position is a single searchsorted away.
+    """
+
+    def __init__(self, beat_times, sample_rate, period, beats_per_bar=4):
+        beat_samples = np.round(np.asarray(beat_times) * sample_rate).astype(np.int64)
+        beat_samples = beat_samples[(beat_samples >= 0) & (beat_samples < period)]
+
+        # First detected beat is taken as the downbeat
+        self.bars = beat_samples[::beats_per_bar]
+        self.period = int(period)
+        self.beats_per_bar = beats_per_bar
+
+    @classmethod
+    def from_audio_file(cls, audio_path, sample_rate, period, beats_per_bar=4):
+        """Grid for a library file, or None if it has no usable beat analysis."""
+        beats = load_beat_times(audio_path)
+        if beats is None:
+            return None
+        grid = cls(beats, sample_rate, period, beats_per_bar)
+        return grid if len(grid.bars) else None
+
+    @property
+    def first_bar(self):
+        """Start offset that begins playback on a downbeat."""
+        return int(self.bars[0])
+
+    def frames_to_next_bar(self, position):
+        """Source frames from stream position to the next bar start (0 if on one)."""
+        phase = position % self.period
+        index = np.searchsorted(self.bars, phase)
+        if index < len(self.bars):
+            return int(self.bars[index] - phase)
+        return int(self.period - phase + self.bars[0])
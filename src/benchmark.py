@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for Roland S-1 Controller
+Times the audio-thread hot paths on synthetic loops, so changes can be
+compared on the target hosts (e.g. a Raspberry Pi) without a sound card.
+
+    python src/benchmark.py                 # everything
+    python src/benchmark.py storage mix     # selected benchmarks
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from loop_renderer import LoopRenderer, PreRenderedLoop, STORAGE_TYPES
+from mixer import Mixer, Track
+
+SAMPLE_RATE = 44100
+
+
+def _loop(seconds, storage, seed=0):
+    """Pre-rendered loop of noise (about `seconds` long) in the given storage type."""
+    rng = np.random.default_rng(seed)
+    audio = (rng.standard_normal((int(4 * SAMPLE_RATE), 2)) * 0.2).astype(np.float32)
+    return PreRenderedLoop(LoopRenderer(audio, 2205), seconds * SAMPLE_RATE, storage=storage)
+
+
+def _time_per_call(func, calls):
+    """Best-of-3 mean seconds per call."""
+    best = float('inf')
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        best = min(best, (time.perf_counter() - start) / calls)
+    return best
+
+
+# ===== BENCHMARKS =====
+
+def bench_storage(args):
+    """Loop buffer memory and per-block read (+ conversion) cost for each storage type."""
+    out = np.empty((args.frames, 2), dtype=np.float32)
+    print(f"  {'storage':8} {'buffer':>9} {'read/block':>11} {'budget':>7}")
+    for storage in STORAGE_TYPES:
+        loop = _loop(args.seconds, storage)
+        position = [0]
+
+        def read():
+            position[0] = loop.read(out, position[0])
+
+        seconds = _time_per_call(read, args.blocks)
+        budget = seconds / (args.frames / SAMPLE_RATE) * 100  # Share of the block's real-time budget
+        print(f"  {storage:8} {loop.buffer.nbytes / (1024 * 1024):7.1f}MB {seconds * 1e6:9.1f}µs {budget:6.2f}%")
+
+
+def bench_mix(args):
+    """Full Mixer.mix (all layers audible) per block for each storage type."""
+    output = np.empty((args.frames, 2), dtype=np.float32)
+    print(f"  {'storage':8} {'layers':>6} {'mix/block':>10}")
+    for storage in STORAGE_TYPES:
+        mixer = Mixer(2, args.frames, max_layers=args.layers)
+        for index in range(args.layers):
+            channel = mixer.add_channel(f"layer{index}")
+            channel.assign('current', Track(None, _loop(args.seconds, storage, seed=index)))
+            channel.volume = 1.0 / args.layers
+        seconds = _time_per_call(lambda: mixer.mix(output), args.blocks)
+        print(f"  {storage:8} {args.layers:6} {seconds * 1e6:8.1f}µs")
+
+
+BENCHMARKS = {
+    'storage': bench_storage,
+    'mix': bench_mix,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Audio engine benchmarks")
+    parser.add_argument('benchmarks', nargs='*',
+                        help=f"Benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument('--frames', type=int, default=1024, help="Block size (default: 1024)")
+    parser.add_argument('--blocks', type=int, default=2000, help="Blocks per timing run (default: 2000)")
+    parser.add_argument('--seconds', type=int, default=30, help="Loop buffer length (default: 30)")
+    parser.add_argument('--layers', type=int, default=4, help="Mixer layers (default: 4)")
+    args = parser.parse_args()
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(unknown)}")
+
+    for name in args.benchmarks or BENCHMARKS:
+        print(f"\n⏱️  {name}: {BENCHMARKS[name].__doc__}")
+        BENCHMARKS[name](args)
+    sys.exit(0)
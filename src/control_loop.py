@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Event-driven control loop for Roland S-1 Controller
+Multiplexes keyboard input, MIDI batches and background-job completions
+(e.g. preloads) on one selector. The loop sleeps until something happens:
+no polling timeouts, no idle wakeups.
+"""
+
+import os
+import heapq
+import itertools
+import selectors
+import threading
+import time
+from collections import deque
+
+
+class ControlLoop:
+    """Minimal selector loop with thread-safe callbacks and timers."""
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.running = False
+
+        # Callbacks posted from other threads (MIDI callback, preload workers)
+        self._ready = deque()
+        self._timers = []  # heap of [when, seq, callback, args] (callback None once cancelled)
+        self._seq = itertools.count()
+
+        # Self-pipe: a byte written here wakes select()
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+        self.selector.register(self._wake_r, selectors.EVENT_READ, self._drain_wakeups)
+
+        self.thread = None
+
+    # ===== SCHEDULING =====
+
+    def add_reader(self, fileobj, callback):
+        """Call callback() whenever fileobj is readable."""
+        self.selector.register(fileobj, selectors.EVENT_READ, callback)
+
+    def remove_reader(self, fileobj):
+        try:
+            self.selector.unregister(fileobj)
+        except (KeyError, ValueError):
+            pass
+
+    def call_soon_threadsafe(self, callback, *args):
+        """Run callback(*args) on the loop thread as soon as possible."""
+        self._ready.append((callback, args))
+        self._wakeup()
+
+    def call_later(self, delay, callback, *args):
+        """Run callback(*args) on the loop thread after delay seconds (loop thread only). Returns the timer."""
+        timer = [time.monotonic() + delay, next(self._seq), callback, args]
+        heapq.heappush(self._timers, timer)
+        return timer
+
+    def cancel(self, timer):
+        """Drop a call_later timer that has not fired yet (loop thread only)."""
+        timer[2] = None
+
+    def run_in_thread(self, job, on_done=None, *args):
+        """Run job(*args) on a worker thread; post on_done(result) back to the loop."""
+        def worker():
+            try:
+                result = job(*args)
+            except Exception as e:
+                print(f"Background job error: {e}")
+                result = None
+            if on_done:
+                self.call_soon_threadsafe(on_done, result)
+
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        return thread
+
+    def _wakeup(self):
+        try:
+            os.write(self._wake_w, b'\0')
+        except BlockingIOError:
+            pass  # Pipe already full: the loop is awake anyway
+
+    def _drain_wakeups(self):
+        try:
+            while os.read(self._wake_r, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    # ===== RUNNING =====
+
+    def run(self):
+        """Dispatch events until stop() is called."""
+        self.running = True
+        self.thread = threading.current_thread()
+
+        while self.running:
+            timeout = None
+            if self._ready:
+                timeout = 0
+            elif self._timers:
+                timeout = max(0.0, self._timers[0][0] - time.monotonic())
+
+            for key, _ in self.selector.select(timeout):
+                key.data()
+
+            # Due timers
+            now = time.monotonic()
+            while self._timers and self._timers[0][0] <= now:
+                _, _, callback, args = heapq.heappop(self._timers)
+                if callback is not None:
+                    self._ready.append((callback, args))
+
+            # Posted callbacks (only those queued so far; new ones wait for the next pass)
+            for _ in range(len(self._ready)):
+                callback, args = self._ready.popleft()
+                try:
+                    callback(*args)
+                except Exception as e:
+                    print(f"Control loop error in {getattr(callback, '__name__', callback)}: {e}")
+
+    def start(self):
+        """Run the loop on a background thread."""
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the loop (safe from any thread)."""
+        self.running = False
+        self._wakeup()
+
+    def close(self):
+        self.selector.close()
+        os.close(self._wake_r)
+        os.close(self._wake_w)
@@ -7,7 +7,6 @@ For ambient files: Manual ms adjustment
 
 import os
 import sys
-import json
 import time
 import numpy as np
 import sounddevice as sd
@@ -15,7 +14,12 @@ import soundfile as sf
 import select
 import tty
 import termios
-from typing import List, Tuple, Optional
+from typing import List, Tuple
+
+from loudness import analyze_file, read_loudness
+from library_manifest import read_config, update_config
+from label_index import LabelIndex
+from loop_renderer import render_loops, export_loops, EXPORT_FORMATS
 
 class LabelInfo:
     """Represents an Audacity label."""
@@ -44,12 +48,16 @@ class CrossfadeTesterWithLabels:
         self.crossfade_ms = 1000
         self.crossfade_samples = 0
         
+        # Loudness normalisation gain (cached per file by the analysis stage)
+        self.gain = 1.0
+        
         # Pre-rendered buffer
         self.buffer = None
         self.buffer_position = 0
         self.buffer_loops = 10
         
         # Label support
+        self.label_index = LabelIndex()  # Parsed once per file, re-read when the label file changes
         self.labels: List[LabelInfo] = []
         self.selected_label_index = 0
         self.is_rhythmic = False
@@ -87,58 +95,11 @@ class CrossfadeTesterWithLabels:
                         files.append((f, 0, path))
         return files
     
-    def find_label_file(self, audio_path: str) -> Optional[str]:
-        """Find corresponding label file for audio file."""
-        base_name = os.path.splitext(audio_path)[0]
-        
-        # Try different naming conventions
-        possible_names = [
-            f"{base_name}_label.txt",
-            f"{base_name}.txt",
-            base_name.replace('.wav', '_label.txt'),
-            base_name.replace('.mp3', '_label.txt'),
-            base_name.replace('.flac', '_label.txt'),
-            base_name.replace('.ogg', '_label.txt'),
-        ]
-        
-        for label_path in possible_names:
-            if os.path.exists(label_path):
-                return label_path
-        
-        return None
-    
-    def parse_audacity_labels(self, label_path: str) -> List[LabelInfo]:
-        """Parse Audacity label file (tab-separated: start, end, description)."""
-        labels = []
-        
-        try:
-            with open(label_path, 'r') as f:
-                for line_num, line in enumerate(f, 1):
-                    line = line.strip()
-                    if not line or line.startswith('#'):
-                        continue
-                    
-                    parts = line.split('\t')
-                    if len(parts) >= 2:
-                        try:
-                            start_time = float(parts[0])
-                            end_time = float(parts[1]) if len(parts) > 1 else start_time
-                            description = parts[2] if len(parts) > 2 else f"Label {line_num}"
-                            
-                            labels.append(LabelInfo(start_time, end_time, description))
-                        except ValueError as e:
-                            print(f"Warning: Could not parse line {line_num}: {line}")
-                            print(f"  Error: {e}")
-        
-        except Exception as e:
-            print(f"Error reading label file {label_path}: {e}")
-        
-        return labels
-    
     def select_file(self) -> bool:
         """Let user select an audio file to test."""
         directory = "samples/real_test"
         files = self.list_audio_files(directory)
+        self.label_index.index_directory(directory, [path for _, _, path in files])
         
         if not files:
             print(f"\n❌ No audio files found in {directory}/")
@@ -192,44 +153,12 @@ class CrossfadeTesterWithLabels:
             print(f"\nLoading {filename}...")
             data, sr = sf.read(filepath, always_2d=True)
             
-            # === APPLY RMS NORMALIZATION ===
-            print(f"  Original peak: {np.max(np.abs(data)):.3f}")
-
-            # Calculate RMS (perceived loudness)
-            rms = np.sqrt(np.mean(data**2))
-            target_rms = 0.2  # Same as your batch script
-
-            if rms > 0.0001:  # Avoid silence
-                # Calculate scaling
-                scale = target_rms / rms
-                
-                # Limit excessive gain (max 20dB)
-                max_gain_db = 20
-                max_scale = 10**(max_gain_db/20)
-                
-                if scale > max_scale:
-                    print(f"  ⚠️  Would need {20*np.log10(scale):.1f}dB gain, limiting to {max_gain_db}dB")
-                    scale = max_scale
-                
-                # Apply normalization
-                data = data * scale
-                
-                # Safety: prevent clipping
-                peak = np.max(np.abs(data))
-                if peak > 0.95:
-                    safety_scale = 0.95 / peak
-                    data = data * safety_scale
-                    scale = scale * safety_scale
-                
-                gain_change_db = 20 * np.log10(scale)
-                new_rms = np.sqrt(np.mean(data**2))
-                
-                print(f"  Original RMS: {rms:.4f}")
-                print(f"  New RMS: {new_rms:.4f}")
-                print(f"  Gain change: {gain_change_db:.1f}dB")
-                print(f"  Final peak: {np.max(np.abs(data)):.3f}")
-            else:
-                print(f"  ⚠️  Very quiet file, skipping normalization")
+            # === LOUDNESS NORMALIZATION (cached gain, applied at playback) ===
+            loudness = analyze_file(filepath)
+            self.gain = 10 ** (loudness['gain_db'] / 20)
+            print(f"  Peak: {loudness['peak']:.3f}  RMS: {loudness['rms_db']:.1f}dB")
+            print(f"  Gain change: {loudness['gain_db']:.1f}dB"
+                  f"{' (cached in config)' if read_loudness(filepath) else ' (no config: not cached)'}")
             # === END NORMALIZATION ===
             
             # Resample if needed
@@ -262,24 +191,18 @@ class CrossfadeTesterWithLabels:
             # Update crossfade
             self.crossfade_samples = int(self.crossfade_ms * self.sample_rate / 1000)
             
-            # Load existing config
-            config_path = filepath.replace('.wav', '.txt').replace('.mp3', '.txt').replace('.flac', '.txt').replace('.ogg', '.txt')
-            if os.path.exists(config_path):
-                try:
-                    with open(config_path, 'r') as f:
-                        config = json.load(f)
-                        if 'crossfade_ms' in config:
-                            self.crossfade_ms = config['crossfade_ms']
-                            self.crossfade_samples = int(self.crossfade_ms * self.sample_rate / 1000)
-                            print(f"Loaded saved crossfade: {self.crossfade_ms}ms")
-                except:
-                    print("Could not load config, using default")
-            
-            # Check for label file
-            label_path = self.find_label_file(filepath)
-            if label_path and os.path.exists(label_path):
-                print(f"Found label file: {os.path.basename(label_path)}")
-                self.labels = self.parse_audacity_labels(label_path)
+            # Load existing config (library manifest or .txt)
+            config = read_config(filepath)
+            if config and 'crossfade_ms' in config:
+                self.crossfade_ms = config['crossfade_ms']
+                self.crossfade_samples = int(self.crossfade_ms * self.sample_rate / 1000)
+                print(f"Loaded saved crossfade: {self.crossfade_ms}ms")
+            
+            # Labels from the index (manifest, _label.txt or _loops.txt)
+            labels = self.label_index.get(filepath)
+            if labels is not None:
+                print(f"Found labels for {filename}")
+                self.labels = [LabelInfo(start, end, description) for start, end, description in labels]
                 
                 if self.labels:
                     print(f"  Found {len(self.labels)} labels")
@@ -371,38 +294,10 @@ class CrossfadeTesterWithLabels:
         if self.audio_data is None:
             return
         
-        crossfade_samples = self.crossfade_samples
-        
-        # Calculate total buffer length
-        total_buffer_samples = self.total_samples + (self.buffer_loops - 1) * (self.total_samples - crossfade_samples)
-        
-        # Create buffer
-        self.buffer = np.zeros((total_buffer_samples, 2), dtype=np.float32)
-        
-        # Render first loop (full)
-        self.buffer[:self.total_samples] = self.audio_data
-        
-        # Render subsequent loops with crossfade
-        for loop in range(1, self.buffer_loops):
-            start_sample = self.total_samples + (loop - 1) * (self.total_samples - crossfade_samples)
-            
-            # Get the overlapping region from previous loop
-            prev_end = self.buffer[start_sample - crossfade_samples:start_sample].copy()
-            curr_start = self.audio_data[:crossfade_samples].copy()
-            
-            # Apply crossfade
-            t = np.linspace(0, 1, crossfade_samples).reshape(-1, 1)
-            crossfade_region = prev_end * (1 - t) + curr_start * t
-            
-            # Write crossfade region
-            self.buffer[start_sample - crossfade_samples:start_sample] = crossfade_region
-            
-            # Write rest of current loop
-            remaining = self.total_samples - crossfade_samples
-            if remaining > 0:
-                self.buffer[start_sample:start_sample + remaining] = self.audio_data[crossfade_samples:]
+        # Same renderer as the live engine and the WAV export
+        self.buffer = render_loops(self.audio_data, self.crossfade_samples, self.buffer_loops)
         
-        print(f"  Created buffer: {self.buffer_loops} loops ({total_buffer_samples/self.sample_rate:.1f}s)")
+        print(f"  Created buffer: {self.buffer_loops} loops ({len(self.buffer)/self.sample_rate:.1f}s)")
     
     def audio_callback(self, outdata, frames, time, status):
         """Simple playback of pre-rendered buffer."""
@@ -419,7 +314,8 @@ class CrossfadeTesterWithLabels:
         
         if frames_to_read > 0:
             # Read from buffer
-            outdata[:frames_to_read] = self.buffer[self.buffer_position:self.buffer_position + frames_to_read]
+            np.multiply(self.buffer[self.buffer_position:self.buffer_position + frames_to_read],
+                        self.gain, out=outdata[:frames_to_read])
             self.buffer_position += frames_to_read
             
             # Count loops completed
@@ -445,7 +341,7 @@ class CrossfadeTesterWithLabels:
             if self.continuous_mode:
                 self.buffer_position = 0
                 remaining_frames = frames - frames_to_read
-                outdata[frames_to_read:] = self.buffer[:remaining_frames]
+                np.multiply(self.buffer[:remaining_frames], self.gain, out=outdata[frames_to_read:])
                 self.buffer_position = remaining_frames
         
         # Stop if in play-once mode and completed a loop
@@ -499,7 +395,7 @@ class CrossfadeTesterWithLabels:
         self.buffer_position = 0
     
     def save_config(self):
-        """Save current crossfade to .txt file."""
+        """Save current crossfade to the file's config (library manifest or .txt)."""
         if not self.filename:
             return
         
@@ -507,8 +403,8 @@ class CrossfadeTesterWithLabels:
         for f in os.listdir(directory):
             if f == self.filename:
                 filepath = os.path.join(directory, f)
-                config_path = filepath.replace('.wav', '.txt').replace('.mp3', '.txt').replace('.flac', '.txt').replace('.ogg', '.txt')
                 
+                # Merged into the existing config (keeps loudness, tempo, labels...)
                 config = {
                     "crossfade_ms": self.crossfade_ms,
                     "type": "rhythmic" if self.is_rhythmic else "ambient",
@@ -518,56 +414,34 @@ class CrossfadeTesterWithLabels:
                 }
                 
                 try:
-                    with open(config_path, 'w') as f:
-                        json.dump(config, f, indent=2)
+                    update_config(filepath, config)
                     print(f"\n💾 Saved crossfade {self.crossfade_ms}ms")
                 except Exception as e:
                     print(f"Error saving config: {e}")
                 break
     
-    def generate_test_wav(self, num_loops: int = 3):
-        """Generate a test WAV file."""
+    def generate_test_wav(self, num_loops: int = 3, export_format: str = 'wav'):
+        """Generate a test file, streamed block-by-block to disk."""
         if self.audio_data is None:
             print("No audio loaded!")
             return
         
-        print(f"\nGenerating test WAV with {num_loops} loops...")
+        print(f"\nGenerating test {export_format.upper()} with {num_loops} loops...")
         
         try:
-            crossfade_samples = self.crossfade_samples
-            
-            # Calculate total length
-            total_output = self.total_samples + (num_loops - 1) * (self.total_samples - crossfade_samples)
-            output = np.zeros((total_output, 2), dtype=np.float32)
-            
-            # Render loops
-            output[:self.total_samples] = self.audio_data
-            
-            for loop in range(1, num_loops):
-                start_sample = self.total_samples + (loop - 1) * (self.total_samples - crossfade_samples)
-                
-                prev_end = output[start_sample - crossfade_samples:start_sample].copy()
-                curr_start = self.audio_data[:crossfade_samples].copy()
-                
-                t = np.linspace(0, 1, crossfade_samples).reshape(-1, 1)
-                crossfade_region = prev_end * (1 - t) + curr_start * t
-                
-                output[start_sample - crossfade_samples:start_sample] = crossfade_region
-                
-                remaining = self.total_samples - crossfade_samples
-                if remaining > 0:
-                    output[start_sample:start_sample + remaining] = self.audio_data[crossfade_samples:]
-            
             # Save
             timestamp = time.strftime("%Y%m%d_%H%M%S")
             base_name = os.path.splitext(self.filename)[0]
-            test_filename = f"{base_name}_{num_loops}loops_{self.crossfade_ms}ms_{timestamp}.wav"
+            extension = EXPORT_FORMATS[export_format][0]
+            test_filename = f"{base_name}_{num_loops}loops_{self.crossfade_ms}ms_{timestamp}{extension}"
             test_path = os.path.join("samples/real_test", test_filename)
             
-            sf.write(test_path, output, self.sample_rate)
+            frames = export_loops(self.audio_data, self.crossfade_samples, num_loops, test_path,
+                                  sample_rate=self.sample_rate, export_format=export_format,
+                                  gain=self.gain)
             
             print(f"\n✅ Generated: {test_filename}")
-            print(f"   Duration: {len(output)/self.sample_rate:.1f}s")
+            print(f"   Duration: {frames/self.sample_rate:.1f}s")
             
         except Exception as e:
             print(f"Error generating WAV: {e}")
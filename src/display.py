@@ -2,68 +2,60 @@
 """
 Display module for Roland S-1 Controller
 Now includes delay/reverb effects display and memory monitoring.
+Renders only from the engine's published status snapshot (engine_status):
+the display thread never reads engine attributes or opens files.
 """
 
-import os
 import time
 import threading
 from datetime import datetime
-import soundfile as sf  # Add this to get audio duration
+
+from terminal_renderer import TerminalRenderer
+from engine_status import EngineStatus, LayerStatus, StatusPublisher
 
 class Display:
     """Handles display output for the controller."""
     
-    def __init__(self, audio_engine=None, file_manager=None, memory_monitor=None):
+    def __init__(self, audio_engine=None, file_manager=None, memory_monitor=None, fd=None):
         self.audio_engine = audio_engine
         self.file_manager = file_manager
         self.memory_monitor = memory_monitor
         self.running = False
         self.display_thread = None
         
-        # Cache for file durations to avoid reading files every frame
-        self.duration_cache = {}
-        
-        # Display state for effects
-        self.crossfader = 0.0
-        self.delay_amount = 0.0
-        self.reverb_amount = 0.0
-        self.ambient_volume = 1.0
-        self.rhythm_volume = 0.0
-        
-        # Store current filenames
-        self.current_ambient_filename = "None"
-        self.current_rhythm_filename = "None"
+        # Engine state arrives as snapshots (10/s, or right after a control change)
+        self.status = None
+        if audio_engine is not None:
+            self.status = StatusPublisher(audio_engine, memory_monitor=memory_monitor,
+                                          on_publish=self._on_status)
+        self._redraw_requested = False
         
         self.last_update = time.time()
-        self.update_interval = 0.1  # Update every 100ms
+        self.update_interval = 0.1  # Update every 100ms while things change
+        self.idle_interval = 1.0    # Back off to this when frames are unchanged
+        
+        # Diffing ANSI renderer (no shell forks, one write per frame); fd 2 when stdout carries audio
+        self.renderer = TerminalRenderer(fd)
+        self._wake = threading.Event()
+        self.full_redraw_interval = 5.0  # Repaint everything now and then (stray prints scroll)
         
         print("Display initialized (with effects and memory monitoring)")
     
-    # ===== UPDATE METHODS =====
-    
-    def update_crossfader(self, value):
-        self.crossfader = value
-    
-    def update_delay(self, value):
-        self.delay_amount = value
+    # ===== STATUS =====
     
-    def update_reverb(self, value):
-        self.reverb_amount = value
-    
-    def update_volumes(self, ambient_vol, rhythm_vol):
-        self.ambient_volume = ambient_vol
-        self.rhythm_volume = rhythm_vol
-    
-    def update_files(self, ambient_filename, rhythm_filename):
-        """Update the current filenames for display."""
-        self.current_ambient_filename = ambient_filename[:30] if ambient_filename else "None"
-        self.current_rhythm_filename = rhythm_filename[:30] if rhythm_filename else "None"
+    def _on_status(self, status):
+        """Publisher thread: draw a requested frame as soon as its snapshot exists."""
+        if self._redraw_requested:
+            self._redraw_requested = False
+            self._wake.set()
     
     # ===== DISPLAY METHODS =====
     
     def start(self):
         """Start the display thread."""
         self.running = True
+        if self.status:
+            self.status.start()
         self.display_thread = threading.Thread(target=self._display_loop, daemon=True)
         self.display_thread.start()
         print("Display started")
@@ -71,33 +63,37 @@ class Display:
     def stop(self):
         """Stop the display thread."""
         self.running = False
+        self._wake.set()
         if self.display_thread:
             self.display_thread.join(timeout=1.0)
+        if self.status:
+            self.status.stop()
+        self.renderer.close()
         print("Display stopped")
     
     def _display_loop(self):
-        """Main display update loop."""
+        """Main display update loop (adaptive: backs off while nothing changes)."""
+        interval = self.update_interval
+        last_full_redraw = time.time()
+        
         while self.running:
-            self.clear_screen()
-            self.render_display()
-            time.sleep(self.update_interval)
+            now = time.time()
+            if now - last_full_redraw >= self.full_redraw_interval:
+                self.renderer.invalidate()
+                last_full_redraw = now
+            
+            self._wake.clear()
+            if self.render_display():
+                interval = self.update_interval
+            else:
+                interval = min(self.idle_interval, interval * 2)
+            
+            # Sleep until the next frame, or until render() asks for one
+            self._wake.wait(interval)
     
     def clear_screen(self):
         """Clear the terminal screen."""
-        os.system('clear' if os.name == 'posix' else 'cls')
-    
-    def get_audio_duration(self, filepath):
-        """Get duration of audio file in seconds, with caching."""
-        if filepath in self.duration_cache:
-            return self.duration_cache[filepath]
-        
-        try:
-            with sf.SoundFile(filepath) as f:
-                duration = len(f) / f.samplerate
-                self.duration_cache[filepath] = duration
-                return duration
-        except:
-            return 0.0
+        self.renderer.clear()
     
     def format_duration(self, seconds):
         """Format duration as seconds with 1 decimal place."""
@@ -132,36 +128,17 @@ class Display:
         else:
             return f"LONG ({int(amount*100)}%)"
     
-    def get_memory_summary(self):
-        """Get memory usage summary for display."""
-        if not self.memory_monitor:
-            return "RAM: [--]"
-        
-        try:
-            return self.memory_monitor.get_memory_summary()
-        except:
-            return "RAM: [Error]"
-    
     def render_display(self):
-        """Render the main display."""
+        """Render the main display from the latest status snapshot. Returns the number of lines redrawn."""
         # Get current time
         now = datetime.now()
         current_time = now.strftime("%H:%M:%S")
         
-        # Get memory summary
-        memory_summary = self.get_memory_summary()
-        
-        # Get audio engine info
-        ambient_duration = rhythm_duration = 0
-        if self.audio_engine:
-            # Try to get durations if files are loaded
-            if hasattr(self.audio_engine, 'current_ambient_file') and self.audio_engine.current_ambient_file:
-                _, _, ambient_path = self.audio_engine.current_ambient_file
-                ambient_duration = self.get_audio_duration(ambient_path)
-            
-            if hasattr(self.audio_engine, 'current_rhythm_file') and self.audio_engine.current_rhythm_file:
-                _, _, rhythm_path = self.audio_engine.current_rhythm_file
-                rhythm_duration = self.get_audio_duration(rhythm_path)
+        # One immutable snapshot per frame: every value below is from the same instant
+        status = self.status.latest if self.status else EngineStatus()
+        ambient = status.layer('ambient') or LayerStatus('ambient')
+        rhythm = status.layer('rhythm') or LayerStatus('rhythm')
+        memory_summary = status.memory_summary
         
         # Terminal width
         terminal_width = 80
@@ -177,56 +154,77 @@ class Display:
         
         lines.append("├" + "─" * (terminal_width - 2) + "┤")
         
-        # Currently playing files - use stored filenames
-        ambient_name = self.current_ambient_filename
-        rhythm_name = self.current_rhythm_filename
+        # Currently playing files
+        ambient_name = (ambient.filename or "None")[:30]
+        rhythm_name = (rhythm.filename or "None")[:30]
         
         # Ambient track
-        amb_bar = self._draw_progress_bar(self.ambient_volume)
+        amb_bar = self._draw_progress_bar(ambient.volume)
         lines.append(f"│ AMBIENT:  {ambient_name:30} {amb_bar:25} │")
         
         # Rhythm track
-        rhy_bar = self._draw_progress_bar(self.rhythm_volume)
+        rhy_bar = self._draw_progress_bar(rhythm.volume)
         lines.append(f"│ RHYTHM:   {rhythm_name:30} {rhy_bar:25} │")
         
         lines.append("│" + " " * (terminal_width - 2) + "│")
         
         # Crossfader
-        fader_bar = self._draw_crossfader_bar(self.crossfader)
+        fader_bar = self._draw_crossfader_bar(status.crossfader)
         lines.append(f"│ CROSSFADE: {fader_bar}".ljust(terminal_width - 2) + "│")
         
         # Delay
-        delay_desc = self.get_delay_description(self.delay_amount)
-        delay_bar = self._draw_progress_bar(self.delay_amount)
+        delay_desc = self.get_delay_description(status.delay_amount)
+        delay_bar = self._draw_progress_bar(status.delay_amount)
         lines.append(f"│ DELAY:    {delay_desc:15} {delay_bar:25} │")
         
         # Reverb
-        reverb_bar = self._draw_progress_bar(self.reverb_amount)
-        reverb_percent = int(self.reverb_amount * 100)
+        reverb_bar = self._draw_progress_bar(status.reverb_amount)
+        reverb_percent = int(status.reverb_amount * 100)
         lines.append(f"│ REVERB:   {reverb_percent:3}%{' ':12} {reverb_bar:25} │")
         
         lines.append("│" + " " * (terminal_width - 2) + "│")
         
-        # File info (if available)
-        if ambient_duration > 0 or rhythm_duration > 0:
-            lines.append(f"│ DURATION: Ambient={self.format_duration(ambient_duration):6}  Rhythm={self.format_duration(rhythm_duration):6}".ljust(terminal_width - 2) + "│")
+        # Loop lengths (if known): whole seconds, so the line only changes on a new loop
+        if ambient.loop_seconds or rhythm.loop_seconds:
+            lines.append(f"│ LOOP:     Ambient={self.format_duration(ambient.loop_seconds or 0):6}  "
+                         f"Rhythm={self.format_duration(rhythm.loop_seconds or 0):6}"
+                         f"{'  region ' + rhythm.region[:20] if rhythm.region else ''}".ljust(terminal_width - 2) + "│")
         
         # Crossfade info (if available)
-        if hasattr(self.audio_engine, 'ambient_crossfade_ms') and self.audio_engine.ambient_crossfade_ms:
-            lines.append(f"│ LOOP XFADE: A={self.audio_engine.ambient_crossfade_ms:4}ms  R={self.audio_engine.rhythm_crossfade_ms:4}ms".ljust(terminal_width - 2) + "│")
+        if ambient.crossfade_ms:
+            lines.append(f"│ LOOP XFADE: A={ambient.crossfade_ms:4}ms  R={rhythm.crossfade_ms:4}ms".ljust(terminal_width - 2) + "│")
+        
+        # MIDI clock sync (if the S-1 is sending clock)
+        if status.clock_bpm:
+            lines.append(f"│ CLOCK: {status.clock_bpm:6.1f} BPM  rhythm rate x{rhythm.rate:.3f}".ljust(terminal_width - 2) + "│")
+        
+        # Audio callback timing (share of the block's real-time budget)
+        if status.callback_peak is not None:
+            lines.append(f"│ AUDIO: callback peak {status.callback_peak * 100:3.0f}%  "
+                         f"backend errors {status.status_errors}".ljust(terminal_width - 2) + "│")
         
         lines.append("│" + " " * (terminal_width - 2) + "│")
         
         # Controls reminder
-        controls = "CONTROLS: Q=↑A A=↑R W/S=Delay E/D=Reverb ESC=Quit"
+        controls = "CONTROLS: Q=↑A A=↑R W/S=Delay E/D=Reverb R=Region ESC=Quit"
         lines.append(f"│ {controls}".ljust(terminal_width - 2) + "│")
         
         lines.append("└" + "─" * (terminal_width - 2) + "┘")
         
-        # Print everything
-        print("\n".join(lines))
+        # Write only the lines that changed
+        self.last_update = time.time()
+        return self.renderer.draw(lines)
     
     def render(self):
         """Render display (for manual updates from midi_handler)."""
-        self.clear_screen()
-        self.render_display()
+        if self.running:
+            # Snapshot now, then let the display thread draw it (no terminal I/O on the caller)
+            if self.status:
+                self._redraw_requested = True
+                self.status.request()
+            else:
+                self._wake.set()
+        else:
+            if self.status:
+                self.status.publish()
+            self.render_display()
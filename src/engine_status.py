@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Engine Status Snapshots for Roland S-1 Controller
+The engine's state is published a fixed number of times per second as one
+immutable EngineStatus in a single slot. Readers (the display) only ever
+take the latest snapshot: they never touch engine attributes, open files
+or wait on the audio thread, and their cost does not depend on the engine.
+"""
+
+import time
+import threading
+from typing import NamedTuple, Optional, Tuple
+
+
+class LayerStatus(NamedTuple):
+    """One mixer layer at snapshot time."""
+    name: str
+    filename: Optional[str] = None        # Playing file (None if empty)
+    next_filename: Optional[str] = None   # Pre-loaded file
+    crossfade_ms: float = 0
+    volume: float = 0.0
+    gain: float = 1.0
+    loop_seconds: Optional[float] = None      # Loop period (None if unknown)
+    position_seconds: Optional[float] = None  # Position within the loop
+    bpm: Optional[float] = None           # Native tempo of the file
+    rate: float = 1.0                     # Playback rate (MIDI clock sync)
+    region: Optional[str] = None          # Labelled region being looped
+
+
+class EngineStatus(NamedTuple):
+    """Everything the display shows, taken at one instant."""
+    layers: Tuple[LayerStatus, ...] = ()
+    crossfader: float = 0.0
+    delay_amount: float = 0.0
+    reverb_amount: float = 0.0
+    clock_bpm: Optional[float] = None     # MIDI clock tempo (None without clock)
+    playing: bool = False
+    sample_time: int = 0                  # Stream frames rendered
+    callback_load: Optional[float] = None  # Last callback time / block time
+    callback_peak: Optional[float] = None  # Worst since the previous snapshot
+    status_errors: int = 0                # Callbacks flagged by the backend (underflows)
+    memory_summary: str = "RAM: [--]"
+    sequence: int = 0
+    taken_at: float = 0.0                 # perf_counter() of the snapshot
+
+    def layer(self, name):
+        """Status of a layer by name (None if the engine has no such layer)."""
+        for layer in self.layers:
+            if layer.name == name:
+                return layer
+        return None
+
+
+class StatusPublisher:
+    """
+    Publishes source.status_snapshot() at a fixed rate into `latest`.
+    request() publishes early (after a control change); on_publish, if set,
+    is called on the publisher thread after every snapshot.
+    """
+
+    def __init__(self, source, rate=10.0, memory_monitor=None, on_publish=None):
+        self.source = source
+        self.interval = 1.0 / rate
+        self.memory_monitor = memory_monitor
+        self.on_publish = on_publish
+        self.latest = EngineStatus()  # The single slot: replaced whole, never mutated
+        self.running = False
+        self._sequence = 0
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="status-publisher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.running = False
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        self._thread = None
+
+    def request(self):
+        """Publish as soon as possible (any thread)."""
+        self._wake.set()
+
+    def publish(self):
+        """Take one snapshot now and store it in the slot."""
+        status = self.source.status_snapshot()
+        memory = self._memory_summary() if self.memory_monitor else status.memory_summary
+        self._sequence += 1
+        self.latest = status._replace(memory_summary=memory, sequence=self._sequence,
+                                      taken_at=time.perf_counter())
+        if self.on_publish:
+            self.on_publish(self.latest)
+        return self.latest
+
+    def _memory_summary(self):
+        """Memory line for the display; a failing monitor must not cost the whole snapshot."""
+        try:
+            return self.memory_monitor.get_memory_summary()
+        except Exception:
+            return "RAM: [Error]"
+
+    def _run(self):
+        last_error = None
+        while self.running:
+            self._wake.clear()
+            try:
+                self.publish()
+                last_error = None
+            except Exception as e:
+                # Report each distinct failure once, not on every tick over the display
+                if str(e) != last_error:
+                    print(f"Status snapshot error: {e}")
+                    last_error = str(e)
+            self._wake.wait(self.interval)
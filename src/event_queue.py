@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Timestamped control events for the audio callback
+A single-producer/single-consumer ring: the control loop pushes events
+stamped with the stream sample time they should sound at, and the audio
+callback pops them and applies each one at its exact offset in the block.
+"""
+
+import sys
+
+# Event kinds
+EVENT_CROSSFADER = 'crossfader'
+EVENT_VOLUME = 'volume'          # value: (layer name, volume)
+EVENT_DELAY = 'delay'
+EVENT_REVERB = 'reverb'
+
+
+class EventRing:
+    """
+    Fixed-size SPSC ring of (sample_time, kind, value).
+    Only the producer moves `_head` and only the consumer moves `_tail`,
+    and each slot is written before `_head` publishes it, so no lock is
+    needed between the control thread and the audio callback.
+
+    When the ring is full, events coalesce into a "latest value" slot per
+    key instead. Everything pushed after that coalesces too, until the
+    consumer has applied the ring and drained the slot, so a queued older
+    value never overtakes a newer one.
+    """
+
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self._times = [0] * capacity
+        self._kinds = [None] * capacity
+        self._values = [None] * capacity
+        self._head = 0        # Total events pushed (producer only)
+        self._tail = 0        # Total events popped (consumer only)
+        self._last_time = 0   # Keeps stamps non-decreasing for the consumer
+        self._latest = {}     # key -> (kind, value) coalesced on overflow
+
+    def __len__(self):
+        return self._head - self._tail
+
+    @property
+    def nbytes(self):
+        """Memory held by the slot arrays (not the queued values)."""
+        return sum(sys.getsizeof(slots) for slots in (self._times, self._kinds, self._values))
+
+    # ===== PRODUCER SIDE =====
+
+    def push(self, sample_time, kind, value, key=None):
+        """
+        Queue an event. If the ring is full (or already overflowed), keep only
+        the latest value for key (default: kind) until the consumer drains it.
+        """
+        head = self._head
+        if self._latest or head - self._tail >= self.capacity:
+            self._latest[kind if key is None else key] = (kind, value)
+            return
+
+        sample_time = max(sample_time, self._last_time)
+        slot = head % self.capacity
+        self._times[slot] = sample_time
+        self._kinds[slot] = kind
+        self._values[slot] = value
+        self._last_time = sample_time
+        self._head = head + 1  # Publish
+
+    # ===== CONSUMER SIDE =====
+
+    def peek_time(self):
+        """Sample time of the oldest event (None if empty)."""
+        if self._tail == self._head:
+            return None
+        return self._times[self._tail % self.capacity]
+
+    def pop(self):
+        """Remove the oldest event. Returns (kind, value)."""
+        slot = self._tail % self.capacity
+        event = (self._kinds[slot], self._values[slot])
+        self._values[slot] = None
+        self._tail += 1
+        return event
+
+    def pop_latest(self):
+        """Remove one coalesced overflow event (call once the ring is empty). Returns (kind, value) or None."""
+        try:
+            return self._latest.popitem()[1]
+        except KeyError:
+            return None
@@ -4,11 +4,16 @@ File Manager for Roland S-1 Controller
 Handles scanning and selection of audio files with crossfade configs.
 """
 
-import os
 import random
-import json
 from pathlib import Path
 
+from loudness import gain_from_config
+from library_manifest import manifest_for, read_sidecar
+from label_index import LabelIndex
+
+# Playable library formats (libsndfile decodes them all; compressed ones stream in blocks)
+AUDIO_EXTENSIONS = ('.wav', '.flac', '.ogg', '.mp3')
+
 class FileManager:
     """Manages audio files and their crossfade configurations."""
     
@@ -20,6 +25,12 @@ class FileManager:
         self.ambient_files = []  # List of tuples: (filename, crossfade_ms, filepath)
         self.rhythm_files = []   # List of tuples: (filename, crossfade_ms, filepath)
         
+        # Cached loudness gains from sidecar configs (filepath -> linear gain)
+        self.gains = {}
+        
+        # Parsed Audacity labels per file (built during the scan, invalidated by mtime)
+        self.labels = LabelIndex()
+        
         # Cache for next files (for auto-loading)
         self.next_ambient = None
         self.next_rhythm = None
@@ -31,8 +42,8 @@ class FileManager:
             print(f"  Rhythm: {rhythm_dir}")
     
     def scan_ambient_files(self):
-        """Scan for ambient files and their crossfade configs (JSON format)."""
-        self.ambient_files = []
+        """Scan for ambient files and their crossfade configs (manifest or JSON .txt)."""
+        files = []  # Published when complete (the scan may run in the background)
         
         if not self.ambient_dir or not self.ambient_dir.exists():
             print(f"⚠️ Warning: Ambient path not found: {self.ambient_dir}")
@@ -40,39 +51,29 @@ class FileManager:
         
         print(f"Scanning ambient files in: {self.ambient_dir}")
         
-        # Use more flexible pattern matching
-        for wav_file in self.ambient_dir.glob("*.wav"):
-            if not wav_file.name.startswith(('a_', 'a ')):
+        manifest = manifest_for(self.ambient_dir)  # One open for the whole directory
+        for audio_file in self._audio_files(self.ambient_dir, ('a_', 'a ')):
+            filename = audio_file.name
+            config = self._config(manifest, audio_file)
+            if config is None:
+                print(f"  ⚠️ No config file for {filename[:30]}...")
                 continue
-                
-            txt_file = wav_file.with_suffix('.txt')
-            filename = wav_file.name
             
-            if txt_file.exists():
-                try:
-                    with open(txt_file, 'r') as f:
-                        # Parse JSON
-                        config = json.load(f)
-                        
-                        # Get crossfade value
-                        crossfade_ms = config.get('crossfade_ms', 0)
-                        
-                        self.ambient_files.append((filename, crossfade_ms, str(wav_file)))
-                        print(f"  ✅ {filename[:30]:30} (xfade: {crossfade_ms:4}ms)")
-                        
-                except json.JSONDecodeError as e:
-                    print(f"  ❌ Invalid JSON in {txt_file.name}: {e}")
-                except Exception as e:
-                    print(f"  ❌ Error reading {txt_file.name}: {e}")
-            else:
-                print(f"  ⚠️ No config file for {filename[:30]}...")
+            # Get crossfade value
+            crossfade_ms = config.get('crossfade_ms', 0)
+            
+            files.append((filename, crossfade_ms, str(audio_file)))
+            self.gains[str(audio_file)] = gain_from_config(config, audio_file)
+            print(f"  ✅ {filename[:30]:30} (xfade: {crossfade_ms:4}ms)")
         
-        print(f"Found {len(self.ambient_files)} ambient files with configs")
+        self.labels.index_directory(self.ambient_dir, [path for _, _, path in files])
+        self.ambient_files = files
+        print(f"Found {len(files)} ambient files with configs")
         return self.ambient_files
     
     def scan_rhythm_files(self):
-        """Scan for rhythm files and their crossfade configs (JSON format)."""
-        self.rhythm_files = []
+        """Scan for rhythm files and their crossfade configs (manifest or JSON .txt)."""
+        files = []  # Published when complete (the scan may run in the background)
         
         if not self.rhythm_dir or not self.rhythm_dir.exists():
             print(f"⚠️ Warning: Rhythm path not found: {self.rhythm_dir}")
@@ -80,36 +81,57 @@ class FileManager:
         
         print(f"Scanning rhythm files in: {self.rhythm_dir}")
         
-        # Use more flexible pattern matching
-        for wav_file in self.rhythm_dir.glob("*.wav"):
-            if not wav_file.name.startswith(('r_', 'r ')):
+        manifest = manifest_for(self.rhythm_dir)  # One open for the whole directory
+        for audio_file in self._audio_files(self.rhythm_dir, ('r_', 'r ')):
+            filename = audio_file.name
+            config = self._config(manifest, audio_file)
+            if config is None:
+                print(f"  ⚠️ No config file for {filename[:30]}...")
                 continue
-                
-            txt_file = wav_file.with_suffix('.txt')
-            filename = wav_file.name
             
-            if txt_file.exists():
-                try:
-                    with open(txt_file, 'r') as f:
-                        # Parse JSON
-                        config = json.load(f)
-                        
-                        # Get crossfade value
-                        crossfade_ms = config.get('crossfade_ms', 0)
-                        
-                        self.rhythm_files.append((filename, crossfade_ms, str(wav_file)))
-                        print(f"  ✅ {filename[:30]:30} (xfade: {crossfade_ms:4}ms)")
-                        
-                except json.JSONDecodeError as e:
-                    print(f"  ❌ Invalid JSON in {txt_file.name}: {e}")
-                except Exception as e:
-                    print(f"  ❌ Error reading {txt_file.name}: {e}")
-            else:
-                print(f"  ⚠️ No config file for {filename[:30]}...")
+            # Get crossfade value
+            crossfade_ms = config.get('crossfade_ms', 0)
+            
+            files.append((filename, crossfade_ms, str(audio_file)))
+            self.gains[str(audio_file)] = gain_from_config(config, audio_file)
+            print(f"  ✅ {filename[:30]:30} (xfade: {crossfade_ms:4}ms)")
         
-        print(f"Found {len(self.rhythm_files)} rhythm files with configs")
+        self.labels.index_directory(self.rhythm_dir, [path for _, _, path in files])
+        self.rhythm_files = files
+        print(f"Found {len(files)} rhythm files with configs")
         return self.rhythm_files
     
+    def first_ambient_file(self):
+        """First usable ambient file, without scanning the whole library (fast startup)."""
+        return self._first_file(self.ambient_dir, ('a_', 'a '))
+    
+    def first_rhythm_file(self):
+        """First usable rhythm file, without scanning the whole library (fast startup)."""
+        return self._first_file(self.rhythm_dir, ('r_', 'r '))
+    
+    def _first_file(self, directory, prefixes):
+        if not directory or not directory.exists():
+            return None
+        manifest = manifest_for(directory)
+        for audio_file in self._audio_files(directory, prefixes):
+            config = self._config(manifest, audio_file)
+            if config is None:
+                continue
+            self.gains[str(audio_file)] = gain_from_config(config, audio_file)
+            return (audio_file.name, config.get('crossfade_ms', 0), str(audio_file))
+        return None
+    
+    def _config(self, manifest, audio_file):
+        """Config from the directory manifest, else the legacy .txt sidecar (None if neither)."""
+        config = manifest.get(audio_file) if manifest is not None else None
+        return config if config is not None else read_sidecar(audio_file)
+    
+    def _audio_files(self, directory, prefixes):
+        """Library files in directory (any AUDIO_EXTENSIONS format) whose names start with prefixes."""
+        for path in directory.iterdir():
+            if path.suffix.lower() in AUDIO_EXTENSIONS and path.name.startswith(prefixes):
+                yield path
+    
     def get_random_ambient(self):
         """Get a random ambient file with its crossfade value."""
         if not self.ambient_files:
@@ -130,6 +152,14 @@ class FileManager:
         
         return random.choice(self.rhythm_files)
     
+    def get_gain(self, filepath):
+        """Get the cached loudness gain for a file (1.0 if not analysed)."""
+        return self.gains.get(str(filepath), 1.0)
+    
+    def get_labels(self, filepath):
+        """Get the indexed labels for a file (None if it has none)."""
+        return self.labels.get(filepath)
+    
     # Legacy methods for compatibility
     def get_next_ambient(self):
         """Legacy method - alias for get_random_ambient."""
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Label Index for Roland S-1 Controller
+Parsed Audacity labels for every library file, built once during the
+library scan instead of probing and re-parsing label files on each load.
+
+Label sources, first found wins: the 'labels' rows of the directory's
+library.json, <name>_label.txt (hand-made in Audacity), <name>_loops.txt
+(BeatDetector's 4-bar segments). Each entry remembers the mtime of its
+source (or of the directory, when it had none) and is re-read when it changes.
+"""
+
+import os
+import threading
+
+import numpy as np
+
+from library_manifest import MANIFEST_NAME, manifest_for, read_audacity_labels
+
+LABEL_SUFFIXES = ('_label.txt', '_loops.txt')
+
+
+class Labels:
+    """Labels of one file as compact arrays: start/end seconds plus descriptions."""
+
+    def __init__(self, rows):
+        self.starts = np.array([row[0] for row in rows], dtype=np.float64)
+        self.ends = np.array([row[1] for row in rows], dtype=np.float64)
+        self.descriptions = tuple(row[2] for row in rows)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, index):
+        """(start_s, end_s, description) of one label."""
+        return float(self.starts[index]), float(self.ends[index]), self.descriptions[index]
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+    def regions(self):
+        """Labels that span time (end > start), e.g. loop segments."""
+        return [index for index in range(len(self)) if self.ends[index] > self.starts[index]]
+
+    def find(self, description):
+        """Index of the first label with this description (None if absent)."""
+        try:
+            return self.descriptions.index(description)
+        except ValueError:
+            return None
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class LabelIndex:
+    """audio path -> Labels (None if the file has no labels), invalidated by mtime."""
+
+    def __init__(self):
+        self._entries = {}  # audio path -> (source path, source mtime, Labels or None)
+        self._lock = threading.Lock()
+
+    def index_directory(self, directory, audio_paths):
+        """Index the given files of one directory with a single listing (called by the scan)."""
+        directory = str(directory)
+        try:
+            names = set(os.listdir(directory))
+        except OSError:
+            return
+        manifest = manifest_for(directory) if MANIFEST_NAME in names else None
+        for audio_path in audio_paths:
+            self._store(str(audio_path), self._load(str(audio_path), names, manifest))
+
+    def get(self, audio_path):
+        """Labels of a file (None if it has none); indexes or re-reads it if needed."""
+        audio_path = str(audio_path)
+        entry = self._entries.get(audio_path)
+        if entry is not None and _mtime(entry[0]) == entry[1]:
+            return entry[2]
+        directory = os.path.dirname(audio_path) or '.'
+        try:
+            names = set(os.listdir(directory))
+        except OSError:
+            return None
+        manifest = manifest_for(directory) if MANIFEST_NAME in names else None
+        entry = self._load(audio_path, names, manifest)
+        self._store(audio_path, entry)
+        return entry[2]
+
+    def _store(self, audio_path, entry):
+        with self._lock:
+            self._entries[audio_path] = entry
+
+    def _load(self, audio_path, names, manifest):
+        """(source path, source mtime, Labels or None) for one file."""
+        directory = os.path.dirname(audio_path) or '.'
+        rows = manifest.get(audio_path).get('labels') if manifest and manifest.get(audio_path) else None
+        if rows:
+            return manifest.path, _mtime(manifest.path), Labels(rows)
+
+        base = os.path.splitext(os.path.basename(audio_path))[0]
+        for suffix in LABEL_SUFFIXES:
+            if base + suffix in names:
+                path = os.path.join(directory, base + suffix)
+                try:
+                    mtime = _mtime(path)
+                    return path, mtime, Labels(read_audacity_labels(path)) or None
+                except OSError as e:
+                    print(f"Error reading label file {path}: {e}")
+
+        # No labels: watch the directory, so a label file added later is picked up
+        return directory, _mtime(directory), None
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Library Manifest for Roland S-1 Controller
+One JSON file per library directory (library.json) holding the config of
+every sample in it: crossfade, labels, loudness gain, tempo and seam data.
+A scan reads it with a single open instead of one .txt per file.
+
+Entries are keyed by file stem, like the .txt sidecars, so a transcoded
+copy in a mirrored directory (samples_mp3/ambient/a_x.mp3) shares its
+config. Keep one format of each file per directory: a_x.wav and a_x.mp3
+side by side would share one entry, so per-file data (loudness) is not
+cached for them. Directories without a manifest keep working from the
+legacy .txt sidecars; migrate them with
+
+    python src/library_manifest.py samples/ambient samples/rhythm
+"""
+
+import os
+import json
+import argparse
+import threading
+
+MANIFEST_NAME = 'library.json'
+MANIFEST_VERSION = 1
+
+# Known per-file fields and their JSON types (unknown fields are kept as-is)
+SCHEMA = {
+    'crossfade_ms': (int, float),
+    'type': (str,),
+    'selected_label': (str, type(None)),
+    'saved_at': (str,),
+    'note': (str,),
+    'loudness': (dict,),
+    'tempo_bpm': (int, float),
+    'labels': (list,),   # [start_s, end_s, description] rows
+    'seam': (dict,),
+}
+
+# Sidecars that are not JSON configs (Audacity labels, BeatDetector output)
+NON_CONFIG_SUFFIXES = ('_label.txt', '_loops.txt', '_beats.txt')
+
+
+def manifest_key(audio_path):
+    """Manifest key of an audio file: its name without extension."""
+    return os.path.splitext(os.path.basename(audio_path))[0]
+
+
+def validate_entry(entry):
+    """Schema problems of one entry (empty list if valid)."""
+    if not isinstance(entry, dict):
+        return [f"entry is {type(entry).__name__}, not an object"]
+    problems = []
+    for field, types in SCHEMA.items():
+        value = entry.get(field)
+        if field in entry and (not isinstance(value, types) or isinstance(value, bool)):
+            problems.append(f"{field}: expected {'/'.join(t.__name__ for t in types)}, "
+                            f"got {type(value).__name__}")
+    for row in entry.get('labels') or []:
+        if not (isinstance(row, list) and len(row) == 3
+                and all(isinstance(t, (int, float)) for t in row[:2]) and isinstance(row[2], str)):
+            problems.append(f"labels: bad row {row!r}")
+            break
+    return problems
+
+
+def read_audacity_labels(label_path):
+    """Audacity label rows [start_s, end_s, description] (tab-separated text)."""
+    labels = []
+    with open(label_path, 'r') as f:
+        for line_num, line in enumerate(f, 1):
+            parts = line.strip().split('\t')
+            if len(parts) < 2 or parts[0].startswith('#'):
+                continue
+            try:
+                labels.append([float(parts[0]), float(parts[1]),
+                               parts[2].strip() if len(parts) > 2 else f"Label {line_num}"])
+            except ValueError:
+                print(f"Warning: Could not parse line {line_num} of {label_path}: {line.strip()}")
+    return labels
+
+
+class LibraryManifest:
+    """Config of every file in one library directory."""
+
+    def __init__(self, directory, entries=None):
+        self.directory = str(directory)
+        self.path = os.path.join(self.directory, MANIFEST_NAME)
+        self.entries = entries if entries is not None else {}  # key -> config dict
+
+    @classmethod
+    def load(cls, directory):
+        """Read a directory's manifest (None if it has none). Invalid entries are skipped."""
+        path = os.path.join(str(directory), MANIFEST_NAME)
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"❌ Invalid manifest {path}: {e}")
+            return None
+
+        entries = {}
+        for key, entry in (data.get('files') or {}).items() if isinstance(data, dict) else ():
+            problems = validate_entry(entry)
+            if problems:
+                print(f"  ⚠️ {MANIFEST_NAME}: skipping {key}: {'; '.join(problems)}")
+                continue
+            entries[key] = entry
+        return cls(directory, entries)
+
+    def get(self, audio_path):
+        """Config for an audio file (None if it has no entry)."""
+        return self.entries.get(manifest_key(audio_path))
+
+    def update(self, audio_path, fields):
+        """Merge fields into a file's entry (raises ValueError if the result breaks the schema)."""
+        entry = dict(self.entries.get(manifest_key(audio_path), {}))
+        entry.update(fields)
+        problems = validate_entry(entry)
+        if problems:
+            raise ValueError(f"{manifest_key(audio_path)}: {'; '.join(problems)}")
+        self.entries[manifest_key(audio_path)] = entry
+        return entry
+
+    def save(self):
+        """Write atomically (a reader never sees a half-written manifest)."""
+        partial = self.path + '.part'
+        with open(partial, 'w') as f:
+            json.dump({'version': MANIFEST_VERSION, 'files': self.entries}, f, indent=2, sort_keys=True)
+        os.replace(partial, self.path)
+
+
+# ===== CONFIG ACCESS (manifest first, legacy .txt sidecar otherwise) =====
+
+_manifests = {}  # directory -> (manifest mtime, LibraryManifest)
+_lock = threading.Lock()
+
+
+def manifest_for(directory):
+    """Cached manifest of a directory, re-read only when the file changes (None if absent)."""
+    directory = os.path.abspath(str(directory))
+    try:
+        mtime = os.stat(os.path.join(directory, MANIFEST_NAME)).st_mtime_ns
+    except OSError:
+        return None
+    with _lock:
+        cached = _manifests.get(directory)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        manifest = LibraryManifest.load(directory)
+        if manifest is not None:
+            _manifests[directory] = (mtime, manifest)
+        return manifest
+
+
+def sidecar_path(audio_path):
+    """Legacy JSON .txt config path next to an audio file."""
+    return os.path.splitext(str(audio_path))[0] + '.txt'
+
+
+def read_sidecar(audio_path):
+    """Parsed legacy .txt config (None if missing or invalid)."""
+    path = sidecar_path(audio_path)
+    try:
+        with open(path, 'r') as f:
+            config = json.load(f)
+    except OSError:
+        return None
+    except json.JSONDecodeError as e:
+        print(f"  ❌ Invalid JSON in {os.path.basename(path)}: {e}")
+        return None
+    return config if isinstance(config, dict) else None
+
+
+def read_config(audio_path):
+    """Config dict for an audio file from its directory manifest or .txt sidecar (None if neither)."""
+    manifest = manifest_for(os.path.dirname(os.path.abspath(str(audio_path))))
+    entry = manifest.get(audio_path) if manifest is not None else None
+    if entry is not None:
+        return dict(entry)
+    return read_sidecar(audio_path)
+
+
+def update_config(audio_path, fields):
+    """
+    Merge fields into an audio file's config, keeping the other keys.
+    Writes the directory manifest if there is one, else the .txt sidecar.
+    Returns the merged config.
+    """
+    directory = os.path.dirname(os.path.abspath(str(audio_path)))
+    with _lock:
+        manifest = LibraryManifest.load(directory)  # Fresh copy: never merge into a stale cache
+        if manifest is not None:
+            if manifest.get(audio_path) is None:
+                # Not migrated yet: start from the .txt sidecar, or read_config would lose it
+                fields = dict(read_sidecar(audio_path) or {}, **fields)
+            config = manifest.update(audio_path, fields)
+            manifest.save()
+            _manifests.pop(directory, None)
+            return dict(config)
+
+    config = read_sidecar(audio_path) or {}
+    config.update(fields)
+    with open(sidecar_path(audio_path), 'w') as f:
+        json.dump(config, f, indent=2)
+    return config
+
+
+# ===== MIGRATION =====
+
+def migrate_directory(directory):
+    """
+    Build (or extend) a directory's manifest from its .txt configs and
+    Audacity _label.txt files. Existing manifest entries win. Returns entries added.
+    """
+    manifest = LibraryManifest.load(directory) or LibraryManifest(directory)
+    added = 0
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.txt') or name.endswith(NON_CONFIG_SUFFIXES):
+            continue
+        path = os.path.join(directory, name)
+        if manifest.get(path) is not None:
+            continue
+        config = read_sidecar(path)
+        if config is None:
+            print(f"  ❌ {name}: not a JSON config, skipped")
+            continue
+
+        label_path = os.path.splitext(path)[0] + '_label.txt'
+        if 'labels' not in config and os.path.exists(label_path):
+            config['labels'] = read_audacity_labels(label_path)
+        try:
+            manifest.update(path, config)
+        except ValueError as e:
+            print(f"  ❌ {e}")
+            continue
+        added += 1
+        print(f"  ✅ {manifest_key(path)[:30]:30} (xfade: {config.get('crossfade_ms', 0):4}ms"
+              f"{', %d labels' % len(config['labels']) if config.get('labels') else ''})")
+
+    if added:
+        manifest.save()
+    return added
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Migrate library .txt configs into per-directory manifests')
+    parser.add_argument('directories', nargs='+', help='Library directories (e.g. samples/ambient samples/rhythm)')
+    args = parser.parse_args()
+
+    for directory in args.directories:
+        print(f"Migrating {directory}:")
+        added = migrate_directory(directory)
+        print(f"  {added} entries added to {os.path.join(directory, MANIFEST_NAME)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Streaming Loop Exporter
+Command-line front end for loop_renderer.export_loops: renders many
+library files in parallel, block-by-block, without holding whole
+outputs in RAM.
+"""
+
+import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import soundfile as sf
+
+from loop_renderer import export_loops, EXPORT_FORMATS
+from library_manifest import read_config
+from loudness import gain_from_config
+
+
+def _load_clip(audio_path, sample_rate):
+    """Read a clip as float32 stereo (same conversions as the tester)."""
+    data, sr = sf.read(audio_path, dtype='float32', always_2d=True)
+
+    if sr != sample_rate:
+        scale = sample_rate / sr
+        new_length = int(len(data) * scale)
+        indices = np.linspace(0, len(data) - 1, new_length).astype(int)
+        data = data[indices]
+
+    if data.shape[1] == 1:
+        data = np.column_stack((data, data))
+
+    return data
+
+
+def render_file(audio_path, output_dir, num_loops, export_format='wav',
+                crossfade_ms=None, sample_rate=44100, normalize=False):
+    """Render one library file (worker entry point for the process pool)."""
+    config = read_config(audio_path) or {}
+    if crossfade_ms is None:
+        crossfade_ms = config.get('crossfade_ms', 0)
+
+    # Cached gain only if it was measured on this version of the file
+    gain = gain_from_config(config, audio_path) if normalize else 1.0
+
+    audio_data = _load_clip(audio_path, sample_rate)
+    crossfade_samples = int(crossfade_ms * sample_rate / 1000)
+
+    extension = EXPORT_FORMATS[export_format][0]
+    base_name = os.path.splitext(os.path.basename(audio_path))[0]
+    output_path = os.path.join(output_dir, f"{base_name}_{num_loops}loops_{crossfade_ms:.0f}ms{extension}")
+
+    frames = export_loops(audio_data, crossfade_samples, num_loops, output_path,
+                          sample_rate=sample_rate, export_format=export_format, gain=gain)
+    return output_path, frames / sample_rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render crossfaded loop sequences to audio files')
+    parser.add_argument('audio_files', nargs='+', help='Source clips (crossfade read from their .txt configs)')
+    parser.add_argument('--output-dir', '-o', default='.', help='Output directory')
+    parser.add_argument('--loops', '-n', type=int, default=3, help='Number of loops to render (default: 3)')
+    parser.add_argument('--format', '-f', choices=sorted(EXPORT_FORMATS), default='wav', help='Output format')
+    parser.add_argument('--crossfade-ms', type=float, help='Override crossfade from config')
+    parser.add_argument('--normalize', action='store_true', help='Apply cached loudness gain')
+    parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count(), help='Parallel render processes')
+
+    args = parser.parse_args()
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    started = time.time()
+    rendered_seconds = 0.0
+
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {
+            pool.submit(render_file, path, args.output_dir, args.loops, args.format,
+                        args.crossfade_ms, 44100, args.normalize): path
+            for path in args.audio_files
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                output_path, duration = future.result()
+                rendered_seconds += duration
+                print(f"  ✅ {os.path.basename(output_path)} ({duration:.1f}s)")
+            except Exception as e:
+                print(f"  ❌ Error rendering {os.path.basename(path)}: {e}")
+
+    elapsed = time.time() - started
+    print(f"\nRendered {rendered_seconds:.1f}s of audio in {elapsed:.1f}s "
+          f"({rendered_seconds / max(elapsed, 1e-6):.0f}x realtime)")
+
+
+if __name__ == "__main__":
+    main()
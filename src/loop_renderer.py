@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Loop Rendering Core
+One implementation of the crossfaded loop splice, shared by the live
+AudioEngine, the crossfade testers and the exporters.
+
+An endlessly crossfaded loop of a clip of length L with a crossfade of
+c samples is periodic with period P = L - c:
+
+    stream[p] = audio[p]                  for p < P   (first pass)
+    stream[p] = seam[(p - P) % P]         if (p - P) % P < c
+    stream[p] = audio[(p - P) % P]        otherwise
+
+where seam = audio[L-c:] * (1 - t) + audio[:c] * t is computed once.
+Everything below (block renderer, full buffers, exporter) reads from
+that description, so the tester's output matches what the engine plays.
+"""
+
+import numpy as np
+import soundfile as sf
+
+# name -> (file extension, soundfile format, soundfile subtype)
+EXPORT_FORMATS = {
+    'wav': ('.wav', 'WAV', 'PCM_16'),
+    'wav24': ('.wav', 'WAV', 'PCM_24'),
+    'float': ('.wav', 'WAV', 'FLOAT'),
+    'flac': ('.flac', 'FLAC', 'PCM_16'),
+    'flac24': ('.flac', 'FLAC', 'PCM_24'),
+}
+
+DEFAULT_BLOCK_FRAMES = 65536
+
+# Loop buffer storage: float32 (exact), or compact int16 / float16 at half the memory.
+# Compact buffers are converted to float32 a block at a time as they are read.
+STORAGE_TYPES = ('float32', 'int16', 'float16')
+INT16_SCALE = 32767.0
+
+
+def clamp_crossfade(loop_length, crossfade_samples):
+    """Limit the crossfade to half the loop (seams must not overlap)."""
+    return max(0, min(int(crossfade_samples), loop_length // 2))
+
+
+def storage_scale(dtype):
+    """Factor from stored samples to float32 (None if stored values are used as-is)."""
+    return np.float32(1.0 / INT16_SCALE) if np.dtype(dtype) == np.int16 else None
+
+
+def encode_block(out, block):
+    """Store a float32 block in out's dtype (int16 is rounded and clipped). Scratches block."""
+    if out.dtype == np.int16:
+        np.multiply(block, INT16_SCALE, out=block)
+        np.rint(block, out=block)
+        np.clip(block, -INT16_SCALE, INT16_SCALE, out=block)
+    out[:] = block
+
+
+def compute_seam(audio, crossfade_samples):
+    """Precompute the crossfade region (tail fading out, head fading in)."""
+    loop_length = len(audio)
+    c = clamp_crossfade(loop_length, crossfade_samples)
+    if c == 0:
+        return np.zeros((0, audio.shape[1]), dtype=np.float32)
+
+    t = np.linspace(0, 1, c).reshape(-1, 1)
+    return (audio[loop_length - c:] * (1 - t) + audio[:c] * t).astype(np.float32)
+
+
+class LoopRenderer:
+    """Endless crossfaded loop of one clip, rendered block by block."""
+
+    def __init__(self, audio, crossfade_samples):
+        # Read-only view: rendering never touches the decoded source
+        self.audio = audio.view()
+        self.audio.flags.writeable = False
+
+        self.loop_length = len(audio)
+        self.channels = audio.shape[1]
+        self.crossfade_samples = clamp_crossfade(self.loop_length, crossfade_samples)
+        self.period = self.loop_length - self.crossfade_samples
+        self.seam = compute_seam(audio, self.crossfade_samples)
+        self.seam.flags.writeable = False
+
+    def normalize(self, position):
+        """Map any stream position into [0, 2 * period)."""
+        if position < self.period:
+            return position
+        return self.period + (position - self.period) % self.period
+
+    def render_block(self, out, position):
+        """Fill out with the loop starting at position. Returns the next position."""
+        frames = len(out)
+        period = self.period
+        c = self.crossfade_samples
+        position = self.normalize(position)
+        written = 0
+
+        while written < frames:
+            if position < period:
+                # First pass: plain audio up to the first seam
+                source, offset, end = self.audio, position, period
+            else:
+                offset = position - period
+                if offset < c:
+                    source, end = self.seam, c
+                else:
+                    source, end = self.audio, period
+
+            count = min(frames - written, end - offset)
+            out[written:written + count] = source[offset:offset + count]
+            written += count
+            position += count
+
+            if position >= 2 * period:
+                position -= period
+
+        return position
+
+    def render(self, frames, position=0):
+        """Render frames of the loop into a new float32 array."""
+        out = np.empty((frames, self.channels), dtype=np.float32)
+        self.render_block(out, position)
+        return out
+
+    @property
+    def nbytes(self):
+        return self.audio.nbytes + self.seam.nbytes
+
+
+class PreRenderedLoop:
+    """
+    A pre-rendered stretch of a LoopRenderer stream that wraps seamlessly.
+    The buffer length is a whole number of periods, so on reaching the end
+    playback continues at loop_start (= one period in) with no discontinuity.
+    """
+
+    def __init__(self, renderer, min_frames, out=None, storage='float32'):
+        period = renderer.period
+        frames = self.buffer_frames(renderer, min_frames)
+        if out is None:
+            out = np.empty((frames, renderer.channels), dtype=storage)
+        # Render straight into the buffer (caller-owned memory such as shared memory allowed)
+        self.buffer = out[:frames]
+        if self.buffer.dtype == np.float32:
+            renderer.render_block(self.buffer, 0)
+        else:
+            self._render_compact(renderer)
+        self.buffer.flags.writeable = False
+        self.scale = storage_scale(self.buffer.dtype)
+        self.loop_start = period
+        self.period = period
+        self.crossfade_samples = renderer.crossfade_samples
+
+    def _render_compact(self, renderer, block_frames=DEFAULT_BLOCK_FRAMES):
+        """Render through a float32 scratch block (never a full float32 copy)."""
+        scratch = np.empty((min(block_frames, len(self.buffer)), renderer.channels), dtype=np.float32)
+        position = 0
+        for start in range(0, len(self.buffer), block_frames):
+            block = scratch[:min(block_frames, len(self.buffer) - start)]
+            position = renderer.render_block(block, position)
+            encode_block(self.buffer[start:start + len(block)], block)
+
+    @staticmethod
+    def buffer_frames(renderer, min_frames):
+        """Length of the buffer for min_frames: a whole number of periods, at least two."""
+        periods = max(2, int(np.ceil(min_frames / renderer.period)))
+        return periods * renderer.period
+
+    @classmethod
+    def from_buffer(cls, buffer, period, crossfade_samples=0):
+        """Wrap an already rendered buffer (e.g. in shared memory) without copying."""
+        loop = cls.__new__(cls)
+        loop.buffer = buffer
+        loop.loop_start = period
+        loop.period = period
+        loop.crossfade_samples = crossfade_samples
+        loop.scale = storage_scale(buffer.dtype)
+        return loop
+
+    def __len__(self):
+        return len(self.buffer)
+
+    @property
+    def nbytes(self):
+        return self.buffer.nbytes
+
+    def read(self, out, position):
+        """Copy the next len(out) frames into out (float32). Returns the next position."""
+        frames = len(out)
+        buffer_len = len(self.buffer)
+        scale = self.scale
+        written = 0
+
+        while written < frames:
+            count = min(frames - written, buffer_len - position)
+            if scale is None:
+                out[written:written + count] = self.buffer[position:position + count]
+            else:
+                # int16: convert straight into the caller's block (no temporary)
+                np.multiply(self.buffer[position:position + count], scale,
+                            out=out[written:written + count], casting='unsafe')
+            written += count
+            position += count
+            if position >= buffer_len:
+                position = self.loop_start
+
+        return position
+
+    def advance(self, position, frames):
+        """Position after frames more frames, without reading them (O(1))."""
+        position += frames
+        if position >= len(self.buffer):
+            position = self.loop_start + (position - self.loop_start) % (len(self.buffer) - self.loop_start)
+        return position
+
+
+def render_frames(audio, crossfade_samples, frames):
+    """Full buffer: the first `frames` samples of the endless loop."""
+    return LoopRenderer(audio, crossfade_samples).render(frames)
+
+
+def render_loops(audio, crossfade_samples, num_loops):
+    """Full buffer: exactly num_loops repetitions, the last one ending naturally."""
+    renderer = LoopRenderer(audio, crossfade_samples)
+    c = renderer.crossfade_samples
+    body = num_loops * renderer.period
+
+    out = np.empty((body + c, renderer.channels), dtype=np.float32)
+    renderer.render_block(out[:body], 0)
+    out[body:] = renderer.audio[renderer.loop_length - c:]
+    return out
+
+
+def loops_length(loop_length, crossfade_samples, num_loops):
+    """Length in samples of render_loops output."""
+    c = clamp_crossfade(loop_length, crossfade_samples)
+    return num_loops * (loop_length - c) + c
+
+
+def export_loops(audio_data, crossfade_samples, num_loops, output_path,
+                 sample_rate=44100, export_format='wav', gain=1.0,
+                 block_frames=DEFAULT_BLOCK_FRAMES):
+    """
+    Stream num_loops crossfaded repetitions of audio_data to output_path,
+    block-by-block through an open SoundFile. Returns frames written.
+    """
+    _, file_format, subtype = EXPORT_FORMATS[export_format]
+    renderer = LoopRenderer(audio_data, crossfade_samples)
+    body = num_loops * renderer.period
+    tail = renderer.audio[renderer.loop_length - renderer.crossfade_samples:]
+
+    scratch = np.empty((block_frames, renderer.channels), dtype=np.float32)
+    frames_written = 0
+    position = 0
+
+    with sf.SoundFile(output_path, 'w', samplerate=sample_rate, channels=renderer.channels,
+                      format=file_format, subtype=subtype) as f:
+        while frames_written < body:
+            block = scratch[:min(block_frames, body - frames_written)]
+            position = renderer.render_block(block, position)
+            if gain != 1.0:
+                block *= gain
+            f.write(block)
+            frames_written += len(block)
+
+        if len(tail):
+            f.write(tail * gain if gain != 1.0 else tail)
+            frames_written += len(tail)
+
+    return frames_written
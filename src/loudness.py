@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Loudness Analysis for Roland S-1 Controller
+Measures integrated loudness and peak once per file and caches a
+normalisation gain in the file's config (library manifest or .txt), so playback only has
+to apply a scalar instead of rescaling the whole file on every load.
+"""
+
+import os
+import argparse
+import numpy as np
+import soundfile as sf
+
+from library_manifest import read_config, update_config
+
+try:
+    from scipy.signal import lfilter  # Optional: K-weighting for the gated measure
+except ImportError:
+    lfilter = None
+
+# Defaults match the old per-load RMS normalisation in the crossfade tester
+TARGET_RMS = 0.2          # Linear RMS target for the 'rms' method
+TARGET_LUFS = -14.0       # Target for the 'gated' (EBU R128-style) method
+MAX_GAIN_DB = 20.0        # Never boost quiet files by more than this
+PEAK_CEILING = 0.95       # Gain is reduced so the peak stays below this
+SILENCE_RMS = 0.0001      # Files quieter than this are left alone
+
+AUDIO_EXTENSIONS = ('.wav', '.flac', '.ogg', '.mp3')
+
+
+def _k_weighting_filters(sample_rate):
+    """K-weighting biquads (high shelf + high pass) for any sample rate."""
+    # Stage 1: high shelf
+    f0 = 1681.974450955533
+    gain_db = 3.999843853973347
+    q = 0.7071752369554196
+    k = np.tan(np.pi * f0 / sample_rate)
+    vh = 10 ** (gain_db / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf_b = [(vh + vb * k / q + k * k) / a0,
+               2 * (k * k - vh) / a0,
+               (vh - vb * k / q + k * k) / a0]
+    shelf_a = [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+
+    # Stage 2: high pass
+    f0 = 38.13547087602444
+    q = 0.5003270373238773
+    k = np.tan(np.pi * f0 / sample_rate)
+    a0 = 1 + k / q + k * k
+    hp_b = [1.0, -2.0, 1.0]
+    hp_a = [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+
+    return (shelf_b, shelf_a), (hp_b, hp_a)
+
+
+class LoudnessAnalyzer:
+    """Single streaming pass over a file: RMS, peak and gated loudness."""
+
+    def __init__(self, method='rms', block_seconds=0.1):
+        if method not in ('rms', 'gated'):
+            raise ValueError(f"Unknown loudness method: {method}")
+        self.method = method
+        self.block_seconds = block_seconds  # 100ms sub-blocks (4 per 400ms gate window)
+
+    def analyze(self, audio_path):
+        """Measure one file without holding it in memory. Returns a dict."""
+        with sf.SoundFile(audio_path) as f:
+            sample_rate = f.samplerate
+            channels = f.channels
+            block_frames = max(1, int(sample_rate * self.block_seconds))
+
+            sum_squares = 0.0
+            peak = 0.0
+            total_frames = 0
+            block_power = []  # Per-channel mean square of each 100ms block
+
+            filters = None
+            if self.method == 'gated' and lfilter is not None:
+                filters = _k_weighting_filters(sample_rate)
+                states = [np.zeros((max(len(a), len(b)) - 1, channels)) for b, a in filters]
+
+            for block in f.blocks(blocksize=block_frames, dtype='float32', always_2d=True):
+                total_frames += len(block)
+                sum_squares += float(np.einsum('ij,ij->', block, block, dtype=np.float64))
+                peak = max(peak, float(np.max(np.abs(block))))
+
+                if self.method == 'gated':
+                    weighted = block
+                    if filters is not None:
+                        for i, (b, a) in enumerate(filters):
+                            weighted, states[i] = lfilter(b, a, weighted, axis=0, zi=states[i])
+                    block_power.append(np.mean(np.square(weighted, dtype=np.float64), axis=0))
+
+        result = {
+            'sample_rate': sample_rate,
+            'frames': total_frames,
+            'peak': peak,
+            'rms': float(np.sqrt(sum_squares / max(1, total_frames * channels))),
+            'lufs': None,
+            'k_weighted': filters is not None,
+        }
+        if self.method == 'gated':
+            result['lufs'] = self._gated_loudness(np.array(block_power).reshape(-1, channels))
+        return result
+
+    def _gated_loudness(self, block_power):
+        """Integrated loudness from 100ms block powers (400ms windows, 75% overlap)."""
+        if len(block_power) < 4:
+            windows = block_power.mean(axis=0, keepdims=True) if len(block_power) else block_power
+        else:
+            # Sliding sum of 4 sub-blocks = 400ms gating windows
+            cumulative = np.cumsum(np.vstack((np.zeros((1, block_power.shape[1])), block_power)), axis=0)
+            windows = (cumulative[4:] - cumulative[:-4]) / 4.0
+
+        if len(windows) == 0:
+            return None
+
+        power = windows.sum(axis=1)
+        with np.errstate(divide='ignore'):
+            loudness = -0.691 + 10 * np.log10(power)
+
+        # Absolute gate at -70 LUFS, then relative gate 10 LU below
+        gated = power[loudness > -70.0]
+        if len(gated) == 0:
+            return None
+        relative_gate = -0.691 + 10 * np.log10(gated.mean()) - 10.0
+        gated = power[loudness > max(-70.0, relative_gate)]
+        if len(gated) == 0:
+            return None
+        return float(-0.691 + 10 * np.log10(gated.mean()))
+
+    def compute_gain_db(self, measurement):
+        """Turn a measurement into a normalisation gain (dB), peak-limited."""
+        if self.method == 'gated' and measurement.get('lufs') is not None:
+            gain_db = TARGET_LUFS - measurement['lufs']
+        elif measurement['rms'] > SILENCE_RMS:
+            gain_db = 20 * np.log10(TARGET_RMS / measurement['rms'])
+        else:
+            return 0.0
+
+        gain_db = min(gain_db, MAX_GAIN_DB)
+
+        # Safety: prevent clipping
+        if measurement['peak'] > 0:
+            ceiling_db = 20 * np.log10(PEAK_CEILING / measurement['peak'])
+            gain_db = min(gain_db, ceiling_db)
+
+        return float(round(gain_db, 2))
+
+
+def _valid_loudness(config, audio_path):
+    """The config's loudness entry if it was measured on the current audio (else None)."""
+    loudness = config.get('loudness') if isinstance(config, dict) else None
+    if not loudness or loudness.get('gain_db') is None:
+        return None
+
+    # Invalidate if the audio changed since it was analysed
+    try:
+        if loudness.get('source_mtime') != int(os.path.getmtime(audio_path)):
+            return None
+    except OSError:
+        return None
+
+    return loudness
+
+
+def read_loudness(audio_path):
+    """Return the cached loudness entry for a file if it is still valid."""
+    return _valid_loudness(read_config(audio_path), audio_path)
+
+
+def stem_clashes(audio_path):
+    """Other audio files next to audio_path with the same stem (they share its config entry)."""
+    base, extension = os.path.splitext(str(audio_path))
+    return [base + other for other in AUDIO_EXTENSIONS
+            if other != extension.lower() and os.path.exists(base + other)]
+
+
+def store_loudness(audio_path, loudness):
+    """
+    Merge a loudness entry into the file's existing config, keeping other keys.
+    Files without a config are left alone (a config is what makes a file part
+    of the library), and so are files sharing their stem with another audio
+    file: one entry cannot hold the loudness of both. Returns True if stored.
+    """
+    if read_config(audio_path) is None:
+        return False
+    clashes = stem_clashes(audio_path)
+    if clashes:
+        print(f"  ⚠️ {os.path.basename(audio_path)} shares its config with "
+              f"{', '.join(os.path.basename(c) for c in clashes)}: loudness not cached")
+        return False
+    update_config(audio_path, {'loudness': loudness})
+    return True
+
+
+def analyze_file(audio_path, method='rms', force=False):
+    """Analyse a file once and cache the result. Returns the loudness entry."""
+    if not force:
+        cached = read_loudness(audio_path)
+        if cached and cached.get('method') == method:
+            return cached
+
+    analyzer = LoudnessAnalyzer(method=method)
+    measurement = analyzer.analyze(audio_path)
+
+    loudness = {
+        'method': method,
+        'gain_db': analyzer.compute_gain_db(measurement),
+        'rms_db': round(float(20 * np.log10(max(measurement['rms'], 1e-10))), 2),
+        'lufs': round(measurement['lufs'], 2) if measurement['lufs'] is not None else None,
+        'k_weighted': measurement['k_weighted'],
+        'peak': round(measurement['peak'], 4),
+        'source_mtime': int(os.path.getmtime(audio_path)),
+    }
+    store_loudness(audio_path, loudness)
+    return loudness
+
+
+def gain_from_config(config, audio_path):
+    """Linear gain from a parsed config (1.0 if never analysed or the audio changed since)."""
+    loudness = _valid_loudness(config, audio_path)
+    if loudness is None:
+        return 1.0
+    return float(10 ** (loudness['gain_db'] / 20))
+
+
+def analyze_directory(directory, method='rms', force=False):
+    """Analyse every configured audio file in a library directory."""
+    results = []
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith(AUDIO_EXTENSIONS):
+            continue
+
+        path = os.path.join(directory, name)
+        if read_config(path) is None:
+            print(f"  ⚠️ No config file for {name[:30]}, skipping")
+            continue
+
+        try:
+            loudness = analyze_file(path, method=method, force=force)
+            results.append((name, loudness))
+            lufs = f"{loudness['lufs']:6.1f} LUFS" if loudness['lufs'] is not None else f"{loudness['rms_db']:6.1f} dB RMS"
+            print(f"  ✅ {name[:30]:30} {lufs}  peak {loudness['peak']:.3f}  gain {loudness['gain_db']:+5.1f}dB")
+        except Exception as e:
+            print(f"  ❌ Error analysing {name}: {e}")
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompute loudness normalisation gains for the sample library')
+    parser.add_argument('directories', nargs='+', help='Library directories (e.g. samples/ambient samples/rhythm)')
+    parser.add_argument('--method', choices=['rms', 'gated'], default='rms',
+                        help="'rms' (default) or EBU R128-style 'gated' loudness")
+    parser.add_argument('--force', action='store_true', help='Re-analyse files with a valid cached gain')
+
+    args = parser.parse_args()
+
+    if args.method == 'gated' and lfilter is None:
+        print("⚠️  scipy not installed: gated loudness will be measured without K-weighting")
+
+    for directory in args.directories:
+        print(f"Analysing loudness in: {directory}")
+        results = analyze_directory(directory, method=args.method, force=args.force)
+        print(f"Analysed {len(results)} files")
+
+
+if __name__ == "__main__":
+    main()
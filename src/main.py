@@ -11,12 +11,26 @@ import os
 import time
 import signal
 
+STARTED_AT = time.perf_counter()  # Time-to-first-audio is measured from here
+
 def signal_handler(sig, frame):
     """Handle Ctrl+C gracefully."""
     print("\n\nShutting down...")
     sys.exit(0)
 
+def _option(name, default=None):
+    """Value of a --name=value command-line option."""
+    for arg in sys.argv[1:]:
+        if arg.startswith(name + '='):
+            return arg.split('=', 1)[1]
+    return default
+
 def main():
+    # Raw audio on stdout: claim it before the first print (prints and the display go to stderr)
+    if _option('--backend') == 'stdout':
+        from audio_backends import claim_stdout
+        claim_stdout()
+    
     print("🎹 Roland S-1 Ambient/Rhythm Controller")
     print("=" * 50)
     print("WITH 4-BUFFER SYSTEM (glitch-free switching)")
@@ -36,14 +50,49 @@ def main():
         from audio_engine import AudioEngine
         from file_manager import FileManager
         from display import Display
-        from memory_monitor import MemoryMonitor
+        from memory_monitor import MemoryMonitor, MemoryBudget
         from midi_handler import MidiHandler
+        from control_loop import ControlLoop
         
         print("✅ All modules imported successfully")
         
         # Initialize components
-        print("\nInitializing AudioEngine...")
-        engine = AudioEngine()
+        # Output backend: --backend=null|wav|stdout for headless hosts (default: sound card)
+        backend = _option('--backend', 'sounddevice')
+        backend_options = {'path': _option('--output', 'output.wav')} if backend == 'wav' else {}
+        storage = 'int16' if '--compact' in sys.argv else 'float32'  # Half-size loop buffers
+        
+        if '--isolated-audio' in sys.argv:
+            # Audio callback in its own process; knobs via shared memory
+            from audio_process import AudioProcess
+            print("\nInitializing AudioEngine (isolated process)...")
+            engine = AudioProcess(backend=backend, backend_options=backend_options, storage=storage)
+        else:
+            print("\nInitializing AudioEngine...")
+            engine = AudioEngine(backend=backend, backend_options=backend_options, storage=storage)
+        
+        # Rhythm loops labelled regions of its file (e.g. BeatDetector's 4-bar _loops.txt); R steps
+        if '--regions' in sys.argv:
+            if '--isolated-audio' in sys.argv:
+                print("⚠️  --regions needs the in-process engine; ignored with --isolated-audio")
+            else:
+                engine.region_layers.add('rhythm')
+        
+        # Optional network broadcast of the mix: --broadcast=PORT [--broadcast-format=mp3|opus|wav]
+        broadcast = None
+        if _option('--broadcast'):
+            if '--isolated-audio' in sys.argv:
+                print("⚠️  --broadcast needs the in-process engine; ignored with --isolated-audio")
+            else:
+                from stream_server import StreamServer
+                try:
+                    broadcast = StreamServer(engine.sample_rate, engine.channels, port=int(_option('--broadcast')),
+                                             audio_format=_option('--broadcast-format', 'mp3'))
+                    broadcast.start()
+                    engine.output_taps.append(broadcast.push)
+                except OSError as e:
+                    print(f"⚠️  Broadcast disabled: {e}")
+                    broadcast = None
         
         print("Initializing FileManager...")
         # Get the project root directory (one level up from src/)
@@ -57,76 +106,41 @@ def main():
         print(f"  Rhythm dir: {rhythm_dir}")
         
         file_mgr = FileManager(ambient_dir=ambient_dir, rhythm_dir=rhythm_dir)
+        engine.gain_lookup = file_mgr.get_gain  # Cached loudness gains from sidecar configs
+        engine.label_lookup = file_mgr.get_labels  # Label index built by the library scan
         
         print("Initializing Display...")
-        display = Display(engine, file_mgr, memory_monitor=MemoryMonitor(audio_engine=engine))
+        memory_monitor = MemoryMonitor(audio_engine=engine)
+        display = Display(engine, file_mgr, memory_monitor=memory_monitor,
+                          fd=2 if backend == 'stdout' else None)
         
         print("Initializing MIDI Handler...")
-        midi = MidiHandler(audio_engine=engine, display=display, use_simulation=True)
+        use_real_midi = '--midi' in sys.argv  # Roland S-1 over USB (keyboard still works)
+        control_loop = ControlLoop()  # Keyboard, MIDI and preload events on one loop
+        midi = MidiHandler(audio_engine=engine, display=display, use_simulation=not use_real_midi,
+                           control_loop=control_loop)
         
-        print("\nLoading initial files...")
+        print("\nLoading first track...")
         
-        # Get initial files from FileManager
-        ambient_files = file_mgr.scan_ambient_files()
-        rhythm_files = file_mgr.scan_rhythm_files()
+        # Fast start: play the first usable ambient file as soon as it is decoded;
+        # the library scan and the rhythm layer follow in the background
+        ambient_info = file_mgr.first_ambient_file()
         
-        if not ambient_files:
+        if not ambient_info:
             print("❌ ERROR: No ambient files found!")
             print(f"   Check directory: {ambient_dir}")
             print(f"   Files should be: a_*.wav with a_*.txt configs")
             return
         
-        if not rhythm_files:
-            print("❌ ERROR: No rhythm files found!")
-            print(f"   Check directory: {rhythm_dir}")
-            print(f"   Files should be: r_*.wav with r_*.txt configs")
-            return
-        
-        print(f"✅ Found {len(ambient_files)} ambient files")
-        print(f"✅ Found {len(rhythm_files)} rhythm files")
-        
-        # Load first ambient file (to current buffer)
-        ambient_info = file_mgr.get_random_ambient()
-        rhythm_info = file_mgr.get_random_rhythm()
-        
-        if ambient_info:
-            filename, crossfade_ms, filepath = ambient_info
-            print(f"  🎹 Ambient: {filename} (xfade: {crossfade_ms}ms)")
-            engine.load_initial_ambient(ambient_info)
-        else:
-            print("⚠️  Failed to load ambient file!")
-        
-        if rhythm_info:
-            filename, crossfade_ms, filepath = rhythm_info
-            print(f"  🥁 Rhythm: {filename} (xfade: {crossfade_ms}ms)")
-            engine.load_initial_rhythm(rhythm_info)
-        else:
-            print("⚠️  Failed to load rhythm file!")
-        
-        # Pre-load next tracks immediately
-        print("\n📥 Pre-loading next tracks...")
-        next_ambient = file_mgr.get_random_ambient()
-        next_rhythm = file_mgr.get_random_rhythm()
-        
-        if next_ambient and next_ambient != ambient_info:
-            engine.preload_next_ambient(next_ambient)
-            print(f"  🎹 Next ambient ready: {next_ambient[0]}")
-        
-        if next_rhythm and next_rhythm != rhythm_info:
-            engine.preload_next_rhythm(next_rhythm)
-            print(f"  🥁 Next rhythm ready: {next_rhythm[0]}")
+        filename, crossfade_ms, filepath = ambient_info
+        print(f"  🎹 Ambient: {filename} (xfade: {crossfade_ms}ms)")
+        engine.load_initial_ambient(ambient_info)
         
         # Set initial state (100% ambient, effects off)
         engine.set_crossfader(0.0)  # 100% ambient
         engine.set_delay_amount(0.0)  # Delay off
         engine.set_reverb_amount(0.0)  # Reverb off
         
-        # Update display with initial filenames
-        display.update_files(
-            ambient_info[0] if ambient_info else None,
-            rhythm_info[0] if rhythm_info else None
-        )
-        
         print("\nStarting display...")
         display.start()
         
@@ -150,46 +164,116 @@ def main():
         
         # Track previous crossfader position for pre-load detection
         prev_crossfader = 0.0
+        library_ready = False  # Set once the background scan has finished
+        preloads_in_flight = set()  # 'ambient' / 'rhythm' being loaded in the background
+        
+        def preload(track_type, file_info):
+            """Background job: decode and pre-render the next track (installed by on_preload_done)."""
+            return engine.prepare_layer(track_type, file_info, 'next')
+        
+        def on_preload_done(track_type, prepared):
+            """Preload finished (runs on the control loop): install it into the next slot."""
+            preloads_in_flight.discard(track_type)
+            if prepared is not None:
+                engine.install_layer(track_type, 'next', prepared)
+            check_preload()
+        
+        def start_preload(track_type, file_info):
+            if track_type in preloads_in_flight:
+                return
+            preloads_in_flight.add(track_type)
+            print(f"\n📥 Pre-loading next {track_type}: {file_info[0]}")
+            control_loop.run_in_thread(preload, lambda prepared: on_preload_done(track_type, prepared),
+                                       track_type, file_info)
+        
+        def check_preload():
+            """Runs after every control change or preload completion - never on a timer."""
+            nonlocal prev_crossfader
+            if not library_ready:
+                return  # Scanning in the background; on_library_ready runs this
+            engine.release_retired()  # Free tracks switched out since the last change
+            current_crossfader = engine.crossfader
+            preloading = engine.preload_depth > 0  # Paused under critical memory pressure
+            
+            # If ambient just became audible (was silent, now audible)
+            # OR if ambient is silent but we don't have a next buffer pre-loaded
+            if preloading and ((current_crossfader < 0.95 and prev_crossfader >= 0.95) or
+                               (current_crossfader >= 0.95 and engine.next_ambient_buffer is None)):
+                # Ambient is or might become audible soon, pre-load next ambient
+                next_ambient = file_mgr.get_random_ambient()
+                if next_ambient and next_ambient != engine.current_ambient_file:
+                    start_preload('ambient', next_ambient)
+            
+            # If rhythm just became audible (was silent, now audible)
+            # OR if rhythm is silent but we don't have a next buffer pre-loaded
+            if preloading and ((current_crossfader > 0.05 and prev_crossfader <= 0.05) or
+                               (current_crossfader <= 0.05 and engine.next_rhythm_buffer is None)):
+                # Rhythm is or might become audible soon, pre-load next rhythm
+                next_rhythm = file_mgr.get_random_rhythm()
+                if next_rhythm and next_rhythm != engine.current_rhythm_file:
+                    start_preload('rhythm', next_rhythm)
+            
+            # Update previous crossfader
+            prev_crossfader = current_crossfader
+        
+        def load_library():
+            """Background job: full library scan, then decode the rhythm layer (installed by on_library_ready)."""
+            file_mgr.scan_ambient_files()
+            file_mgr.scan_rhythm_files()
+            rhythm_info = file_mgr.get_random_rhythm()
+            prepared = None
+            if rhythm_info:
+                print(f"  🥁 Rhythm: {rhythm_info[0]} (xfade: {rhythm_info[1]}ms)")
+                prepared = engine.prepare_layer('rhythm', rhythm_info, 'current')
+            return rhythm_info, prepared
+        
+        def report_first_audio(library_ready_at):
+            """Report time-to-first-audio once the first callback has run (control loop)."""
+            first_audio_at = engine.first_audio_at
+            if first_audio_at is None:
+                if time.perf_counter() - library_ready_at < 5.0:  # Give up if the stream never runs
+                    control_loop.call_later(0.1, report_first_audio, library_ready_at)
+                return
+            print(f"⏱️  Time to first audio: {(first_audio_at - STARTED_AT) * 1000:.0f}ms "
+                  f"(library ready after {(library_ready_at - STARTED_AT) * 1000:.0f}ms)")
+        
+        def on_library_ready(result):
+            """Library scanned (runs on the control loop): install the rhythm, report startup, start pre-loading."""
+            nonlocal library_ready
+            library_ready = True
+            rhythm_info, prepared = result or (None, None)
+            if prepared is not None:
+                engine.install_layer('rhythm', 'current', prepared)
+            print(f"✅ Found {len(file_mgr.ambient_files)} ambient files")
+            print(f"✅ Found {len(file_mgr.rhythm_files)} rhythm files")
+            if not rhythm_info:
+                print("❌ ERROR: No rhythm files found!")
+                print(f"   Check directory: {rhythm_dir}")
+                print(f"   Files should be: r_*.wav with r_*.txt configs")
+            
+            report_first_audio(time.perf_counter())
+            
+            next_ambient = file_mgr.get_random_ambient()
+            if next_ambient and next_ambient != engine.current_ambient_file:
+                start_preload('ambient', next_ambient)
+            check_preload()
+        
+        midi.on_change = check_preload
+        control_loop.run_in_thread(load_library, on_library_ready)
+        
+        # Memory budget: shed caches / pause pre-loading under pressure
+        budget = MemoryBudget(memory_monitor, engine, on_relieved=check_preload)
+        
+        def enforce_budget():
+            budget.enforce()
+            control_loop.call_later(2.0, enforce_budget)
+        
+        control_loop.call_later(2.0, enforce_budget)
         
-        # Keep running until Ctrl+C or MIDI handler says to quit
+        # Keep running until Ctrl+C or MIDI handler says to quit.
+        # The loop sleeps until a key, MIDI batch or preload completion arrives.
         try:
-            while midi.running:
-                # Check if we need to pre-load new tracks after a switch
-                current_crossfader = engine.crossfader
-                
-                # If ambient just became audible (was silent, now audible)
-                # OR if ambient is silent but we don't have a next buffer pre-loaded
-                if (current_crossfader < 0.95 and prev_crossfader >= 0.95) or \
-                   (current_crossfader >= 0.95 and engine.next_ambient_buffer is None):
-                    # Ambient is or might become audible soon, pre-load next ambient
-                    next_ambient = file_mgr.get_random_ambient()
-                    if next_ambient and next_ambient != engine.current_ambient_file:
-                        print(f"\n📥 Pre-loading next ambient: {next_ambient[0]}")
-                        engine.preload_next_ambient(next_ambient)
-                
-                # If rhythm just became audible (was silent, now audible)
-                # OR if rhythm is silent but we don't have a next buffer pre-loaded
-                if (current_crossfader > 0.05 and prev_crossfader <= 0.05) or \
-                   (current_crossfader <= 0.05 and engine.next_rhythm_buffer is None):
-                    # Rhythm is or might become audible soon, pre-load next rhythm
-                    next_rhythm = file_mgr.get_random_rhythm()
-                    if next_rhythm and next_rhythm != engine.current_rhythm_file:
-                        print(f"\n📥 Pre-loading next rhythm: {next_rhythm[0]}")
-                        engine.preload_next_rhythm(next_rhythm)
-                
-                # Update display with current filenames (in case of switch)
-                if engine.current_ambient_file and engine.current_rhythm_file:
-                    display.update_files(
-                        engine.current_ambient_file[0],
-                        engine.current_rhythm_file[0]
-                    )
-                
-                # Update previous crossfader
-                prev_crossfader = current_crossfader
-                
-                # Small delay to avoid CPU overload
-                time.sleep(0.05)
-                
+            control_loop.run()
         except KeyboardInterrupt:
             print("\n🛑 Keyboard interrupt received...")
         
@@ -197,6 +281,8 @@ def main():
         print("\nShutting down components...")
         display.stop()
         engine.stop_playback()
+        if broadcast:
+            broadcast.stop()
         midi.cleanup()
         print("✅ System stopped gracefully.")
         
@@ -2,51 +2,56 @@
 Memory monitoring module for tracking RAM usage in real-time.
 """
 
-import psutil
 import os
 
+def pressure_level(percent):
+    """LOW / MODERATE / HIGH / CRITICAL from system memory use (%)."""
+    if percent > 80:
+        return "CRITICAL"
+    elif percent > 65:
+        return "HIGH"
+    elif percent > 50:
+        return "MODERATE"
+    return "LOW"
+
 class MemoryMonitor:
     """Monitor system and application memory usage."""
     
     def __init__(self, audio_engine=None):
         self.audio_engine = audio_engine
         try:
+            import psutil  # Optional; imported here to keep it off the startup path
+            self.psutil = psutil
             self.process = psutil.Process(os.getpid())
             self.psutil_available = True
         except:
             self.psutil_available = False
         self.buffer_memory_estimate = 0
+        self.buffer_resident_mb = 0
+        self.buffer_mapped_mb = 0
+        self.inventory = []  # (name, nbytes, residency) from the engine
         
     def is_available(self):
         """Check if memory monitoring is available."""
         return self.psutil_available
     
     def update_buffer_estimate(self, engine):
-        """Calculate estimated memory usage of audio buffers."""
-        if not engine:
+        """Sum the engine's live buffer inventory (MB)."""
+        self.buffer_memory_estimate = 0
+        self.buffer_resident_mb = 0
+        self.buffer_mapped_mb = 0
+        self.inventory = []
+        if not engine or not hasattr(engine, 'memory_inventory'):
             return 0
-            
-        buffer_size_seconds = 300
-        sample_rate = 44100
-        channels = 2
-        bytes_per_sample = 4
-        num_buffers = 4
-        
-        if hasattr(engine, 'next_ambient_buffer') and hasattr(engine, 'next_rhythm_buffer'):
-            if engine.next_ambient_buffer is not None and engine.next_rhythm_buffer is not None:
-                num_buffers = 4
-            else:
-                num_buffers = 2
         
-        estimated_bytes = (
-            buffer_size_seconds * 
-            sample_rate * 
-            channels * 
-            bytes_per_sample * 
-            num_buffers
-        )
+        self.inventory = engine.memory_inventory()
+        for _, nbytes, residency in self.inventory:
+            if residency == 'mapped':
+                self.buffer_mapped_mb += nbytes / (1024 * 1024)
+            else:
+                self.buffer_resident_mb += nbytes / (1024 * 1024)
         
-        self.buffer_memory_estimate = estimated_bytes / (1024 * 1024)
+        self.buffer_memory_estimate = self.buffer_resident_mb + self.buffer_mapped_mb
         return self.buffer_memory_estimate
     
     def get_system_memory(self):
@@ -55,7 +60,7 @@ class MemoryMonitor:
             return {'percent': 0, 'available': 0, 'total': 0, 'used': 0}
         
         try:
-            system = psutil.virtual_memory()
+            system = self.psutil.virtual_memory()
             return {
                 'total': system.total / (1024 * 1024 * 1024),
                 'available': system.available / (1024 * 1024 * 1024),
@@ -84,19 +89,14 @@ class MemoryMonitor:
         system = self.get_system_memory()
         app = self.get_application_memory()
         
-        if self.audio_engine and self.psutil_available:
+        if self.audio_engine:
             self.update_buffer_estimate(self.audio_engine)
         buffer_estimate = self.buffer_memory_estimate
         
-        total_app_estimate = app['rss'] + buffer_estimate
+        # Resident buffers are already part of RSS; shared/mapped ones may not be
+        total_app_estimate = app['rss'] + self.buffer_mapped_mb
         
-        pressure = "LOW"
-        if system['percent'] > 80:
-            pressure = "CRITICAL"
-        elif system['percent'] > 65:
-            pressure = "HIGH"
-        elif system['percent'] > 50:
-            pressure = "MODERATE"
+        pressure = pressure_level(system['percent'])
         
         return {
             'system_percent': system['percent'],
@@ -105,6 +105,8 @@ class MemoryMonitor:
             'app_rss_mb': app['rss'],
             'app_vms_mb': app['vms'],
             'buffers_mb': buffer_estimate,
+            'buffers_resident_mb': self.buffer_resident_mb,
+            'buffers_mapped_mb': self.buffer_mapped_mb,
             'total_estimated_mb': total_app_estimate,
             'pressure_level': pressure,
             'available': self.psutil_available
@@ -130,4 +132,43 @@ class MemoryMonitor:
         else:
             indicator = "🟢"  # Green circle
         
-        return f"{indicator} RAM: [{bar}] {percent:.0f}% ({status['app_rss_mb']:.0f}MB)"
+        return (f"{indicator} RAM: [{bar}] {percent:.0f}% ({status['app_rss_mb']:.0f}MB, "
+                f"buffers {status['buffers_mb']:.0f}MB)")
+
+
+class MemoryBudget:
+    """
+    Sheds engine memory as pressure rises:
+    HIGH evicts caches (decoded source clips), CRITICAL also stops preloading
+    and drops pre-loaded next loops. Preloading resumes below HIGH.
+    """
+    
+    def __init__(self, monitor, engine, on_relieved=None):
+        self.monitor = monitor
+        self.engine = engine
+        self.on_relieved = on_relieved  # Called when preloading is re-enabled
+        self.level = "LOW"
+    
+    def enforce(self):
+        """Check pressure once and act on it. Returns the pressure level."""
+        if not self.monitor.is_available():
+            return self.level
+        
+        self.level = self.monitor.get_memory_status()['pressure_level']
+        engine = self.engine
+        
+        if self.level in ("HIGH", "CRITICAL"):
+            freed = engine.evict_caches()
+            if self.level == "CRITICAL" and engine.preload_depth > 0:
+                engine.preload_depth = 0
+                freed += engine.drop_preloaded()
+                print("\n⚠️  Memory CRITICAL: pre-loading paused")
+            if freed:
+                print(f"\n🧹 Memory {self.level}: freed {freed / (1024 * 1024):.1f}MB")
+        elif engine.preload_depth == 0:
+            engine.preload_depth = 1
+            print(f"\n✅ Memory {self.level}: pre-loading resumed")
+            if self.on_relieved:
+                self.on_relieved()
+        
+        return self.level
@@ -1,23 +1,32 @@
 #!/usr/bin/env python3
 """
 MIDI Handler for Roland S-1 Controller
-Now with delay/reverb effects controls.
+Now with delay/reverb effects controls and real Roland S-1 input.
 """
 
+import os
 import sys
-import threading
-import time
-import select
 import tty
 import termios
 
+from control_loop import ControlLoop
+from midi_input import CoalescingMidiInput
+from tempo_sync import ClockTempoTracker
+
 class MidiHandler:
     """MIDI handler with simulation for development."""
     
-    def __init__(self, audio_engine, display, use_simulation=True):
+    def __init__(self, audio_engine, display, use_simulation=True, port_name=None, control_loop=None):
         self.audio_engine = audio_engine
         self.display = display
         self.use_simulation = use_simulation
+        self.midi_input = None
+        self.tempo = None  # ClockTempoTracker fed by the S-1's MIDI clock
+        
+        # Keyboard and MIDI are dispatched on one event loop (ours if none given)
+        self._owns_loop = control_loop is None
+        self.control_loop = control_loop or ControlLoop()
+        self.on_change = None  # Called on the loop thread after any control change
         
         # Terminal settings for raw input
         self.old_settings = None
@@ -31,10 +40,49 @@ class MidiHandler:
             print("Using SIMULATED MIDI controls")
             self._init_simulation()
         else:
-            print("WARNING: Real MIDI not implemented yet")
-            print("Falling back to simulation")
+            if not self._init_real_midi(port_name):
+                print("Falling back to simulation")
             self._init_simulation()
     
+    def _init_real_midi(self, port_name=None):
+        """Open the Roland S-1 input port (knobs coalesced per audio block)."""
+        block_seconds = self.audio_engine.buffer_size / self.audio_engine.sample_rate
+        self.tempo = ClockTempoTracker()
+        self.midi_input = CoalescingMidiInput(self._apply_controls, interval=block_seconds,
+                                              loop=self.control_loop,
+                                              on_clock=self.tempo.handle_message)
+        
+        try:
+            name = self.midi_input.open(port_name)
+            print(f"✅ Real MIDI input: {name}")
+            print("  KNOB 1: Crossfader  KNOB 2: Delay  KNOB 3: Reverb")
+            print("  MIDI clock: rhythm loops follow the S-1 tempo")
+            self.audio_engine.tempo_source = self.tempo
+            return True
+        except ImportError:
+            print("WARNING: mido not installed (pip install mido python-rtmidi)")
+        except Exception as e:
+            print(f"WARNING: Could not open MIDI input: {e}")
+        
+        self.midi_input = None
+        self.tempo = None
+        return False
+    
+    def _apply_controls(self, controls):
+        """Apply a coalesced batch of knob values {cc: value} to the engine."""
+        for control, value in controls.items():
+            amount = value / 127.0
+            knob = control - 15
+            if knob == 1:
+                self.audio_engine.set_crossfader(amount)
+            elif knob == 2:
+                self.audio_engine.set_delay_amount(amount)
+            elif knob == 3:
+                self.audio_engine.set_reverb_amount(amount)
+        
+        self._update_display()
+        self._notify_change()
+    
     def _init_simulation(self):
         """Initialize simulated MIDI controls."""
         print("\n" + "="*50)
@@ -43,6 +91,7 @@ class MidiHandler:
         print("  Q/A: Channel Crossfader (Q=↑Ambient, A=↑Rhythm)")
         print("  W/S: Delay amount (W=↑, S=↓)")
         print("  E/D: Reverb amount (E=↑, D=↓)")
+        print("  R: Next labelled rhythm region (with --regions)")
         print("  ESC: Quit program")
         print("="*50)
         print("\nWaiting for input...")
@@ -51,22 +100,34 @@ class MidiHandler:
         self.old_settings = termios.tcgetattr(sys.stdin)
         tty.setcbreak(sys.stdin.fileno())
         
-        # Start input thread
-        self.input_thread = threading.Thread(target=self._input_loop, daemon=True)
-        self.input_thread.start()
+        # Keyboard wakes the control loop directly (no polling)
+        self.control_loop.add_reader(sys.stdin, self._on_stdin)
+        
+        if self._owns_loop:
+            self.control_loop.start()
+            self.input_thread = self.control_loop.thread
     
-    def _input_loop(self):
-        """Read keyboard input in background."""
-        while self.running:
-            try:
-                # Use select to check if input is available (non-blocking)
-                if select.select([sys.stdin], [], [], 0.1)[0]:
-                    key = sys.stdin.read(1).lower()
-                    self._handle_key(key)
-            except Exception as e:
-                print(f"Input error: {e}")
+    def _on_stdin(self):
+        """Handle whatever keys are waiting on stdin."""
+        try:
+            data = os.read(sys.stdin.fileno(), 64)
+        except OSError as e:
+            print(f"Input error: {e}")
+            data = b''
+        
+        if not data:  # EOF / closed terminal
+            self.stop()
+            return
+        
+        for key in data.decode('utf-8', errors='ignore').lower():
+            self._handle_key(key)
+            if not self.running:
                 break
-            time.sleep(0.01)
+    
+    def stop(self):
+        """Stop handling input and end the control loop."""
+        self.running = False
+        self.control_loop.stop()
     
     def _handle_key(self, key):
         """Handle keyboard input."""
@@ -103,19 +164,27 @@ class MidiHandler:
             self.audio_engine.set_reverb_amount(max(0.0, new_value))
             print(f"[REVERB] {int(self.audio_engine.reverb_amount * 100)}%")
         
+        # RHYTHM REGION (R): next labelled loop of the rhythm file, from the next bar
+        elif key == 'r':
+            if not self.audio_engine.select_region('rhythm'):
+                print("[REGION] No labelled regions playing (start with --regions)")
+        
         # ESC to quit
         elif ord(key) == 27:  # ESC key
-            self.running = False
             print("\n[QUIT] ESC pressed")
+            self.stop()
+            return
         
-        # Update display
-        self.display.update_crossfader(self.audio_engine.crossfader)
-        self.display.update_delay(self.audio_engine.delay_amount)
-        self.display.update_reverb(self.audio_engine.reverb_amount)
-        self.display.update_volumes(
-            self.audio_engine.ambient_volume,
-            self.audio_engine.rhythm_volume
-        )
+        self._update_display()
+        self._notify_change()
+    
+    def _notify_change(self):
+        """Tell the application a control changed (e.g. to schedule preloads)."""
+        if self.on_change:
+            self.on_change()
+    
+    def _update_display(self):
+        """Redraw the display now (it reads the new control state from the next status snapshot)."""
         self.display.render()
     
     def _print_delay_status(self):
@@ -135,7 +204,12 @@ class MidiHandler:
         print(f"[DELAY] {desc}")
     
     def cleanup(self):
-        """Clean up terminal settings."""
+        """Close MIDI input and clean up terminal settings."""
+        if self.midi_input:
+            self.midi_input.close()
+        self.control_loop.remove_reader(sys.stdin)
+        if self._owns_loop:
+            self.stop()
         if self.old_settings:
             termios.tcsetattr(sys.stdin, termios.TCSADRAIN, self.old_settings)
     
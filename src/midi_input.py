@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Real MIDI input for Roland S-1 Controller
+Callback-based mido input port with control-change coalescing: bursts of
+CC messages are collapsed to the latest value per controller before they
+reach the AudioEngine, so a fast knob sweep can't flood the control path.
+"""
+
+import threading
+import time
+
+# Roland S-1 knobs send CC 16-19 (knob number = CC - 15)
+S1_KNOB_CCS = (16, 17, 18, 19)
+S1_PORT_KEYWORDS = ('s-1', 's1', 'roland')
+
+# System real-time messages forwarded straight to the clock handler
+CLOCK_MESSAGES = ('clock', 'start', 'continue', 'stop')
+
+
+def find_s1_port(port_names):
+    """Pick the Roland S-1 from a list of input port names (None if absent)."""
+    for name in port_names:
+        if any(keyword in name.lower() for keyword in S1_PORT_KEYWORDS):
+            return name
+    return None
+
+
+class CoalescingMidiInput:
+    """
+    Collects control changes from a MIDI callback and hands them on in
+    batches of {cc: latest_value}, at most once per `interval` seconds.
+    With a ControlLoop, batches are applied on the loop thread; otherwise
+    a dedicated flush thread applies them.
+    """
+
+    def __init__(self, on_controls, interval=0.023, controls=S1_KNOB_CCS, loop=None, on_clock=None):
+        self.on_controls = on_controls  # Called with {cc: value} from the flush thread/loop
+        self.on_clock = on_clock        # Called with clock/start/stop messages on the MIDI thread
+        self.interval = interval        # One audio block by default
+        self.controls = set(controls)
+        self.loop = loop
+
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+        self._port = None
+        self._thread = None
+        self._scheduled = False  # Loop mode: a flush is already queued
+        self._last_flush = 0.0
+        self.running = False
+
+        # Stats
+        self.messages_received = 0
+        self.batches_applied = 0
+
+    # ===== PORT HANDLING =====
+
+    def open(self, port_name=None, virtual=False):
+        """Open a mido input port with our callback. Returns the port name."""
+        import mido  # Only needed for real hardware
+
+        if port_name is None and not virtual:
+            port_name = find_s1_port(mido.get_input_names())
+            if port_name is None:
+                raise IOError("Roland S-1 MIDI port not found")
+
+        self._port = mido.open_input(port_name, virtual=virtual, callback=self.handle_message)
+        self.start()
+        return self._port.name
+
+    def start(self):
+        """Start the flush thread (also used with scripted sources)."""
+        if self.running:
+            return
+        self.running = True
+        if self.loop is None:
+            self._thread = threading.Thread(target=self._flush_loop, daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """Close the port and stop the flush thread."""
+        self.running = False
+        self._event.set()
+        if self._port is not None:
+            self._port.close()
+            self._port = None
+        if self._thread:
+            self._thread.join(timeout=1.0)
+
+    # ===== MESSAGE PATH =====
+
+    def handle_message(self, message):
+        """mido callback: record the latest value of each knob (cheap, no I/O)."""
+        if message.type in CLOCK_MESSAGES:
+            # Tick timing matters: handle immediately, never coalesce
+            if self.on_clock:
+                self.on_clock(message)
+            return
+        
+        if message.type != 'control_change' or message.control not in self.controls:
+            return
+
+        with self._lock:
+            self._pending[message.control] = message.value
+            self.messages_received += 1
+            schedule = self.loop is not None and not self._scheduled
+            self._scheduled = self._scheduled or schedule
+
+        if schedule:
+            self.loop.call_soon_threadsafe(self._loop_flush)
+        elif self.loop is None:
+            self._event.set()
+
+    def feed(self, messages):
+        """Push a scripted message sequence through the callback path (for testing)."""
+        for message in messages:
+            self.handle_message(message)
+
+    def drain(self):
+        """Take the pending {cc: value} batch (empty dict if nothing arrived)."""
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+            self._event.clear()
+        return pending
+
+    def flush(self):
+        """Apply the pending batch now. Returns the batch."""
+        pending = self.drain()
+        if pending:
+            self.batches_applied += 1
+            self.on_controls(pending)
+        return pending
+
+    def _loop_flush(self):
+        """Loop mode: apply the batch, or come back when the interval has passed."""
+        wait = self._last_flush + self.interval - time.monotonic()
+        if wait > 0:
+            self.loop.call_later(wait, self._loop_flush)
+            return
+
+        with self._lock:
+            self._scheduled = False
+        self._last_flush = time.monotonic()
+        self.flush()
+
+    def _flush_loop(self):
+        """Sleep until a message arrives, apply it, then rate-limit to one batch per interval."""
+        while self.running:
+            self._event.wait()
+            if not self.running:
+                break
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"MIDI control error: {e}")
+            time.sleep(self.interval)
@@ -0,0 +1,660 @@
+#!/usr/bin/env python3
+"""
+N-channel loop mixer for Roland S-1 Controller
+Each Channel is one layer (ambient pad, texture, drums, field recording...)
+with a current loop, a pre-loaded next loop and its own transport. The
+Mixer stacks the active layers' blocks into one (channels, frames, 2)
+scratch array and mixes them with a single einsum against the gain vector.
+"""
+
+import mmap
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import soundfile as sf
+
+from loop_renderer import LoopRenderer, PreRenderedLoop, clamp_crossfade
+from tempo_sync import VarispeedReader, read_source_tempo, playback_rate
+from beat_grid import BeatGrid, load_beat_times
+
+MAX_LAYERS = 16  # Mix scratch is sized for this many layers up front
+
+
+def array_residency(array):
+    """'mapped' if the array lives in an mmap (memmap file or shared memory), else 'resident'."""
+    base = array
+    while base is not None:
+        if isinstance(base, (np.memmap, mmap.mmap)):
+            return 'mapped'
+        if isinstance(base, memoryview):
+            return 'mapped' if isinstance(base.obj, mmap.mmap) else 'resident'
+        base = getattr(base, 'base', None)
+    return 'resident'
+
+
+def memory_entry(name, array):
+    """Inventory row (name, nbytes, residency) for an array."""
+    return (name, array.nbytes, array_residency(array))
+
+
+class Track:
+    """
+    A loaded library file: exactly the arrays playback needs (the
+    pre-rendered loop and its beat grid), shared by reference between
+    slots and freed as soon as the last slot lets go of it.
+    """
+
+    def __init__(self, file_info, buffer, start=0, gain=1.0, bpm=None, grid=None, labels=None):
+        self.file_info = file_info  # (filename, crossfade_ms, filepath)
+        self.buffer = buffer        # PreRenderedLoop
+        self.start = start          # Start position (first downbeat for quantised layers)
+        self.gain = gain
+        self.bpm = bpm
+        self.grid = grid
+        self.labels = labels        # label_index.Labels of the source file (None if unlabelled)
+
+    @property
+    def nbytes(self):
+        labels = self.labels.starts.nbytes + self.labels.ends.nbytes if self.labels is not None else 0
+        return self.buffer.buffer.nbytes + (self.grid.bars.nbytes if self.grid is not None else 0) + labels
+
+
+def prepare_loop(file_info, sample_rate, target_seconds, gain=1.0,
+                 tempo_synced=False, quantized=False, label='loop', allocate=None,
+                 storage='float32'):
+    """
+    Decode and pre-render a library file for a layer (the slow part of a load).
+    storage: 'float32', or 'int16' / 'float16' for half-size buffers (see loop_renderer).
+    allocate(frames, channels, dtype), if given, supplies the array to render into.
+    The decoded clip is only needed while rendering and is not kept.
+    """
+    filename, crossfade_ms, filepath = file_info
+
+    # Load audio file
+    audio_data, sr = sf.read(filepath, dtype=np.float32)
+
+    if sr != sample_rate:
+        print(f"Warning: File sample rate {sr}Hz doesn't match engine {sample_rate}Hz")
+
+    # Ensure stereo
+    if len(audio_data.shape) == 1:
+        audio_data = np.column_stack((audio_data, audio_data))
+
+    # Create pre-rendered loop buffer (~target_seconds, wraps seamlessly)
+    crossfade_samples = int((crossfade_ms / 1000.0) * sample_rate)
+    loop_length = len(audio_data)
+
+    print(f"  Pre-rendering {label} buffer:")
+    print(f"    Original: {loop_length} samples ({loop_length/sample_rate:.2f}s)")
+    print(f"    Crossfade: {crossfade_samples} samples ({crossfade_ms}ms)")
+
+    renderer = LoopRenderer(audio_data, crossfade_samples)
+    if renderer.crossfade_samples != crossfade_samples:
+        print(f"    Crossfade clamped to half the loop: {renderer.crossfade_samples} samples")
+
+    min_frames = target_seconds * sample_rate
+    out = None
+    if allocate is not None:
+        out = allocate(PreRenderedLoop.buffer_frames(renderer, min_frames), renderer.channels, np.dtype(storage))
+    buffer = PreRenderedLoop(renderer, min_frames, out=out, storage=storage)
+    print(f"    Final buffer: {len(buffer)} samples ({len(buffer)/sample_rate:.2f}s, "
+          f"{buffer.buffer.nbytes / (1024 * 1024):.1f}MB {buffer.buffer.dtype})")
+    del renderer, audio_data  # Source clip freed here, before the next load can start
+
+    # Native tempo for MIDI clock sync, beat grid for quantised switching
+    bpm = read_source_tempo(filepath) if tempo_synced else None
+    grid = BeatGrid.from_audio_file(filepath, sample_rate, buffer.period) if quantized else None
+    start = grid.first_bar if grid else 0  # Start on the first downbeat so switches land in phase
+
+    return Track(file_info, buffer, start, gain, bpm, grid)
+
+
+class ProgressiveLoop:
+    """
+    Loop source that can play before its pre-render exists.
+    Decodes the head of the file (and, for seekable PCM subtypes - WAV, AIFF
+    and FLAC - the seam tail), then plays straight from
+    LoopRenderer.render_block while complete() decodes the rest and
+    pre-renders in the background, then swaps in the PreRenderedLoop.
+    Lossy files (OGG/MP3) decode front to back in blocks: until the tail is
+    in, they play a hard-cut loop of the same period, and the crossfaded
+    renderer is swapped in once decode_body() has decoded the tail (long
+    before the first wrap, normally), so no seam is ever built from silence.
+    Renderer positions lie in [0, 2 * period) and a pre-rendered buffer is
+    at least two periods long, so the same position means the same stream
+    sample on both sides: the handover is sample-continuous.
+    """
+
+    def __init__(self, filepath, sample_rate, crossfade_ms, min_frames,
+                 storage='float32', head_seconds=2.0):
+        self.min_frames = min_frames
+        self.storage = storage
+        self._prerendered = None
+        self.ready = threading.Event()
+
+        self._file = sf.SoundFile(filepath)
+        if self._file.samplerate != sample_rate:
+            print(f"Warning: File sample rate {self._file.samplerate}Hz doesn't match engine {sample_rate}Hz")
+        length = self._file.frames
+        crossfade_samples = int((crossfade_ms / 1000.0) * sample_rate)
+
+        # Zero-filled, so a read ahead of the decoder can only ever be silence
+        self.audio = np.zeros((length, 2), dtype=np.float32)
+        self._body_end = length
+        if self._file.subtype.startswith(('PCM', 'FLOAT', 'DOUBLE')):
+            self._body_end = length - min(length, crossfade_samples)  # Seeking is cheap: tail first
+            self._decode(self._body_end, length)
+        self.decoded = min(self._body_end, int(head_seconds * sample_rate) + crossfade_samples)
+        self._decode(0, self.decoded)
+
+        renderer = LoopRenderer(self.audio, crossfade_samples)
+        self.period = renderer.period
+        self.loop_start = self.period
+        self.crossfade_samples = renderer.crossfade_samples
+        self.scale = None
+        if self._body_end < length:
+            self._renderer = renderer  # Tail decoded: the seam is final
+        else:
+            # Tail still undecoded: same period and positions, but wraps without the seam
+            self._renderer = LoopRenderer(self.audio[:self.period], 0)
+
+    def _decode(self, start, stop):
+        """Decode file frames [start, stop) into the clip (mono is duplicated to stereo). Returns frames read."""
+        if self._file.tell() != start:
+            self._file.seek(start)  # Only PCM files are read out of order
+        block = self._file.read(stop - start, dtype='float32', always_2d=True)
+        self.audio[start:start + len(block)] = block[:, :2] if block.shape[1] > 1 else block
+        return len(block)
+
+    def decode_body(self, block_frames=1 << 18):
+        """Decode the rest of the clip in blocks (playback keeps reading the decoded part)."""
+        while self.decoded < self._body_end:
+            stop = min(self._body_end, self.decoded + block_frames)
+            if self._decode(self.decoded, stop) < stop - self.decoded:
+                # Estimated length (e.g. MP3 without a Xing header): the rest stays silent
+                print(f"⚠️ {self._file.name}: stream ended early at frame {self.decoded}")
+                break
+            self.decoded = stop
+        if not self._file.closed:
+            self._file.close()
+        if self._body_end == len(self.audio) and self._renderer.crossfade_samples != self.crossfade_samples:
+            # The tail is in: build the seam now (one reference swap for read())
+            self._renderer = LoopRenderer(self.audio, self.crossfade_samples)
+
+    def complete(self, grace=0.5):
+        """Decode the rest, pre-render, hand over; then drop the clip once no callback can hold it."""
+        self.decode_body()
+
+        self._prerendered = PreRenderedLoop(self._renderer, self.min_frames, storage=self.storage)
+        self.ready.set()
+
+        # A callback that saw the renderer before the swap finishes within a few blocks
+        time.sleep(grace)
+        self._renderer = None
+        self.audio = None
+
+    # ===== PreRenderedLoop interface =====
+
+    @property
+    def buffer(self):
+        """The pre-rendered buffer once ready, else the decoded clip."""
+        return self._prerendered.buffer if self._prerendered is not None else self.audio
+
+    def __len__(self):
+        if self._prerendered is not None:
+            return len(self._prerendered)
+        return PreRenderedLoop.buffer_frames(self._renderer, self.min_frames)
+
+    def read(self, out, position):
+        """Copy the next len(out) frames into out. Returns the next position."""
+        prerendered = self._prerendered
+        if prerendered is not None:
+            return prerendered.read(out, position)
+        return self._renderer.render_block(out, position)
+
+    def advance(self, position, frames):
+        """Position after frames more frames, without reading them (O(1))."""
+        prerendered = self._prerendered
+        if prerendered is not None:
+            return prerendered.advance(position, frames)
+        return self._renderer.normalize(position + frames)
+
+
+def prepare_progressive(file_info, sample_rate, target_seconds, gain=1.0,
+                        tempo_synced=False, quantized=False, label='loop', storage='float32'):
+    """
+    Like prepare_loop, but returns as soon as the head of the file is decoded:
+    the Track plays from the clip while a background thread pre-renders it.
+    """
+    filename, crossfade_ms, filepath = file_info
+
+    loop = ProgressiveLoop(filepath, sample_rate, crossfade_ms, target_seconds * sample_rate, storage)
+    print(f"  Progressive {label} buffer: playing from the clip, pre-rendering "
+          f"{len(loop) / sample_rate:.0f}s in the background")
+    threading.Thread(target=loop.complete, name=f"prerender-{label}", daemon=True).start()
+
+    bpm = read_source_tempo(filepath) if tempo_synced else None
+    grid = BeatGrid.from_audio_file(filepath, sample_rate, loop.period) if quantized else None
+    start = grid.first_bar if grid else 0
+
+    return Track(file_info, loop, start, gain, bpm, grid)
+
+
+class RegionLoop:
+    """
+    Loops one labelled region of a decoded file, e.g. a 4-bar segment from
+    BeatDetector's _loops.txt. Every region's LoopRenderer reads a view of
+    the same clip (no copies, no pre-render), so one file feeds many loops.
+    select() queues a region; the audio thread jumps to its start on the
+    next bar of the playing region. The loop also serves as the Track's
+    beat grid (bars of the playing region).
+
+    A region loops for exactly end - start frames: its crossfade fades out
+    into the audio after the region (post-roll) or, for a region that ends
+    where the file does, fades in the audio before its start (pre-roll).
+    Only a region with neither crossfades inside itself, like a whole-file loop.
+    """
+
+    def __init__(self, audio, regions, crossfade_samples, sample_rate, beats=None, region=0):
+        self.audio = audio
+        self.regions = regions  # [(start, end, label index)] in clip frames
+        self._renderers = []
+        self._origins = []      # Renderer position of each region's first frame
+        self._grids = []
+        for start, end, _ in regions:
+            renderer, origin = self._region_renderer(start, end, crossfade_samples)
+            self._renderers.append(renderer)
+            self._origins.append(origin)
+            # The region's own bars, from the file's beats (else its start is the only bar)
+            grid = BeatGrid(beats - start / sample_rate, sample_rate, renderer.period) if beats is not None else None
+            self._grids.append(grid if grid is not None and len(grid.bars)
+                               else BeatGrid([0.0], sample_rate, renderer.period))
+        self.active = region
+        self._pending = None
+        self.scale = None
+
+    def _region_renderer(self, start, end, crossfade_samples):
+        """(LoopRenderer, origin) of one region; the renderer is a view of the clip."""
+        c = clamp_crossfade(end - start, crossfade_samples)
+        if end + c <= len(self.audio):
+            return LoopRenderer(self.audio[start:end + c], c), 0
+        if start >= c:
+            # Renderer position c is the region's start; the seam fades in the pre-roll
+            return LoopRenderer(self.audio[start - c:end], c), c
+        return LoopRenderer(self.audio[start:end], c), 0
+
+    @property
+    def start(self):
+        """Renderer position of the active region's first frame (the Track's start)."""
+        return self._origins[self.active]
+
+    @property
+    def queued(self):
+        """The region playing after the next bar: the pending one, else the active one."""
+        pending = self._pending
+        return self.active if pending is None else pending
+
+    def label_index(self, region):
+        """Index into the file's Labels of a region."""
+        return self.regions[region][2]
+
+    def select(self, region):
+        """Play region next, from the next bar of the playing one (any thread)."""
+        if not 0 <= region < len(self.regions):
+            raise IndexError(f"No region {region} (file has {len(self.regions)})")
+        self._pending = region
+
+    # ===== PreRenderedLoop / BeatGrid interface =====
+
+    @property
+    def buffer(self):
+        return self.audio
+
+    @property
+    def period(self):
+        return self._renderers[self.active].period
+
+    @property
+    def bars(self):
+        return self._grids[self.active].bars
+
+    first_bar = 0
+
+    def __len__(self):
+        return len(self.audio)
+
+    def frames_to_next_bar(self, position):
+        return self._grids[self.active].frames_to_next_bar(position - self._origins[self.active])
+
+    def _frames_to_switch(self, position):
+        """Frames before a queued region starts (None if none is queued)."""
+        if self._pending is None:
+            return None
+        return self.frames_to_next_bar(position)
+
+    def _switch(self):
+        self.active, self._pending = self._pending, None
+        return self._origins[self.active]
+
+    def read(self, out, position):
+        """Copy the next len(out) frames into out. Returns the next position."""
+        split = self._frames_to_switch(position)
+        if split is not None and split < len(out):
+            if split:
+                self._renderers[self.active].render_block(out[:split], position)
+            position = self._switch()
+            return self._renderers[self.active].render_block(out[split:], position)
+        return self._renderers[self.active].render_block(out, position)
+
+    def advance(self, position, frames):
+        """Position after frames more frames, without reading them (O(1))."""
+        split = self._frames_to_switch(position)
+        if split is not None and split < frames:
+            position, frames = self._switch(), frames - split
+        return self._renderers[self.active].normalize(position + frames)
+
+
+def prepare_regions(file_info, sample_rate, labels, region=0, gain=1.0,
+                    tempo_synced=False, quantized=False, label='loop'):
+    """
+    Decode a file once and loop its labelled regions (label_index.Labels with
+    end > start). Returns None if the file has no usable region.
+    """
+    filename, crossfade_ms, filepath = file_info
+
+    audio_data, sr = sf.read(filepath, dtype=np.float32, always_2d=True)
+    if sr != sample_rate:
+        # Regions, bars and the crossfade are all measured in the file's frames
+        print(f"Warning: File sample rate {sr}Hz doesn't match engine {sample_rate}Hz")
+    if audio_data.shape[1] == 1:
+        audio_data = np.column_stack((audio_data, audio_data))
+    audio_data.flags.writeable = False
+
+    regions = []
+    for index in labels.regions():
+        start = int(round(labels.starts[index] * sr))
+        end = min(len(audio_data), int(round(labels.ends[index] * sr)))
+        if end - start > 1:
+            regions.append((start, end, index))  # Unusable regions are dropped: keep the label index
+    if not regions:
+        return None
+
+    beats = load_beat_times(filepath) if quantized else None
+    crossfade_samples = int((crossfade_ms / 1000.0) * sr)
+    loop = RegionLoop(audio_data, regions, crossfade_samples, sr, beats, min(region, len(regions) - 1))
+    print(f"  {label} regions: {len(regions)} labelled loops over one {len(audio_data) / sr:.1f}s clip "
+          f"({audio_data.nbytes / (1024 * 1024):.1f}MB)")
+
+    bpm = read_source_tempo(filepath) if tempo_synced else None
+    return Track(file_info, loop, loop.start, gain, bpm, loop if quantized else None)
+
+
+def _track_attr(slot, attr, default=None):
+    """Read-only view of an attribute of the Track in a Channel slot."""
+    def fget(self):
+        track = getattr(self, slot)
+        return default if track is None else getattr(track, attr)
+    return property(fget)
+
+
+class Channel:
+    """One mixer layer: current + next Track, volume and transport."""
+
+    # Views of the slot Tracks (the Tracks own the data)
+    buffer = _track_attr('current', 'buffer')
+    file = _track_attr('current', 'file_info')
+    gain = _track_attr('current', 'gain', 1.0)
+    bpm = _track_attr('current', 'bpm')
+    grid = _track_attr('current', 'grid')
+    next_buffer = _track_attr('next', 'buffer')
+    next_file = _track_attr('next', 'file_info')
+    next_gain = _track_attr('next', 'gain', 1.0)
+    next_bpm = _track_attr('next', 'bpm')
+    next_grid = _track_attr('next', 'grid')
+
+    def __init__(self, name, channels=2, block_frames=1024, tempo_synced=False, quantized=False):
+        self.name = name
+        self.tempo_synced = tempo_synced  # Resample to the MIDI clock (needs bpm)
+        self.quantized = quantized        # Switch on bar boundaries (needs grid)
+
+        self.current = None       # Track playing
+        self.next = None          # Pre-loaded Track
+        self.position = 0
+        self.next_position = 0
+        self.retired = deque()    # Tracks let go of by the audio thread, freed by release_retired()
+        self.switches = deque()   # (from, to) file infos of switches, reported by release_retired()
+
+        self.volume = 0.0
+
+        # Transport
+        self.rate = 1.0                 # Last playback rate applied
+        self.frames_read = 0            # Source frames consumed (bar clock)
+        self.switch_armed = False
+        self._switch_at = None          # frames_read value of the target bar
+        self._varispeed = VarispeedReader(channels, block_frames)
+        self._varispeed_active = False
+
+    @property
+    def crossfade_ms(self):
+        return self.file[1] if self.file else 0
+
+    # ===== LOOP SLOTS =====
+
+    def assign(self, slot, track):
+        """Install a Track into the 'current' or 'next' slot."""
+        if slot == 'current':
+            self._retire(self.current)
+            self.current = track
+            self.position = track.start
+            self.reset_varispeed()
+        else:
+            self._retire(self.next)
+            self.next = track
+            self.next_position = track.start
+
+    def _retire(self, track):
+        """Queue a Track that just left a slot, unless the other slot still shares it."""
+        if track is not None and track is not self.current and track is not self.next:
+            self.retired.append(track)
+
+    def release_retired(self):
+        """Free Tracks no slot uses any more and report switches (control thread). Returns bytes released."""
+        while self.switches:
+            previous, current = self.switches.popleft()
+            print(f"🔁 Switched {self.name}: {previous[0] if previous else 'None'} → {current[0] if current else 'None'}")
+        freed = 0
+        while self.retired:
+            freed += self.retired.popleft().nbytes
+        return freed
+
+    def switch_to_next(self):
+        """Make the pre-loaded next loop current (no console I/O: may run in the callback)."""
+        if self.next is None:
+            return
+
+        self.switches.append((self.file, self.next_file))
+
+        # Keep the old Track alive until the control thread frees it (no deallocation in the callback)
+        previous, self.current = self.current, self.next
+        self.position = self.next_position
+        self.reset_varispeed()
+        self.switch_armed = False
+        self._switch_at = None
+
+        # Clear next slot (will be re-loaded if needed)
+        self.next = None
+        self._retire(previous)
+
+    def check_switch(self, streaming):
+        """Switch to the next loop once silent (on the next bar if quantised and streaming)."""
+        if self.volume != 0 or self.next is None:
+            return
+        if self.quantized and streaming and self.current is not None:
+            # render() performs the switch on the next bar boundary
+            self.switch_armed = True
+        else:
+            self.switch_to_next()
+
+    def drop_next(self):
+        """Forget the pre-loaded next loop (memory pressure). Returns False if a switch is armed."""
+        if self.switch_armed or self.next is None:
+            return False
+        previous, self.next = self.next, None
+        self._retire(previous)
+        return True
+
+    def memory_inventory(self):
+        """(name, nbytes, residency) for every array this layer holds."""
+        entries = []
+        if self.current is not None:
+            entries.append(memory_entry(f"{self.name}.current", self.current.buffer.buffer))
+        if self.next is not None and self.next is not self.current:
+            entries.append(memory_entry(f"{self.name}.next", self.next.buffer.buffer))
+        for index, track in enumerate(list(self.retired)):
+            entries.append(memory_entry(f"{self.name}.retired{index}", track.buffer.buffer))
+        entries.append((f"{self.name}.varispeed", self._varispeed.nbytes, 'resident'))
+        return entries
+
+    # ===== TRANSPORT =====
+
+    def reset_varispeed(self):
+        """Start resampling afresh (new buffer)."""
+        self._varispeed.reset()
+        self._varispeed_active = False
+
+    def _read(self, out):
+        """Read the next frames and advance the position."""
+        self.position = self.buffer.read(out, self.position)
+        self.frames_read += len(out)
+
+    def _frames_until_switch(self, frames):
+        """Output frames before the armed switch, if it falls in this block (else None)."""
+        if not self.switch_armed or self.next is None:
+            return None
+
+        if self._switch_at is None:
+            if self.grid is None:
+                return 0  # No beat grid: switch at the start of this block
+            # Evaluated once per switch; every other block is a subtraction
+            self._switch_at = self.frames_read + self.grid.frames_to_next_bar(self.position)
+
+        remaining = self._switch_at - self.frames_read
+        split = max(0, int(np.ceil(remaining / self.rate)))
+        return split if split < frames else None
+
+    def _render_part(self, out, clock_bpm):
+        """Render len(out) frames. Returns the loop gain, or None if silent (position still advances)."""
+        self.rate = playback_rate(clock_bpm, self.bpm) if self.tempo_synced else 1.0
+
+        if self.volume > 0:
+            if self._varispeed_active or self.rate != 1.0:
+                # Stay on the resampler once used so carried frames are never dropped
+                self._varispeed_active = True
+                self._varispeed.render(out, self.rate, self._read)
+            else:
+                self._read(out)
+            return self.gain
+
+        # Silent: keep the bar clock running without reading audio
+        self.reset_varispeed()
+        step = len(out) if self.rate == 1.0 else int(round(len(out) * self.rate))
+        self.position = self.buffer.advance(self.position, step)
+        self.frames_read += step
+        return None
+
+    def render(self, out, clock_bpm=None):
+        """Fill out with this layer's next block. Returns its gain, or None if silent."""
+        if self.current is None:
+            return None
+
+        split = self._frames_until_switch(len(out))
+        if split is None:
+            return self._render_part(out, clock_bpm)
+
+        # A switch lands inside this block: bake each loop's gain into its part
+        head = out[:split]
+        head_gain = self._render_part(head, clock_bpm) if split else None
+        if head_gain is None:
+            head.fill(0)
+        else:
+            head *= head_gain
+
+        self.switch_to_next()
+        tail = out[split:]
+        tail_gain = self._render_part(tail, clock_bpm)
+        if tail_gain is None:
+            tail.fill(0)
+        else:
+            tail *= tail_gain
+
+        return None if head_gain is None and tail_gain is None else 1.0
+
+
+class Mixer:
+    """Bus of Channels mixed in one vectorised step per block."""
+
+    def __init__(self, channels=2, block_frames=1024, max_layers=MAX_LAYERS):
+        self.output_channels = channels
+        self.block_frames = block_frames
+        self.channels = []
+        self._by_name = {}
+        # Stacked layer blocks and their gains, allocated once: the callback never reallocates
+        self._stack = np.zeros((max_layers, block_frames, channels), dtype=np.float32)
+        self._gains = np.zeros(max_layers, dtype=np.float32)
+
+    def __getitem__(self, name):
+        return self._by_name[name]
+
+    def __contains__(self, name):
+        return name in self._by_name
+
+    def __iter__(self):
+        return iter(self.channels)
+
+    def __len__(self):
+        return len(self.channels)
+
+    def add_channel(self, name, tempo_synced=False, quantized=False):
+        """Create a layer (mixed from the next block on). Raises ValueError past max_layers."""
+        if len(self.channels) >= len(self._stack):
+            raise ValueError(f"Mixer is full ({len(self._stack)} layers)")
+        channel = Channel(name, self.output_channels, self.block_frames,
+                          tempo_synced=tempo_synced, quantized=quantized)
+        self._by_name[name] = channel
+        self.channels.append(channel)  # Last: the callback only ever sees complete layers
+        return channel
+
+    def release_retired(self):
+        """Free every layer's retired Tracks (control thread). Returns bytes released."""
+        return sum(channel.release_retired() for channel in self.channels)
+
+    def memory_inventory(self):
+        """(name, nbytes, residency) for every layer plus the mix scratch."""
+        entries = [entry for channel in self.channels for entry in channel.memory_inventory()]
+        entries.append(memory_entry('mixer.stack', self._stack))
+        return entries
+
+    def mix(self, output, clock_bpm=None):
+        """Overwrite output with the sum of all audible layers (longer blocks in scratch-sized parts)."""
+        for start in range(0, len(output), self.block_frames):
+            self._mix_part(output[start:start + self.block_frames], clock_bpm)
+        return output
+
+    def _mix_part(self, output, clock_bpm):
+        """Mix at most block_frames into output."""
+        frames = len(output)
+
+        # Stack each audible layer's block; silent layers only advance their transport
+        active = 0
+        for channel in self.channels:
+            gain = channel.render(self._stack[active, :frames], clock_bpm)
+            if gain is not None:
+                self._gains[active] = channel.volume * gain
+                active += 1
+
+        if active:
+            np.einsum('c,cfs->fs', self._gains[:active], self._stack[:active, :frames], out=output)
+        else:
+            output.fill(0)
@@ -15,6 +15,8 @@ import select
 import tty
 import termios
 
+from loop_renderer import render_loops, export_loops
+
 class PreRenderCrossfade:
     def __init__(self):
         self.sample_rate = 44100
@@ -174,40 +176,10 @@ class PreRenderCrossfade:
         if self.audio_data is None:
             return
         
-        crossfade_samples = self.crossfade_samples
-        
-        # Calculate total buffer length
-        # First loop: full length
-        # Subsequent loops: full length minus crossfade (overlap)
-        total_buffer_samples = self.total_samples + (self.buffer_loops - 1) * (self.total_samples - crossfade_samples)
-        
-        # Create buffer - USING self.buffer NOT self.pre_render_buffer
-        self.buffer = np.zeros((total_buffer_samples, 2), dtype=np.float32)
-        
-        # Render first loop (full)
-        self.buffer[:self.total_samples] = self.audio_data
-        
-        # Render subsequent loops with crossfade
-        for loop in range(1, self.buffer_loops):
-            start_sample = self.total_samples + (loop - 1) * (self.total_samples - crossfade_samples)
-            
-            # Get the overlapping region from previous loop
-            prev_end = self.buffer[start_sample - crossfade_samples:start_sample].copy()
-            curr_start = self.audio_data[:crossfade_samples].copy()
-            
-            # Apply crossfade (identical to WAV export!)
-            t = np.linspace(0, 1, crossfade_samples).reshape(-1, 1)
-            crossfade_region = prev_end * (1 - t) + curr_start * t
-            
-            # Write crossfade region
-            self.buffer[start_sample - crossfade_samples:start_sample] = crossfade_region
-            
-            # Write rest of current loop
-            remaining = self.total_samples - crossfade_samples
-            if remaining > 0:
-                self.buffer[start_sample:start_sample + remaining] = self.audio_data[crossfade_samples:]
+        # Same renderer as the live engine and the WAV export
+        self.buffer = render_loops(self.audio_data, self.crossfade_samples, self.buffer_loops)
         
-        print(f"  Pre-rendered {self.buffer_loops} loops ({total_buffer_samples/self.sample_rate:.1f}s)")
+        print(f"  Pre-rendered {self.buffer_loops} loops ({len(self.buffer)/self.sample_rate:.1f}s)")
     
     def audio_callback(self, outdata, frames, time, status):
         """Simple playback of pre-rendered buffer."""
@@ -309,7 +281,7 @@ class PreRenderCrossfade:
                 break
     
     def generate_test_wav(self, num_loops=3):
-        """Generate a test WAV file (identical logic to buffer)."""
+        """Generate a test WAV file (same renderer as the buffer, streamed to disk)."""
         if self.audio_data is None:
             print("No audio loaded!")
             return False
@@ -317,40 +289,17 @@ class PreRenderCrossfade:
         print(f"\nGenerating test WAV with {num_loops} loops...")
         
         try:
-            crossfade_samples = self.crossfade_samples
-            
-            # Calculate total length
-            total_output = self.total_samples + (num_loops - 1) * (self.total_samples - crossfade_samples)
-            output = np.zeros((total_output, 2), dtype=np.float32)
-            
-            # Render loops (same logic as pre_render_buffer)
-            output[:self.total_samples] = self.audio_data
-            
-            for loop in range(1, num_loops):
-                start_sample = self.total_samples + (loop - 1) * (self.total_samples - crossfade_samples)
-                
-                prev_end = output[start_sample - crossfade_samples:start_sample].copy()
-                curr_start = self.audio_data[:crossfade_samples].copy()
-                
-                t = np.linspace(0, 1, crossfade_samples).reshape(-1, 1)
-                crossfade_region = prev_end * (1 - t) + curr_start * t
-                
-                output[start_sample - crossfade_samples:start_sample] = crossfade_region
-                
-                remaining = self.total_samples - crossfade_samples
-                if remaining > 0:
-                    output[start_sample:start_sample + remaining] = self.audio_data[crossfade_samples:]
-            
             # Save
             timestamp = time.strftime("%Y%m%d_%H%M%S")
             base_name = os.path.splitext(self.filename)[0]
             test_filename = f"{base_name}_{num_loops}loops_{self.crossfade_ms}ms_{timestamp}.wav"
             test_path = os.path.join("samples/real_test", test_filename)
             
-            sf.write(test_path, output, self.sample_rate)
+            frames = export_loops(self.audio_data, self.crossfade_samples, num_loops, test_path,
+                                  sample_rate=self.sample_rate)
             
             print(f"\n✅ Generated: {test_filename}")
-            print(f"   Duration: {len(output)/self.sample_rate:.1f}s")
+            print(f"   Duration: {frames/self.sample_rate:.1f}s")
             
             return True
             
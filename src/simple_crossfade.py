@@ -8,6 +8,8 @@ import numpy as np
 import sounddevice as sd
 import soundfile as sf
 
+from loop_renderer import render_loops
+
 class SimpleCrossfade:
     def __init__(self):
         self.sample_rate = 44100
@@ -60,30 +62,9 @@ class SimpleCrossfade:
     
     def _create_buffer(self, num_loops):
         """Create pre-rendered buffer."""
-        crossfade = self.crossfade_samples
-        loop_len = len(self.audio_data)
-        
-        total_len = loop_len + (num_loops - 1) * (loop_len - crossfade)
-        buffer = np.zeros((total_len, 2), dtype=np.float32)
-        
-        # First loop
-        buffer[:loop_len] = self.audio_data
-        
-        # Add loops with crossfade
-        for i in range(1, num_loops):
-            start = loop_len + (i - 1) * (loop_len - crossfade)
-            
-            if crossfade > 0:
-                prev = buffer[start - crossfade:start].copy()
-                curr = self.audio_data[:crossfade].copy()
-                t = np.linspace(0, 1, crossfade).reshape(-1, 1)
-                buffer[start - crossfade:start] = prev * (1 - t) + curr * t
-            
-            remaining = loop_len - crossfade
-            if remaining > 0:
-                buffer[start:start + remaining] = self.audio_data[crossfade:]
+        buffer = render_loops(self.audio_data, self.crossfade_samples, num_loops)
         
-        print(f"  Buffer: {num_loops} loops, {total_len/self.sample_rate:.1f}s")
+        print(f"  Buffer: {num_loops} loops, {len(buffer)/self.sample_rate:.1f}s")
         return buffer
     
     def audio_callback(self, outdata, frames, time, status):
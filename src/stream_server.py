@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Live network streaming for Roland S-1 Controller
+Broadcasts the mix over a local HTTP endpoint (Icecast-style: one
+long chunked response per listener).
+
+  audio callback ─push()─▶ bounded block queue ─▶ encoder thread ─▶ encoder
+  subprocess (ffmpeg) ─▶ reader thread ─▶ per-listener bounded queues ─▶ HTTP
+
+Every hop that the audio thread or the encoder feeds is bounded and
+non-blocking: a full queue drops blocks (or the slow listener), it never
+stalls the callback.
+
+One encoder serves every listener, so stream headers are replayed to
+late joiners: the RIFF header for WAV, and for Ogg/Opus the header pages
+(OpusHead/OpusTags), after which listeners get whole Ogg pages.
+"""
+
+import queue
+import struct
+import subprocess
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# format -> (encoder command (None = no subprocess), Content-Type)
+FORMATS = {
+    'mp3': (['ffmpeg', '-loglevel', 'error', '-f', 's16le', '-ar', '{rate}', '-ac', '{channels}',
+             '-i', 'pipe:0', '-c:a', 'libmp3lame', '-b:a', '{bitrate}', '-f', 'mp3', 'pipe:1'],
+            'audio/mpeg'),
+    'opus': (['ffmpeg', '-loglevel', 'error', '-f', 's16le', '-ar', '{rate}', '-ac', '{channels}',
+              '-i', 'pipe:0', '-c:a', 'libopus', '-b:a', '{bitrate}', '-f', 'ogg', 'pipe:1'],
+             'audio/ogg'),
+    'wav': (None, 'audio/wav'),  # Uncompressed, no encoder needed
+}
+
+
+def split_ogg_pages(data):
+    """Split bytes into complete Ogg pages. Returns (pages, leftover bytes of a partial page)."""
+    pages = []
+    start = 0
+    while len(data) - start >= 27:
+        if data[start:start + 4] != b'OggS':
+            found = data.find(b'OggS', start + 1)  # Resync on the capture pattern
+            start = found if found >= 0 else len(data) - 3
+            continue
+        segments = data[start + 26]
+        body_start = start + 27 + segments
+        if len(data) < body_start:
+            break
+        end = body_start + sum(data[start + 27:body_start])
+        if len(data) < end:
+            break
+        pages.append(data[start:end])
+        start = end
+    return pages, data[start:]
+
+
+def ogg_granule(page):
+    """Granule position of an Ogg page (0 on the header pages)."""
+    return struct.unpack_from('<q', page, 6)[0]
+
+
+def wav_stream_header(sample_rate, channels):
+    """RIFF header for an open-ended 16-bit PCM stream (sizes set to the maximum)."""
+    block_align = channels * 2
+    return (b'RIFF' + struct.pack('<I', 0xFFFFFFFF) + b'WAVE'
+            + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, channels, sample_rate,
+                                    sample_rate * block_align, block_align, 16)
+            + b'data' + struct.pack('<I', 0xFFFFFFFF))
+
+
+class StreamServer:
+    """HTTP broadcast of the engine output. Register push() as an engine output tap."""
+
+    def __init__(self, sample_rate=44100, channels=2, port=8000, host='127.0.0.1',
+                 audio_format='mp3', bitrate='128k', encoder_command=None,
+                 queue_blocks=64, client_chunks=64):
+        if audio_format not in FORMATS:
+            raise ValueError(f"Unknown stream format: {audio_format} (choose from {', '.join(FORMATS)})")
+        command, self.content_type = FORMATS[audio_format]
+        if encoder_command is not None:
+            command = encoder_command  # Any program reading s16le on stdin, writing audio on stdout
+        self.encoder_command = [arg.format(rate=sample_rate, channels=channels, bitrate=bitrate)
+                                for arg in command] if command else None
+
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.audio_format = audio_format
+        self.header = wav_stream_header(sample_rate, channels) if audio_format == 'wav' else b''
+        self.ogg = audio_format == 'opus'  # Header pages are captured from the encoder output
+
+        # Audio thread → encoder thread
+        self.blocks = queue.Queue(maxsize=queue_blocks)
+        self.dropped_blocks = 0
+
+        # Encoder output → listeners
+        self.client_chunks = client_chunks
+        self._clients = set()
+        self._clients_lock = threading.Lock()
+        self.dropped_clients = 0
+
+        self.encoder = None
+        self._threads = []
+        self.running = False
+
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]  # Actual port when port=0
+
+    # ===== AUDIO THREAD SIDE =====
+
+    def push(self, outdata):
+        """Queue one output block (called from the audio callback; never blocks)."""
+        if not self.running:
+            return
+        try:
+            self.blocks.put_nowait(outdata.copy())
+        except queue.Full:
+            self.dropped_blocks += 1  # Encoder fell behind: drop rather than stall audio
+
+    def memory_inventory(self):
+        """(name, nbytes, residency) of the queued audio blocks and listener chunks."""
+        block_bytes = sum(block.nbytes for block in list(self.blocks.queue))
+        with self._clients_lock:
+            chunk_bytes = sum(len(chunk) for client in self._clients for chunk in list(client.queue))
+        return [('stream.blocks', block_bytes, 'resident'), ('stream.listeners', chunk_bytes, 'resident')]
+
+    # ===== ENCODER =====
+
+    def start(self):
+        """Start the encoder and the HTTP server (raises OSError if the encoder cannot run)."""
+        if self.running:
+            return
+        if self.encoder_command:
+            try:
+                self.encoder = subprocess.Popen(self.encoder_command, stdin=subprocess.PIPE,
+                                                stdout=subprocess.PIPE, bufsize=0)
+            except OSError:
+                self.httpd.server_close()
+                raise
+        self.running = True
+        if self.encoder is not None:
+            self._spawn(self._read_encoder)
+        self._spawn(self._encode)
+        self._spawn(self.httpd.serve_forever)
+        print(f"📡 Streaming {self.audio_format} on http://{self.httpd.server_address[0]}:{self.port}/stream")
+
+    def _spawn(self, target):
+        thread = threading.Thread(target=target, name=f"stream-{target.__name__}", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _encode(self):
+        """Convert queued blocks to s16le and feed the encoder (or listeners directly for WAV)."""
+        while self.running:
+            try:
+                block = self.blocks.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            pcm = (block * 32767).astype('<i2').tobytes()
+            if self.encoder is None:
+                self._broadcast(pcm)
+                continue
+            try:
+                self.encoder.stdin.write(pcm)
+            except (BrokenPipeError, OSError):
+                print("⚠️  Stream encoder exited")
+                break
+
+    def _read_encoder(self):
+        """Fan encoded bytes out to every listener (whole pages for Ogg, header pages kept)."""
+        pending = b''
+        in_header = True
+        while True:
+            chunk = self.encoder.stdout.read(4096)  # Unbuffered: returns what is available
+            if not chunk:
+                break
+            if not self.ogg:
+                self._broadcast(chunk)
+                continue
+            pages, pending = split_ogg_pages(pending + chunk)
+            for page in pages:
+                in_header = in_header and ogg_granule(page) == 0
+                self._broadcast(page, header=in_header)
+
+    def _broadcast(self, chunk, header=False):
+        """Queue chunk for every listener; header chunks are also replayed to later ones."""
+        with self._clients_lock:
+            if header:
+                self.header += chunk
+            clients = list(self._clients)
+        for client in clients:
+            try:
+                client.put_nowait(chunk)
+            except queue.Full:
+                self._remove_client(client)  # Slow listener: disconnect, never back-pressure
+                self.dropped_clients += 1
+
+    # ===== LISTENERS =====
+
+    @property
+    def client_count(self):
+        with self._clients_lock:
+            return len(self._clients)
+
+    def _add_client(self):
+        """New listener queue and the stream header it must be sent first."""
+        client = queue.Queue(maxsize=self.client_chunks)
+        with self._clients_lock:
+            self._clients.add(client)
+            return client, self.header
+
+    def _has_client(self, client):
+        with self._clients_lock:
+            return client in self._clients
+
+    def _remove_client(self, client):
+        with self._clients_lock:
+            self._clients.discard(client)
+
+    def _handler_class(self):
+        server = self
+
+        class StreamHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                if self.path.split('?')[0] != '/stream':
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', server.content_type)
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.send_header('Cache-Control', 'no-cache')
+                self.end_headers()
+
+                client, header = server._add_client()
+                try:
+                    if header:
+                        self._send_chunk(header)
+                    while server.running:
+                        try:
+                            chunk = client.get(timeout=0.5)
+                        except queue.Empty:
+                            if not server._has_client(client):
+                                break  # Dropped for being too slow
+                            continue
+                        self._send_chunk(chunk)
+                    self.wfile.write(b'0\r\n\r\n')
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # Listener went away
+                finally:
+                    server._remove_client(client)
+
+            def _send_chunk(self, data):
+                self.wfile.write(f"{len(data):X}\r\n".encode() + data + b'\r\n')
+
+            def log_message(self, format, *args):
+                pass  # Keep the terminal display clean
+
+        return StreamHandler
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.encoder is not None:
+            try:
+                self.encoder.stdin.close()
+            except OSError:
+                pass
+            self.encoder.wait(timeout=2.0)
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        self._threads = []
+        print(f"📡 Streaming stopped ({self.dropped_blocks} blocks, {self.dropped_clients} listeners dropped)")
+
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+MIDI Clock Tempo Sync for Roland S-1 Controller
+Tracks the S-1's MIDI clock (24 ppqn) with a jitter-filtered PLL and
+resamples rhythm loops block-by-block so they lock to the synth's tempo.
+"""
+
+import time
+import numpy as np
+
+from beat_grid import load_beat_times
+from library_manifest import read_config, update_config
+
+PPQN = 24                # MIDI clock ticks per quarter note
+MIN_RATE, MAX_RATE = 0.5, 2.0
+
+
+class ClockTempoTracker:
+    """
+    Second-order PLL on MIDI clock tick times.
+    Each tick corrects the predicted phase by alpha * error and the period
+    by beta * error, so USB/scheduler jitter averages out instead of
+    showing up as tempo wobble.
+    """
+
+    def __init__(self, alpha=0.1, beta=0.005, timeout=0.5):
+        self.alpha = alpha          # Phase correction gain
+        self.beta = beta            # Period (tempo) correction gain
+        self.timeout = timeout      # Seconds without ticks before the clock counts as stopped
+        self.reset()
+
+    def reset(self):
+        self.period = None          # Estimated seconds per tick
+        self.next_tick = None       # Predicted time of the next tick
+        self.last_tick = None
+        self.ticks = 0
+        self.running = False
+
+    @property
+    def bpm(self):
+        """Current tempo estimate (None until locked or after the clock stops)."""
+        if self.period is None or self.ticks < PPQN:
+            return None
+        if self.last_tick is not None and time.monotonic() - self.last_tick > self.timeout:
+            return None
+        return 60.0 / (self.period * PPQN)
+
+    def handle_message(self, message, timestamp=None):
+        """Feed a mido message ('clock', 'start', 'continue', 'stop')."""
+        if message.type == 'clock':
+            self.tick(time.monotonic() if timestamp is None else timestamp)
+        elif message.type == 'start':
+            self.reset()
+            self.running = True
+        elif message.type == 'continue':
+            self.running = True
+        elif message.type == 'stop':
+            self.running = False
+
+    def tick(self, t):
+        """Register one clock tick at time t (seconds)."""
+        if self.last_tick is None:
+            self.last_tick = t
+            self.ticks = 1
+            return
+
+        if self.period is None:
+            # Second tick: initial period straight from the interval
+            self.period = t - self.last_tick
+            self.next_tick = t + self.period
+        else:
+            error = t - self.next_tick
+            if abs(error) > 2 * self.period:
+                # Lost lock (tempo jump or dropped ticks): re-acquire
+                self.period = t - self.last_tick
+                self.next_tick = t + self.period
+                self.ticks = 1
+            else:
+                self.period += self.beta * error
+                self.next_tick += self.period + self.alpha * error
+
+        self.last_tick = t
+        self.ticks += 1
+
+
+def read_source_tempo(audio_path):
+    """Native tempo of a rhythm loop from BeatDetector output (None if unknown)."""
+    # Tempo stored in the config by BeatDetector
+    config = read_config(audio_path)
+    if config and config.get('tempo_bpm'):
+        return float(config['tempo_bpm'])
+
+    # Fall back to the median interval of the detected beats
+    beats = load_beat_times(audio_path)
+    if beats is None or len(beats) < 2:
+        return None
+    return float(60.0 / np.median(np.diff(beats)))
+
+
+def store_source_tempo(audio_path, bpm):
+    """
+    Merge the detected tempo into the file's existing config, keeping other keys.
+    Files without a config are left alone (a config is what makes a file part
+    of the library). Returns True if the tempo was stored.
+    """
+    if read_config(audio_path) is None:
+        return False
+    # librosa may return an array
+    update_config(audio_path, {'tempo_bpm': round(float(np.atleast_1d(bpm)[0]), 3)})
+    return True
+
+
+def playback_rate(clock_bpm, source_bpm):
+    """Resampling rate that makes a source_bpm loop play at clock_bpm."""
+    if not clock_bpm or not source_bpm:
+        return 1.0
+    return float(min(MAX_RATE, max(MIN_RATE, clock_bpm / source_bpm)))
+
+
+class VarispeedReader:
+    """
+    Block-based linear-interpolation resampler over a loop source.
+    Reads exactly the input frames a block needs and carries two frames
+    of state between blocks, so rate changes are click-free.
+    """
+
+    def __init__(self, channels=2, max_frames=4096):
+        self.channels = channels
+        self._ramp = np.arange(max_frames, dtype=np.float64)
+        self._input = np.empty((int(max_frames * MAX_RATE) + 4, channels), dtype=np.float32)
+        self.reset()
+
+    def reset(self):
+        """Forget carried frames (call when the source changes)."""
+        self._primed = False
+        self._frac = 0.0
+
+    @property
+    def nbytes(self):
+        """Scratch memory held by the resampler."""
+        return self._ramp.nbytes + self._input.nbytes
+
+    def _grow(self, frames):
+        self._ramp = np.arange(frames, dtype=np.float64)
+        self._input = np.empty((int(frames * MAX_RATE) + 4, self.channels), dtype=np.float32)
+
+    def render(self, out, rate, read):
+        """
+        Fill out with the source played at `rate`.
+        read(buffer) must fill buffer with the next len(buffer) source frames.
+        """
+        frames = len(out)
+        if frames > len(self._ramp):
+            self._grow(frames)
+        rate = min(MAX_RATE, max(MIN_RATE, rate))
+
+        if not self._primed:
+            read(self._input[:2])
+            self._primed = True
+
+        # Output k sits at input position frac + k * rate (index 0/1 = carried frames)
+        positions = self._ramp[:frames] * rate
+        positions += self._frac
+        end = self._frac + frames * rate
+        new_frames = int(end)
+
+        if new_frames:
+            read(self._input[2:2 + new_frames])
+
+        index = positions.astype(np.intp)
+        weight = (positions - index).astype(np.float32)[:, None]
+        source = self._input
+        np.subtract(source[index + 1], source[index], out=out)
+        out *= weight
+        out += source[index]
+
+        # Carry the two frames around the next output position
+        self._input[:2] = self._input[new_frames:new_frames + 2]
+        self._frac = end - new_frames
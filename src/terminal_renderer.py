@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Terminal Renderer for Roland S-1 Controller
+Redraws only the lines that changed.
+
+Frames are assembled into one preallocated byte buffer using ANSI cursor
+positioning and pushed to the terminal with a single os.write, instead
+of forking `clear` and reprinting the whole screen every frame.
+"""
+
+import io
+import os
+import sys
+import threading
+
+CSI = b'\x1b['
+CLEAR_SCREEN = CSI + b'H' + CSI + b'2J'
+CLEAR_TO_EOL = CSI + b'K'
+CLEAR_TO_END = CSI + b'J'
+HIDE_CURSOR = CSI + b'?25l'
+SHOW_CURSOR = CSI + b'?25h'
+
+
+class TerminalRenderer:
+    """Diffing frame writer for a fixed block of lines at the top of the screen."""
+
+    def __init__(self, fd=None, capacity=16384):
+        self.fd = sys.stdout.fileno() if fd is None else fd  # Or a stream (e.g. StringIO in tests)
+        self._buffer = bytearray(capacity)
+        self._length = 0
+        self._previous = []
+        self._full_redraw = True
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """Force a full redraw on the next frame (e.g. after other output)."""
+        self._full_redraw = True
+
+    def _put(self, data):
+        """Append bytes to the frame buffer, growing it only if a frame is huge."""
+        end = self._length + len(data)
+        if end > len(self._buffer):
+            grown = bytearray(max(end, 2 * len(self._buffer)))
+            grown[:self._length] = self._buffer[:self._length]
+            self._buffer = grown
+        self._buffer[self._length:end] = data
+        self._length = end
+
+    def _flush(self):
+        """Write the assembled frame with as few syscalls as possible."""
+        view = memoryview(self._buffer)[:self._length]
+        try:
+            if isinstance(self.fd, io.TextIOBase):
+                self.fd.write(view.tobytes().decode('utf-8'))
+                return
+            while view:
+                written = os.write(self.fd, view)
+                view = view[written:]
+        finally:
+            view.release()
+            self._length = 0
+
+    def draw(self, lines):
+        """Draw a frame (list of str). Returns the number of lines rewritten."""
+        with self._lock:
+            previous = self._previous
+            full = self._full_redraw
+            changed = 0
+
+            if full:
+                self._put(HIDE_CURSOR + CLEAR_SCREEN)
+
+            for row, line in enumerate(lines):
+                if not full and row < len(previous) and previous[row] == line:
+                    continue
+                self._put(CSI + b'%d;1H' % (row + 1))
+                self._put(line.encode('utf-8'))
+                self._put(CLEAR_TO_EOL)
+                changed += 1
+
+            if len(lines) < len(previous):
+                self._put(CSI + b'%d;1H' % (len(lines) + 1) + CLEAR_TO_END)
+                changed += 1
+
+            if changed:
+                # Park the cursor under the frame so stray prints land below it
+                self._put(CSI + b'%d;1H' % (len(lines) + 1))
+                self._flush()
+
+            self._previous = list(lines)
+            self._full_redraw = False
+            return changed
+
+    def clear(self):
+        """Clear the screen and forget the previous frame."""
+        with self._lock:
+            self._put(CLEAR_SCREEN)
+            self._flush()
+            self._previous = []
+            self._full_redraw = True
+
+    def close(self):
+        """Restore the cursor below the last frame."""
+        with self._lock:
+            self._put(CSI + b'%d;1H' % (len(self._previous) + 1) + SHOW_CURSOR)
+            self._flush()
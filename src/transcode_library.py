@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Library Transcoder
+Converts a sample library (e.g. samples/ambient and samples/rhythm) to
+FLAC, OGG Vorbis or MP3 across a process pool, so the library fits on
+small SD cards. Audio streams through the encoder a block at a time,
+outputs newer than their source are skipped (nightly syncs only redo
+what changed), and the sidecar files (.txt configs, labels, beats) are
+copied next to each output, with cached loudness re-stamped for it.
+
+    python src/transcode_library.py samples samples_mp3 --format mp3
+"""
+
+import os
+import time
+import shutil
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import soundfile as sf
+
+from library_manifest import MANIFEST_NAME, update_config
+from loudness import read_loudness
+
+# format -> (extension, libsndfile format, subtype)
+TRANSCODE_FORMATS = {
+    'mp3': ('.mp3', 'MP3', 'MPEG_LAYER_III'),
+    'ogg': ('.ogg', 'OGG', 'VORBIS'),
+    'flac': ('.flac', 'FLAC', 'PCM_16'),
+}
+
+# Lossless sources only: re-encoding MP3/OGG would only lose quality
+SOURCE_EXTENSIONS = ('.wav', '.flac')
+
+# Files that travel with <name>.<ext>: config, Audacity labels, BeatDetector output
+SIDECAR_SUFFIXES = ('.txt', '_label.txt', '_loops.txt', '_beats.txt')
+
+DEFAULT_BLOCK_FRAMES = 65536
+
+
+def _up_to_date(source, target):
+    """True if target exists and is at least as new as source."""
+    try:
+        return os.path.getmtime(target) >= os.path.getmtime(source)
+    except OSError:
+        return False
+
+
+def find_sources(source_dir, output_dir):
+    """Lossless audio files under source_dir (skipping output_dir if it is nested inside)."""
+    output_dir = os.path.realpath(output_dir)
+    sources = []
+    for root, dirs, files in os.walk(source_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.realpath(os.path.join(root, d)) != output_dir)
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in SOURCE_EXTENSIONS:
+                sources.append(os.path.join(root, name))
+    return sources
+
+
+def transcode_file(source, target, export_format='mp3', quality=None,
+                   block_frames=DEFAULT_BLOCK_FRAMES):
+    """
+    Stream source into target block-by-block (worker entry point for the process pool).
+    Writes to a .part file and renames it, so an interrupted sync never leaves a
+    truncated output that looks up to date. Returns seconds of audio transcoded.
+    """
+    _, file_format, subtype = TRANSCODE_FORMATS[export_format]
+    partial = target + '.part'
+    try:
+        with sf.SoundFile(source) as f_in, \
+             sf.SoundFile(partial, 'w', samplerate=f_in.samplerate, channels=f_in.channels,
+                          format=file_format, subtype=subtype, compression_level=quality) as f_out:
+            for block in f_in.blocks(blocksize=block_frames, dtype='float32', always_2d=True):
+                f_out.write(block)
+            seconds = f_in.frames / f_in.samplerate
+        os.replace(partial, target)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return seconds
+
+
+def copy_sidecars(source, target):
+    """Copy the sidecar files of source next to target (when newer). Returns files copied."""
+    source_base = os.path.splitext(source)[0]
+    target_base = os.path.splitext(target)[0]
+    copied = 0
+    for suffix in SIDECAR_SUFFIXES:
+        sidecar = source_base + suffix
+        if os.path.exists(sidecar) and not _up_to_date(sidecar, target_base + suffix):
+            shutil.copy2(sidecar, target_base + suffix)
+            copied += 1
+    return copied
+
+
+def restamp_loudness(source, target):
+    """
+    Carry the source's cached loudness over to target's copied config.
+    The cache is validated against the audio's mtime, which the copy would
+    fail, so it is re-stamped with the finished target's. Returns True if stamped.
+    """
+    loudness = read_loudness(source)
+    if loudness is None or read_loudness(target) is not None:
+        return False
+    update_config(target, {'loudness': dict(loudness, source_mtime=int(os.path.getmtime(target)))})
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Transcode a sample library to a compressed format')
+    parser.add_argument('source_dir', help='Library root (e.g. samples)')
+    parser.add_argument('output_dir', help='Output root (the directory tree is mirrored)')
+    parser.add_argument('--format', '-f', choices=sorted(TRANSCODE_FORMATS), default='mp3', help='Output format')
+    parser.add_argument('--quality', '-q', type=float,
+                        help='Encoder compression level, 0 (best quality) to 1 (smallest)')
+    parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count(), help='Parallel encoder processes')
+    parser.add_argument('--force', action='store_true', help='Re-encode outputs that are up to date')
+    args = parser.parse_args()
+
+    extension = TRANSCODE_FORMATS[args.format][0]
+    jobs = []
+    skipped = sidecars = 0
+    for source in find_sources(args.source_dir, args.output_dir):
+        relative = os.path.relpath(source, args.source_dir)
+        target = os.path.join(args.output_dir, os.path.splitext(relative)[0] + extension)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        sidecars += copy_sidecars(source, target)
+        # The directory manifest is keyed by file stem, so it applies to the outputs as-is
+        manifest = os.path.join(os.path.dirname(source), MANIFEST_NAME)
+        manifest_copy = os.path.join(os.path.dirname(target), MANIFEST_NAME)
+        if os.path.exists(manifest) and not _up_to_date(manifest, manifest_copy):
+            shutil.copy2(manifest, manifest_copy)
+            sidecars += 1
+        if not args.force and _up_to_date(source, target):
+            skipped += 1
+            restamp_loudness(source, target)  # Its config may have been copied again
+        else:
+            jobs.append((source, target))
+
+    print(f"Transcoding {len(jobs)} files to {args.format} ({skipped} up to date, "
+          f"{sidecars} sidecar files copied)")
+
+    started = time.time()
+    seconds_done = 0.0
+    bytes_in = bytes_out = 0
+    failed = 0
+
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {
+            pool.submit(transcode_file, source, target, args.format, args.quality): (source, target)
+            for source, target in jobs
+        }
+        for future in as_completed(futures):
+            source, target = futures[future]
+            try:
+                duration = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"  ❌ Error transcoding {os.path.basename(source)}: {e}")
+                continue
+            restamp_loudness(source, target)
+            seconds_done += duration
+            bytes_in += os.path.getsize(source)
+            bytes_out += os.path.getsize(target)
+            print(f"  ✅ {os.path.relpath(target, args.output_dir)} ({duration:.1f}s)")
+
+    elapsed = max(time.time() - started, 1e-6)
+    ratio = bytes_out / bytes_in * 100 if bytes_in else 0.0
+    print(f"\nTranscoded {seconds_done:.1f}s of audio in {elapsed:.1f}s "
+          f"({seconds_done / elapsed:.0f}x realtime, {bytes_in / (1024 * 1024) / elapsed:.1f}MB/s in), "
+          f"{bytes_in / (1024 * 1024):.1f}MB -> {bytes_out / (1024 * 1024):.1f}MB ({ratio:.0f}%)"
+          + (f", {failed} failed" if failed else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Headless output backends: pacing of the null sink, the WAV sink and raw stdout PCM."""
+
+import io
+import time
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from audio_backends import StdoutStream, open_stream
+
+
+def sine_callback():
+    phase = [0]
+
+    def sine(outdata, frames, time_info, status):
+        t = (phase[0] + np.arange(frames)) / 44100
+        outdata[:] = (0.5 * np.sin(2 * np.pi * 440 * t))[:, None]
+        phase[0] += frames
+
+    return sine
+
+
+class VirtualClock:
+    """Stands in for perf_counter/sleep: sleeping advances time exactly (plus any injected lag)."""
+
+    def __init__(self, lag=None):
+        self.now = 100.0
+        self.sleeps = 0
+        self.lag = lag or {}  # sleep number -> extra seconds the "scheduler" oversleeps
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds + self.lag.get(self.sleeps, 0.0)
+        self.sleeps += 1
+
+
+def paced_null_stream(clock, duration):
+    dac_times = []
+    stream = open_stream('null', 44100, 1024, 2,
+                         lambda outdata, frames, time_info, status: dac_times.append(time_info.outputBufferDacTime),
+                         duration=duration)
+    stream.clock, stream.sleep = clock, clock.sleep
+    stream.start()
+    stream.wait()
+    return stream, dac_times
+
+
+def test_null_backend_sleeps_to_each_block_deadline():
+    clock = VirtualClock()
+    stream, dac_times = paced_null_stream(clock, duration=1.0)
+    block_seconds = 1024 / 44100
+    assert stream.frames == 44100
+    assert clock.sleeps == len(dac_times) == 44  # One sleep per block, no spinning
+    assert clock.now - 100.0 == pytest.approx(44 * block_seconds)
+    assert np.diff(dac_times) == pytest.approx(block_seconds)
+    assert stream.underruns == 0
+
+
+def test_null_backend_reports_a_missed_deadline_and_re_anchors():
+    clock = VirtualClock(lag={10: 0.1})  # One wakeup ~4 blocks late
+    stream, dac_times = paced_null_stream(clock, duration=1.0)
+    assert stream.underruns == 1
+    assert np.diff(dac_times)[11:] == pytest.approx(1024 / 44100)  # Steady again, no catch-up burst
+
+
+def test_null_backend_is_paced_in_real_time():
+    stream = open_stream('null', 44100, 1024, 2, sine_callback(), duration=0.5)
+    started = time.perf_counter()
+    stream.start()
+    stream.wait()
+    assert stream.frames == 22050
+    assert time.perf_counter() - started >= 0.5  # Never faster than real time (slower only under load)
+
+
+def test_wav_backend_writes_requested_length(tmp_path):
+    path = str(tmp_path / 'sine.wav')
+    stream = open_stream('wav', 44100, 1024, 2, sine_callback(), path=path, subtype='FLOAT', duration=2.0)
+    stream.start()
+    stream.wait()
+    audio, sample_rate = sf.read(path, dtype=np.float32)
+    assert sample_rate == 44100
+    assert len(audio) == 88200
+    assert float(audio.max()) == pytest.approx(0.5, abs=1e-3)
+
+
+def test_stdout_backend_writes_whole_s16le_frames():
+    output = io.BytesIO()
+    stream = StdoutStream(44100, 1024, 2, sine_callback(), realtime=False, duration=0.5, output=output)
+    stream.start()
+    stream.wait()
+    pcm = np.frombuffer(output.getvalue(), dtype='<i2').reshape(-1, 2)
+    assert len(pcm) == 22050
+    assert abs(int(pcm.max()) - 16383) <= 2
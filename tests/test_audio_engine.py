@@ -0,0 +1,63 @@
+"""AudioEngine on the manual backend: labelled region selection and status snapshots."""
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from audio_engine import AudioEngine
+from engine_status import StatusPublisher
+from label_index import Labels
+
+
+def test_repeated_region_presses_step_from_the_queued_region(tmp_path):
+    path = str(tmp_path / 'r_clip.wav')
+    sf.write(path, np.zeros((2 * 44100, 2), dtype=np.float32), 44100)
+    labels = Labels([[0.0, 0.5, 'Loop 1'], [0.5, 1.0, 'Loop 2'], [1.0, 1.5, 'Loop 3']])
+
+    engine = AudioEngine(backend='manual')
+    engine.region_layers.add('rhythm')
+    engine.label_lookup = lambda audio_path: labels
+    engine.load_initial_rhythm(('r_clip.wav', 10, path))
+    loop = engine.mixer['rhythm'].current.buffer
+
+    assert engine.select_region('rhythm')
+    assert engine.select_region('rhythm')  # Same bar: keeps advancing
+    assert (loop.active, loop.queued) == (0, 2)
+    assert engine.status_snapshot().layer('rhythm').region == 'Loop 1'
+
+
+def test_snapshot_peak_covers_every_block_since_the_last_snapshot():
+    engine = AudioEngine(backend='manual')
+    engine.start_playback()
+    block_seconds = engine.buffer_size / engine.sample_rate
+    for seconds in (0.001, 0.004, 0.002):  # As if written by three callbacks
+        engine._callback_times[engine.callback_count % len(engine._callback_times)] = seconds
+        engine.callback_count += 1
+    engine.callback_seconds = 0.002
+
+    assert engine.status_snapshot().callback_peak == 0.004 / block_seconds
+    assert engine.status_snapshot().callback_peak == 0.0  # Nothing ran since
+    engine.stop_playback()
+
+
+def test_failing_memory_monitor_keeps_the_snapshot():
+    class BrokenMonitor:
+        def get_memory_summary(self):
+            raise OSError("no /proc")
+
+    publisher = StatusPublisher(AudioEngine(backend='manual'), memory_monitor=BrokenMonitor())
+    status = publisher.publish()
+    assert status.memory_summary == "RAM: [Error]"
+    assert status.sequence == 1
+
+
+def test_legacy_layer_attributes_are_writable_only_where_the_layer_is():
+    engine = AudioEngine(backend='manual')
+    engine.rhythm_volume = 0.25
+    assert engine.mixer['rhythm'].volume == 0.25
+    engine.current_ambient_buffer_position = 10
+    assert engine.mixer['ambient'].position == 10
+
+    for name in ('current_ambient_buffer', 'ambient_gain', 'next_rhythm_file', 'rhythm_crossfade_ms', 'rhythm_bpm'):
+        with pytest.raises(AttributeError):
+            setattr(engine, name, None)
@@ -0,0 +1,45 @@
+"""Isolated audio process (manual backend): layers, shared-memory controls and a queued switch."""
+
+import time
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from audio_process import AudioProcess
+
+
+@pytest.fixture
+def clips(tmp_path):
+    """Constant-level clips, so a layer's peak identifies it."""
+    paths = {}
+    for name, level in (('pad', 0.5), ('drums', 0.25), ('perc', 0.125)):
+        path = str(tmp_path / f"{name}.wav")
+        sf.write(path, np.full(44100, level, dtype=np.float32), 44100)
+        paths[name] = (f"{name}.wav", 0, path)
+    return paths
+
+
+def test_switch_through_isolated_process(clips):
+    audio = AudioProcess(backend='manual')
+    try:
+        audio.target_buffer_seconds = 10
+        audio.load_initial_ambient(clips['pad'])
+        audio.load_initial_rhythm(clips['drums'])
+        audio.preload_next_rhythm(clips['perc'])
+        audio.start_playback()
+
+        audio.set_crossfader(0.0)  # Rhythm silent: switches to perc and frees drums
+        _, peak_ambient = audio.render(10)
+        audio.set_crossfader(1.0)
+        _, peak_rhythm = audio.render(10)
+        time.sleep(0.1)
+
+        assert peak_ambient == pytest.approx(0.5, abs=1e-6)
+        assert peak_rhythm == pytest.approx(0.125, abs=1e-6)
+        assert audio.current_rhythm_file == clips['perc']
+        assert audio.next_rhythm_buffer is None
+        assert len(audio._buffers) == 2
+        assert audio.sample_time == 20 * 1024
+    finally:
+        audio.stop_playback()
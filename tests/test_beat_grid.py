@@ -0,0 +1,72 @@
+"""Bar-quantised switches: an armed switch lands exactly on the next bar, or at once without a grid."""
+
+import numpy as np
+import pytest
+
+from beat_grid import BeatGrid
+from loop_renderer import PreRenderedLoop
+from mixer import Channel, Track
+
+RATE = 44100
+PERIOD = RATE  # 1 s loops
+BLOCK = 1024
+
+
+def ramp_track(offset, grid=None, start=0):
+    """Loop whose samples hold their own source index (+ offset), so the output shows what played."""
+    ramp = (offset + np.arange(2 * PERIOD) % PERIOD).astype(np.float32)
+    buffer = PreRenderedLoop.from_buffer(np.column_stack([ramp, ramp]), PERIOD)
+    return Track(('loop.wav', 0, 'loop.wav'), buffer, start, grid=grid)
+
+
+def play_until_switch(channel, max_blocks=100):
+    """Render blocks until the next Track takes over; returns the concatenated output."""
+    blocks = []
+    out = np.zeros((BLOCK, 2), dtype=np.float32)
+    for _ in range(max_blocks):
+        channel.render(out)
+        blocks.append(out[:, 0].copy())
+        if channel.next is None:
+            return np.concatenate(blocks)
+    raise AssertionError("switch never happened")
+
+
+def test_grid_finds_the_next_bar():
+    grid = BeatGrid(np.arange(0, 1.0, 0.125), RATE, PERIOD)  # 8 beats: bars at 0 and 0.5 s
+    assert list(grid.bars) == [0, RATE // 2]
+    assert grid.frames_to_next_bar(1000) == RATE // 2 - 1000
+    assert grid.frames_to_next_bar(RATE // 2) == 0
+    assert grid.frames_to_next_bar(PERIOD + 30000) == PERIOD - 30000  # Wraps to the downbeat
+
+
+@pytest.mark.parametrize('start', [1000, 30000])
+def test_armed_switch_lands_on_the_next_bar_frame(start):
+    grid = BeatGrid(np.arange(0, 1.0, 0.125), RATE, PERIOD)
+    channel = Channel('rhythm', quantized=True)
+    channel.volume = 1.0
+    channel.assign('current', ramp_track(0, grid, start))
+    channel.assign('next', ramp_track(100000, grid, start=int(grid.first_bar)))
+
+    out = np.zeros((BLOCK, 2), dtype=np.float32)
+    channel.render(out)  # Play a little before arming
+    channel.switch_armed = True
+    played = play_until_switch(channel)
+
+    switch = int(np.argmax(played >= 100000))
+    next_bar = RATE // 2 if start < RATE // 2 else PERIOD
+    assert played[switch - 1] == next_bar - 1          # Old loop plays up to the bar line...
+    assert played[switch] == 100000 + grid.first_bar    # ...and the next starts on its downbeat
+    assert switch == next_bar - (start + BLOCK)         # Exact frame, not rounded to a block
+
+
+def test_switch_without_a_grid_happens_at_the_next_block():
+    channel = Channel('rhythm', quantized=True)
+    channel.volume = 1.0
+    channel.assign('current', ramp_track(0, start=500))
+    channel.assign('next', ramp_track(100000))
+
+    out = np.zeros((BLOCK, 2), dtype=np.float32)
+    channel.render(out)
+    channel.switch_armed = True
+    played = play_until_switch(channel)
+    assert len(played) == BLOCK and played[0] == 100000
@@ -0,0 +1,76 @@
+"""Control loop: timers, cross-thread posts, readers and stopping from a callback."""
+
+import os
+import threading
+import time
+
+import pytest
+
+from control_loop import ControlLoop
+
+
+@pytest.fixture
+def loop():
+    loop = ControlLoop()
+    yield loop
+    loop.stop()
+    if loop.thread is not None and loop.thread is not threading.current_thread():
+        loop.thread.join(1.0)
+    loop.close()
+
+
+def test_timers_fire_in_deadline_order_and_cancel_drops_one(loop):
+    fired = []
+    loop.call_later(0.03, fired.append, 'late')
+    loop.call_later(0.01, fired.append, 'early')
+    loop.call_later(0.01, fired.append, 'early, second')  # Same deadline: scheduling order
+    cancelled = loop.call_later(0.02, fired.append, 'cancelled')
+    loop.cancel(cancelled)
+    loop.call_later(0.05, loop.stop)
+    loop.run()
+    assert fired == ['early', 'early, second', 'late']
+
+
+def test_post_from_another_thread_wakes_the_sleeping_loop(loop):
+    woken = threading.Event()
+    loop.start()
+    time.sleep(0.05)  # Loop is blocked in select() with nothing scheduled
+    posted_at = time.monotonic()
+    threading.Thread(target=loop.call_soon_threadsafe, args=(woken.set,)).start()
+    assert woken.wait(1.0)
+    assert time.monotonic() - posted_at < 0.5
+
+
+def test_reader_runs_while_registered(loop):
+    read_fd, write_fd = os.pipe()
+    received = []
+
+    def on_readable():
+        received.append(os.read(read_fd, 100))
+        if len(received) == 1:
+            loop.remove_reader(read_fd)
+            os.write(write_fd, b'ignored')
+            loop.call_later(0.05, loop.stop)
+
+    loop.add_reader(read_fd, on_readable)
+    os.write(write_fd, b'key')
+    loop.run()
+    assert received == [b'key']
+    os.close(read_fd)
+    os.close(write_fd)
+
+
+def test_stop_inside_a_callback_ends_run(loop):
+    calls = []
+
+    def stop():
+        calls.append('stop')
+        loop.stop()
+        loop.call_soon_threadsafe(calls.append, 'after')  # Queued after stop: not run
+
+    loop.call_soon_threadsafe(stop)
+    runner = threading.Thread(target=loop.run)
+    runner.start()
+    runner.join(1.0)
+    assert not runner.is_alive()
+    assert calls == ['stop']
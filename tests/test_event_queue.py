@@ -0,0 +1,46 @@
+"""Control event ring: ordering and overflow coalescing."""
+
+from event_queue import EventRing, EVENT_CROSSFADER, EVENT_VOLUME
+
+
+def drain(ring):
+    events = []
+    while ring.peek_time() is not None:
+        events.append(ring.pop())
+    event = ring.pop_latest()
+    while event is not None:
+        events.append(event)
+        event = ring.pop_latest()
+    return events
+
+
+def test_events_pop_in_order():
+    ring = EventRing(capacity=4)
+    for value in (0.1, 0.2, 0.3):
+        ring.push(0, EVENT_CROSSFADER, value)
+    assert drain(ring) == [(EVENT_CROSSFADER, 0.1), (EVENT_CROSSFADER, 0.2), (EVENT_CROSSFADER, 0.3)]
+
+
+def test_overflow_keeps_latest_value_per_key():
+    ring = EventRing(capacity=2)
+    for value in (0.1, 0.2, 0.3, 0.4):
+        ring.push(0, EVENT_CROSSFADER, value)
+    ring.push(0, EVENT_VOLUME, ('ambient', 0.5), key=(EVENT_VOLUME, 'ambient'))
+    ring.push(0, EVENT_VOLUME, ('rhythm', 0.7), key=(EVENT_VOLUME, 'rhythm'))
+    events = drain(ring)
+    assert events[:2] == [(EVENT_CROSSFADER, 0.1), (EVENT_CROSSFADER, 0.2)]
+    assert sorted(events[2:]) == [(EVENT_CROSSFADER, 0.4), (EVENT_VOLUME, ('ambient', 0.5)),
+                                  (EVENT_VOLUME, ('rhythm', 0.7))]
+
+
+def test_pushes_after_overflow_never_overtake_coalesced_values():
+    """Once overflowed, new events coalesce even if the ring has room again."""
+    ring = EventRing(capacity=1)
+    ring.push(0, EVENT_CROSSFADER, 0.1)
+    ring.push(0, EVENT_CROSSFADER, 0.2)   # Ring full: coalesced
+    assert ring.pop() == (EVENT_CROSSFADER, 0.1)
+    ring.push(0, EVENT_CROSSFADER, 0.3)   # Ring has room, but 0.2 is still pending
+    assert ring.peek_time() is None
+    assert ring.pop_latest() == (EVENT_CROSSFADER, 0.3)
+    ring.push(0, EVENT_CROSSFADER, 0.4)   # Drained: back to the ring
+    assert ring.pop() == (EVENT_CROSSFADER, 0.4)
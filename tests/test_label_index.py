@@ -0,0 +1,73 @@
+"""Label index: built by the library scan, refreshed when a label source changes."""
+
+import json
+import os
+
+import numpy as np
+import soundfile as sf
+
+import label_index
+from file_manager import FileManager
+from label_index import LabelIndex
+from library_manifest import migrate_directory
+
+
+def write_rhythm(directory, name, labels=None):
+    path = directory / f'{name}.wav'
+    sf.write(str(path), np.zeros((4410, 2), dtype=np.float32), 44100)
+    (directory / f'{name}.txt').write_text(json.dumps({'crossfade_ms': 100}))
+    if labels is not None:
+        (directory / f'{name}_label.txt').write_text(labels)
+    return str(path)
+
+
+def bump_mtime(path, seconds=10):
+    later = os.path.getmtime(path) + seconds
+    os.utime(path, (later, later))
+
+
+def test_scan_indexes_labels_without_reparsing_on_get(tmp_path, monkeypatch):
+    path = write_rhythm(tmp_path, 'r_beat', "0.0\t0.05\tLoop 1\n0.05\t0.1\tLoop 2\n")
+    write_rhythm(tmp_path, 'r_plain')
+    file_mgr = FileManager(rhythm_dir=str(tmp_path))
+    file_mgr.scan_rhythm_files()
+
+    parsed = []
+    monkeypatch.setattr(label_index, 'read_audacity_labels', lambda p: parsed.append(p) or [])
+    labels = file_mgr.get_labels(path)
+    assert labels.descriptions == ('Loop 1', 'Loop 2')
+    assert file_mgr.get_labels(str(tmp_path / 'r_plain.wav')) is None
+    assert parsed == []  # Served from the scan's index
+
+
+def test_edited_label_file_is_reread(tmp_path):
+    path = write_rhythm(tmp_path, 'r_beat', "0.0\t0.05\tIntro\n")
+    index = LabelIndex()
+    index.index_directory(str(tmp_path), [path])
+    assert index.get(path).descriptions == ('Intro',)
+
+    label_path = tmp_path / 'r_beat_label.txt'
+    label_path.write_text("0.0\t0.05\tIntro\n0.05\t0.1\tDrop\n")
+    bump_mtime(str(label_path))
+    assert index.get(path).descriptions == ('Intro', 'Drop')
+
+
+def test_label_file_added_later_is_picked_up(tmp_path):
+    path = write_rhythm(tmp_path, 'r_beat')
+    index = LabelIndex()
+    index.index_directory(str(tmp_path), [path])
+    assert index.get(path) is None
+
+    (tmp_path / 'r_beat_loops.txt').write_text("0.0\t0.1\tSegment 1\n")
+    bump_mtime(str(tmp_path))
+    assert index.get(path).descriptions == ('Segment 1',)
+
+
+def test_manifest_labels_win_over_label_files(tmp_path):
+    path = write_rhythm(tmp_path, 'r_beat', "0.0\t0.05\tFrom Audacity\n")
+    migrate_directory(str(tmp_path))  # Copies the _label.txt rows into library.json
+    (tmp_path / 'r_beat_label.txt').write_text("0.0\t0.05\tEdited later\n")
+
+    index = LabelIndex()
+    index.index_directory(str(tmp_path), [path])
+    assert index.get(path).descriptions == ('From Audacity',)
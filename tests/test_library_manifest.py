@@ -0,0 +1,56 @@
+"""Library manifest: config merging for files added after migration and stem clashes."""
+
+import json
+
+import numpy as np
+import soundfile as sf
+
+from library_manifest import MANIFEST_NAME, migrate_directory, read_config, update_config
+from loudness import analyze_file, read_loudness
+
+
+def write_clip(path, seconds=0.5, level=0.1):
+    sf.write(str(path), np.full((int(44100 * seconds), 2), level, dtype=np.float32), 44100)
+
+
+def write_sidecar(path, config):
+    with open(str(path).rsplit('.', 1)[0] + '.txt', 'w') as f:
+        json.dump(config, f)
+
+
+def test_update_keeps_sidecar_settings_of_a_file_added_after_migration(tmp_path):
+    write_clip(tmp_path / 'a_one.wav')
+    write_sidecar(tmp_path / 'a_one.wav', {'crossfade_ms': 1000})
+    assert migrate_directory(str(tmp_path)) == 1
+
+    two = tmp_path / 'a_two.wav'
+    write_clip(two)
+    write_sidecar(two, {'crossfade_ms': 2500})
+    loudness = analyze_file(str(two))
+
+    config = read_config(str(two))
+    assert config['crossfade_ms'] == 2500
+    assert config['loudness'] == loudness
+
+
+def test_update_merges_into_an_existing_manifest_entry(tmp_path):
+    clip = tmp_path / 'r_loop.wav'
+    write_clip(clip)
+    write_sidecar(clip, {'crossfade_ms': 100, 'type': 'rhythm'})
+    migrate_directory(str(tmp_path))
+
+    update_config(str(clip), {'tempo_bpm': 120.0})
+    assert read_config(str(clip)) == {'crossfade_ms': 100, 'type': 'rhythm', 'tempo_bpm': 120.0}
+    assert (tmp_path / MANIFEST_NAME).exists()
+
+
+def test_loudness_is_not_cached_for_files_sharing_a_stem(tmp_path):
+    wav = tmp_path / 'a_x.wav'
+    write_clip(wav)
+    sf.write(str(tmp_path / 'a_x.flac'), np.zeros((4410, 2), dtype=np.float32), 44100)
+    write_sidecar(wav, {'crossfade_ms': 1000})
+    migrate_directory(str(tmp_path))
+
+    analyze_file(str(wav))
+    assert 'loudness' not in read_config(str(wav))
+    assert read_loudness(str(tmp_path / 'a_x.flac')) is None
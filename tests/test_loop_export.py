@@ -0,0 +1,38 @@
+"""Loop export: --normalize applies only a cached gain that matches the audio."""
+
+import json
+import os
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from loop_export import render_file
+from loudness import analyze_file
+
+
+@pytest.fixture
+def clip(tmp_path):
+    path = str(tmp_path / 'a_pad.wav')
+    t = np.arange(44100) / 44100
+    sf.write(path, np.column_stack([0.05 * np.sin(2 * np.pi * 220 * t)] * 2), 44100)
+    with open(str(tmp_path / 'a_pad.txt'), 'w') as f:
+        json.dump({'crossfade_ms': 0}, f)
+    return path
+
+
+def exported_peak(clip, tmp_path):
+    output_path, _ = render_file(clip, str(tmp_path), 1, normalize=True)
+    return np.max(np.abs(sf.read(output_path, dtype='float32')[0]))
+
+
+def test_normalize_applies_the_cached_gain(clip, tmp_path):
+    loudness = analyze_file(clip)
+    assert exported_peak(clip, tmp_path) == pytest.approx(0.05 * 10 ** (loudness['gain_db'] / 20), rel=1e-3)
+
+
+def test_normalize_ignores_a_stale_gain(clip, tmp_path):
+    analyze_file(clip)
+    later = os.path.getmtime(clip) + 10  # File replaced after it was analysed
+    os.utime(clip, (later, later))
+    assert exported_peak(clip, tmp_path) == pytest.approx(0.05, rel=1e-3)
@@ -0,0 +1,94 @@
+"""Conformance of every loop rendering path against the reference splice."""
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from loop_renderer import INT16_SCALE, LoopRenderer, PreRenderedLoop, export_loops, render_frames, render_loops
+
+
+def reference_render_loops(audio, crossfade_samples, num_loops):
+    """The original tester algorithm, the reference every path must match."""
+    total_samples = len(audio)
+    total_output = total_samples + (num_loops - 1) * (total_samples - crossfade_samples)
+    output = np.zeros((total_output, audio.shape[1]), dtype=np.float32)
+    output[:total_samples] = audio
+
+    for loop in range(1, num_loops):
+        start_sample = total_samples + (loop - 1) * (total_samples - crossfade_samples)
+        prev_end = output[start_sample - crossfade_samples:start_sample].copy()
+        curr_start = audio[:crossfade_samples].copy()
+        t = np.linspace(0, 1, crossfade_samples).reshape(-1, 1)
+        output[start_sample - crossfade_samples:start_sample] = prev_end * (1 - t) + curr_start * t
+        remaining = total_samples - crossfade_samples
+        if remaining > 0:
+            output[start_sample:start_sample + remaining] = audio[crossfade_samples:]
+
+    return output
+
+
+CASES = [(1000, 0, 4), (1000, 100, 5), (1000, 500, 3), (4410, 1, 6), (37, 18, 9), (1, 0, 3)]
+
+
+@pytest.fixture(params=CASES, ids=lambda case: "L=%d-c=%d-n=%d" % case)
+def case(request):
+    loop_length, crossfade, num_loops = request.param
+    rng = np.random.default_rng(loop_length * 1000 + crossfade)
+    # Full scale at most, so int16 storage only quantises (never clips)
+    audio = np.clip(rng.standard_normal((loop_length, 2)) * 0.25, -1.0, 1.0).astype(np.float32)
+    reference = reference_render_loops(audio, crossfade, num_loops)
+    # Endless streams agree with the reference up to its final (unfaded) tail
+    return audio, crossfade, num_loops, reference, len(reference) - crossfade
+
+
+def test_render_loops(case):
+    audio, crossfade, num_loops, reference, _ = case
+    assert np.array_equal(render_loops(audio, crossfade, num_loops), reference)
+
+
+def test_render_frames(case):
+    audio, crossfade, _, reference, body = case
+    assert np.array_equal(render_frames(audio, crossfade, body), reference[:body])
+
+
+def test_render_block_odd_sizes(case):
+    """Blocks straddling seams and wraps match the one-shot stream."""
+    audio, crossfade, _, reference, body = case
+    rng = np.random.default_rng(1)
+    renderer = LoopRenderer(audio, crossfade)
+    blocks = []
+    position = 0
+    while sum(len(block) for block in blocks) < body:
+        block = np.empty((int(rng.integers(1, 300)), 2), dtype=np.float32)
+        position = renderer.render_block(block, position)
+        blocks.append(block)
+    assert np.array_equal(np.vstack(blocks)[:body], reference[:body])
+
+
+def test_pre_rendered_follows_stream_after_wrap(case):
+    audio, crossfade, _, _, _ = case
+    renderer = LoopRenderer(audio, crossfade)
+    pre = PreRenderedLoop(renderer, len(audio))
+    out = np.empty((len(pre) * 3, 2), dtype=np.float32)
+    pre.read(out, 0)
+    assert np.array_equal(out, renderer.render(len(out)))
+
+
+@pytest.mark.parametrize('storage, tolerance', [('int16', 0.5 / INT16_SCALE + 1e-7), ('float16', 2.0 ** -11)])
+def test_compact_storage_within_quantisation(case, storage, tolerance):
+    audio, crossfade, _, _, _ = case
+    renderer = LoopRenderer(audio, crossfade)
+    expected = renderer.render(len(PreRenderedLoop(renderer, len(audio))) * 3)
+    compact = PreRenderedLoop(renderer, len(audio), storage=storage)
+    out = np.empty_like(expected)
+    compact.read(out, 0)
+    assert compact.buffer.dtype == storage
+    assert np.abs(out - expected).max() <= tolerance
+
+
+def test_export_loops_streaming(case, tmp_path):
+    audio, crossfade, num_loops, reference, _ = case
+    path = str(tmp_path / 'loops.wav')
+    export_loops(audio, crossfade, num_loops, path, export_format='float', block_frames=97)
+    exported, _ = sf.read(path, dtype='float32', always_2d=True)
+    assert np.array_equal(exported, reference)
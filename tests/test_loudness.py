@@ -0,0 +1,92 @@
+"""Loudness analysis on synthetic tones: measurements, target gain and cache invalidation."""
+
+import json
+import os
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+import loudness
+from loudness import (LoudnessAnalyzer, MAX_GAIN_DB, PEAK_CEILING, TARGET_LUFS, TARGET_RMS,
+                      analyze_file, gain_from_config, read_loudness)
+from library_manifest import read_config
+
+RATE = 48000
+
+
+def write_tone(path, amplitude, seconds=2.0, silent_seconds=0.0, frequency=1000.0):
+    """Stereo sine at `amplitude` (peak), optionally followed by silence."""
+    t = np.arange(int(RATE * seconds)) / RATE
+    tone = amplitude * np.sin(2 * np.pi * frequency * t)
+    audio = np.concatenate([tone, np.zeros(int(RATE * silent_seconds))])
+    sf.write(str(path), np.column_stack([audio, audio]).astype(np.float32), RATE, subtype='FLOAT')
+    return str(path)
+
+
+def write_config(audio_path, config):
+    with open(os.path.splitext(audio_path)[0] + '.txt', 'w') as f:
+        json.dump(config, f)
+
+
+def test_rms_and_peak_of_a_sine(tmp_path):
+    measurement = LoudnessAnalyzer('rms').analyze(write_tone(tmp_path / 'tone.wav', 0.5))
+    assert measurement['rms'] == pytest.approx(0.5 / np.sqrt(2), rel=1e-4)
+    assert measurement['peak'] == pytest.approx(0.5, rel=1e-4)
+    assert measurement['frames'] == 2 * RATE and measurement['lufs'] is None
+
+
+def test_gated_loudness_ignores_silence(tmp_path, monkeypatch):
+    monkeypatch.setattr(loudness, 'lfilter', None)  # Unweighted: exact closed form
+    analyzer = LoudnessAnalyzer('gated')
+    tone = analyzer.analyze(write_tone(tmp_path / 'tone.wav', 0.1))
+    padded = analyzer.analyze(write_tone(tmp_path / 'padded.wav', 0.1, silent_seconds=2.0))
+
+    # Two channels at mean square A²/2 each
+    assert tone['lufs'] == pytest.approx(-0.691 + 20 * np.log10(0.1), abs=0.01)
+    # Silent windows are gated out; only the 3 windows straddling the edge (3/4, 2/4, 1/4 tone)
+    # join the 17 full ones, where ungated the 2 s of silence would cost ~3 dB
+    assert padded['lufs'] == pytest.approx(tone['lufs'] + 10 * np.log10(18.5 / 20), abs=0.01)
+    assert padded['rms'] == pytest.approx(tone['rms'] / np.sqrt(2), rel=1e-3)
+
+
+def test_k_weighted_loudness_of_a_1khz_sine(tmp_path):
+    pytest.importorskip('scipy')
+    measurement = LoudnessAnalyzer('gated').analyze(write_tone(tmp_path / 'tone.wav', 0.1))
+    assert measurement['k_weighted']
+    assert measurement['lufs'] == pytest.approx(20 * np.log10(0.1), abs=0.1)  # 1 kHz: 0 dB sine = 0 LUFS
+
+
+def test_target_gain_math():
+    analyzer = LoudnessAnalyzer('rms')
+    assert analyzer.compute_gain_db({'rms': TARGET_RMS / 2, 'peak': 0.1}) == pytest.approx(6.02, abs=0.01)
+    assert analyzer.compute_gain_db({'rms': 2e-4, 'peak': 0.0003}) == MAX_GAIN_DB
+    assert analyzer.compute_gain_db({'rms': 0.05, 'peak': 0.9}) == pytest.approx(
+        20 * np.log10(PEAK_CEILING / 0.9), abs=0.01)  # Peak ceiling wins
+    assert analyzer.compute_gain_db({'rms': 0.0, 'peak': 0.0}) == 0.0
+
+    gated = LoudnessAnalyzer('gated')
+    assert gated.compute_gain_db({'lufs': -20.0, 'rms': 0.1, 'peak': 0.1}) == TARGET_LUFS + 20.0
+
+
+def test_gain_is_cached_and_invalidated_by_mtime(tmp_path):
+    path = write_tone(tmp_path / 'a_tone.wav', 0.1)
+    write_config(path, {'crossfade_ms': 500})
+
+    cached = analyze_file(path)
+    config = read_config(path)
+    assert config['crossfade_ms'] == 500 and config['loudness'] == cached
+    assert read_loudness(path) == cached
+    assert gain_from_config(config, path) == pytest.approx(10 ** (cached['gain_db'] / 20))
+
+    later = os.path.getmtime(path) + 10  # Audio replaced since the analysis
+    os.utime(path, (later, later))
+    assert gain_from_config(config, path) == 1.0
+    assert read_loudness(path) is None
+
+
+def test_files_without_config_are_not_written(tmp_path):
+    path = write_tone(tmp_path / 'a_tone.wav', 0.1)
+    analyze_file(path)
+    assert read_config(path) is None
+    assert gain_from_config({}, path) == 1.0
@@ -0,0 +1,108 @@
+"""Memory budget level transitions and the resident/mapped buffer inventory."""
+
+import mmap
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from audio_engine import AudioEngine
+from memory_monitor import MemoryBudget, MemoryMonitor, pressure_level
+from mixer import memory_entry
+
+
+class StubMonitor:
+    def __init__(self):
+        self.level = "LOW"
+
+    def is_available(self):
+        return True
+
+    def get_memory_status(self):
+        return {'pressure_level': self.level}
+
+
+class StubEngine:
+    def __init__(self):
+        self.preload_depth = 1
+        self.evictions = 0
+        self.drops = 0
+
+    def evict_caches(self):
+        self.evictions += 1
+        return 1024 * 1024
+
+    def drop_preloaded(self):
+        self.drops += 1
+        return 4 * 1024 * 1024
+
+
+def test_pressure_levels():
+    assert [pressure_level(p) for p in (10, 51, 66, 81)] == ["LOW", "MODERATE", "HIGH", "CRITICAL"]
+
+
+def test_budget_sheds_and_restores_as_pressure_moves():
+    monitor, engine = StubMonitor(), StubEngine()
+    relieved = []
+    budget = MemoryBudget(monitor, engine, on_relieved=lambda: relieved.append(True))
+
+    def step(level):
+        monitor.level = level
+        assert budget.enforce() == level
+        return engine.evictions, engine.drops, engine.preload_depth, len(relieved)
+
+    assert step("LOW") == (0, 0, 1, 0)
+    assert step("HIGH") == (1, 0, 1, 0)        # Caches only
+    assert step("CRITICAL") == (2, 1, 0, 0)    # Preloading paused, next loops dropped
+    assert step("CRITICAL") == (3, 1, 0, 0)    # Already paused: nothing more to drop
+    assert step("HIGH") == (4, 1, 0, 0)        # Still too high to resume
+    assert step("MODERATE") == (4, 1, 1, 1)    # Relieved once
+    assert step("LOW") == (4, 1, 1, 1)
+
+
+def test_budget_does_nothing_without_psutil():
+    monitor, engine = StubMonitor(), StubEngine()
+    monitor.is_available = lambda: False
+    monitor.level = "CRITICAL"
+    assert MemoryBudget(monitor, engine).enforce() == "LOW"
+    assert engine.evictions == 0 and engine.preload_depth == 1
+
+
+def test_inventory_splits_resident_and_mapped(tmp_path):
+    resident = np.zeros((1024 * 1024 // 8, 2), dtype=np.float32)                     # 1 MB
+    mapped_file = np.memmap(str(tmp_path / 'loop.f32'), dtype=np.float32, mode='w+',
+                            shape=(1024 * 1024 // 4,))                                 # 1 MB
+    shm = shared_memory.SharedMemory(create=True, size=2 * 1024 * 1024)
+    try:
+        shared = np.ndarray((1024 * 1024 // 2,), dtype=np.float32, buffer=shm.buf)     # 2 MB
+        anonymous = np.frombuffer(mmap.mmap(-1, 1024 * 1024), dtype=np.float32)      # 1 MB
+
+        class Engine:
+            def memory_inventory(self):
+                return [memory_entry(name, array) for name, array in
+                        (('resident', resident), ('memmap', mapped_file),
+                         ('shared', shared), ('anonymous', anonymous))]
+
+        monitor = MemoryMonitor()
+        assert [row[2] for row in Engine().memory_inventory()] == ['resident', 'mapped', 'mapped', 'mapped']
+        assert monitor.update_buffer_estimate(Engine()) == pytest.approx(5.0)
+        assert monitor.buffer_resident_mb == pytest.approx(1.0)
+        assert monitor.buffer_mapped_mb == pytest.approx(4.0)
+        del shared
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def test_engine_inventory_lists_live_buffers(tmp_path):
+    path = str(tmp_path / 'a_pad.wav')
+    sf.write(path, np.zeros((44100, 2), dtype=np.float32), 44100)
+
+    engine = AudioEngine(backend='manual')
+    engine.load_initial_ambient(('a_pad.wav', 100, path))
+    names = {name: (nbytes, residency) for name, nbytes, residency in engine.memory_inventory()}
+    assert names['ambient.current'][0] > 0
+    assert 'ambient.next' not in names and 'rhythm.current' not in names
+    assert {'mixer.stack', 'events'} <= set(names)
+    assert all(residency == 'resident' for _, residency in names.values())
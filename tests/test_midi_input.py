@@ -0,0 +1,101 @@
+"""Coalescing MIDI input driven by scripted messages, and the S-1 knob mapping."""
+
+import threading
+import time
+import types
+
+import pytest
+
+from control_loop import ControlLoop
+from midi_handler import MidiHandler
+from midi_input import CoalescingMidiInput
+
+
+def cc(control, value):
+    return types.SimpleNamespace(type='control_change', control=control, value=value)
+
+
+def message(kind):
+    return types.SimpleNamespace(type=kind)
+
+
+def test_burst_coalesces_to_the_last_value_per_control():
+    batches = []
+    midi = CoalescingMidiInput(batches.append)
+    midi.feed([cc(16, value) for value in range(100)] + [cc(17, 5), cc(17, 9), cc(20, 64)])
+    assert midi.flush() == {16: 99, 17: 9}  # CC 20 is not an S-1 knob
+    assert batches == [{16: 99, 17: 9}]
+    assert midi.messages_received == 102
+    assert midi.flush() == {}
+
+
+def test_flush_thread_applies_at_most_one_batch_per_interval():
+    batches = []
+    applied = threading.Event()
+
+    def on_controls(batch):
+        batches.append(batch)
+        applied.set()
+
+    midi = CoalescingMidiInput(on_controls, interval=0.2)
+    midi.start()
+    try:
+        midi.feed([cc(16, 1)])
+        assert applied.wait(1.0)
+        midi.feed([cc(16, 2), cc(16, 3)])  # Inside the interval: held back, then coalesced
+        time.sleep(0.1)
+        assert batches == [{16: 1}]
+        deadline = time.monotonic() + 1.0
+        while len(batches) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert batches == [{16: 1}, {16: 3}]
+    finally:
+        midi.close()
+
+
+def test_loop_mode_rate_limits_batches():
+    loop = ControlLoop()
+    times = []
+    midi = CoalescingMidiInput(lambda batch: times.append(time.monotonic()), interval=0.05, loop=loop)
+    loop.start()
+    try:
+        for value in range(20):
+            midi.feed([cc(18, value)])
+            time.sleep(0.01)
+        time.sleep(0.1)
+    finally:
+        loop.stop()
+        loop.thread.join(1.0)
+        loop.close()
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    assert 2 <= len(times) < 20  # Coalesced, not one batch per message
+    assert min(gaps) >= 0.045
+
+
+def test_clock_messages_go_to_on_clock_not_the_batch():
+    clock = []
+    midi = CoalescingMidiInput(lambda batch: None, on_clock=clock.append)
+    midi.feed([message('start'), message('clock'), cc(16, 10), message('clock'), message('stop')])
+    assert [m.type for m in clock] == ['start', 'clock', 'clock', 'stop']
+    assert midi.drain() == {16: 10}
+
+
+class StubEngine:
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda amount: self.calls.append((name, amount))
+
+
+def test_apply_controls_maps_s1_knobs_to_engine_controls():
+    handler = MidiHandler.__new__(MidiHandler)  # No terminal or port: only the mapping
+    handler.audio_engine = StubEngine()
+    handler.display = types.SimpleNamespace(render=lambda: None)
+    changes = []
+    handler.on_change = lambda: changes.append(True)
+
+    handler._apply_controls({16: 127, 17: 0, 18: 64, 19: 100})
+    assert handler.audio_engine.calls == [('set_crossfader', 1.0), ('set_delay_amount', 0.0),
+                                          ('set_reverb_amount', pytest.approx(64 / 127))]
+    assert changes == [True]
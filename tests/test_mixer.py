@@ -0,0 +1,162 @@
+"""Mixer channels and loop sources: memory bound, progressive first play, region loops."""
+
+import tracemalloc
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from label_index import Labels
+from loop_renderer import LoopRenderer, PreRenderedLoop, compute_seam
+from mixer import Channel, Mixer, ProgressiveLoop, RegionLoop, prepare_loop, prepare_regions
+
+SAMPLE_RATE = 44100
+
+
+@pytest.fixture
+def loops(tmp_path):
+    """Four 2 s stereo noise clips as FileManager tuples."""
+    files = []
+    rng = np.random.default_rng(0)
+    for index in range(4):
+        path = str(tmp_path / f"loop{index}.wav")
+        sf.write(path, rng.uniform(-0.5, 0.5, (2 * SAMPLE_RATE, 2)).astype(np.float32), SAMPLE_RATE)
+        files.append((f"loop{index}.wav", 50, path))
+    return files
+
+
+def test_channel_peak_memory_is_bounded(loops):
+    """Cycling loads and switches never holds more than current + next Tracks and one decode."""
+    seconds, target_seconds = 2, 10
+    channel = Channel('layer')
+    channel.volume = 1.0
+    out = np.zeros((1024, 2), dtype=np.float32)
+    track_bytes = PreRenderedLoop.buffer_frames(
+        LoopRenderer(np.zeros((seconds * SAMPLE_RATE, 2), dtype=np.float32), int(0.05 * SAMPLE_RATE)),
+        target_seconds * SAMPLE_RATE) * 2 * 4
+    source_bytes = seconds * SAMPLE_RATE * 2 * 4
+    # Two Tracks, the clip being decoded (+ soundfile's read buffer) and the seam crossfade
+    bound = 2 * track_bytes + 2 * source_bytes + (1 << 20)
+
+    tracemalloc.start()
+    try:
+        channel.assign('current', prepare_loop(loops[0], SAMPLE_RATE, target_seconds, label='test'))
+        peak = 0
+        for cycle in range(1, 8):
+            tracemalloc.reset_peak()
+            channel.release_retired()  # What the engine does before every load
+            channel.assign('next', prepare_loop(loops[cycle % 4], SAMPLE_RATE, target_seconds, label='test'))
+            channel.render(out)
+            channel.switch_to_next()
+            channel.render(out)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+        channel.release_retired()
+        held = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    assert peak <= bound
+    assert held <= track_bytes + (1 << 20)  # One Track after release
+
+
+def decoded(path):
+    """The whole file as the stereo float32 clip ProgressiveLoop builds."""
+    audio = sf.read(path, dtype=np.float32, always_2d=True)[0]
+    return audio if audio.shape[1] > 1 else np.repeat(audio, 2, axis=1)
+
+
+@pytest.mark.parametrize('extension, subtype', [('.wav', 'FLOAT'), ('.flac', 'PCM_16'), ('.ogg', 'VORBIS')])
+def test_progressive_handover_is_sample_identical(loops, tmp_path, extension, subtype):
+    """PCM subtypes (WAV, FLAC) decode the tail first; OGG decodes front to back."""
+    path = str(tmp_path / f"clip{extension}")
+    sf.write(path, sf.read(loops[0][2], dtype=np.float32)[0], SAMPLE_RATE, subtype=subtype)
+    expected = LoopRenderer(decoded(path), int(0.05 * SAMPLE_RATE)).render(400 * 1024)
+
+    loop = ProgressiveLoop(path, SAMPLE_RATE, 50, 10 * SAMPLE_RATE, head_seconds=0.5)
+    played = np.empty_like(expected)
+    position = 0
+    for index in range(400):
+        if index == 20:
+            loop.decode_body()  # Still inside the decoded head: the body arrives in time
+        if index == 150:
+            loop.complete(grace=0)  # Handover mid-stream (past the first wrap)
+        position = loop.read(played[index * 1024:(index + 1) * 1024], position)
+
+    assert loop.ready.is_set()
+    assert np.array_equal(played, expected)
+
+
+def test_progressive_lossy_seam_matches_full_decode(loops, tmp_path):
+    """The seam (live and pre-rendered) is built from the decoded tail, never from silence."""
+    path = str(tmp_path / 'clip.ogg')
+    sf.write(path, sf.read(loops[0][2], dtype=np.float32)[0], SAMPLE_RATE, subtype='VORBIS')
+    reference = LoopRenderer(decoded(path), int(0.05 * SAMPLE_RATE))
+
+    loop = ProgressiveLoop(path, SAMPLE_RATE, 50, 10 * SAMPLE_RATE, head_seconds=0.5)
+    assert loop._renderer.crossfade_samples == 0  # Tail not decoded yet: no seam to cross into
+    loop.complete(grace=0)
+    seam = np.empty((reference.crossfade_samples, 2), dtype=np.float32)
+    loop.read(seam, reference.period)
+    assert np.array_equal(seam, reference.seam)
+
+
+def test_regions_switch_on_the_playing_regions_next_bar(loops):
+    """Regions are views of one clip; a queued region starts on the next bar."""
+    clip = sf.read(loops[1][2], dtype=np.float32)[0]
+    half, c = SAMPLE_RATE // 2, 2205
+    beats = np.arange(0.0, 2.0, 0.0625)  # Bars every 0.25 s
+    loop = RegionLoop(clip, [(0, half, 0), (2 * half, 3 * half, 1)], c, SAMPLE_RATE, beats)
+    assert all(np.shares_memory(renderer.audio, clip) for renderer in loop._renderers)
+
+    played = np.empty((2 * SAMPLE_RATE, 2), dtype=np.float32)
+    position = loop.read(played[:5000], loop.start)
+    loop.select(1)
+    loop.read(played[5000:], position)
+
+    bar = SAMPLE_RATE // 4
+    assert loop.active == 1
+    assert np.array_equal(played[:bar], LoopRenderer(clip[:half + c], c).render(bar))
+    assert np.array_equal(played[bar:], LoopRenderer(clip[2 * half:3 * half + c], c).render(len(played) - bar))
+
+
+def test_region_at_end_of_file_crossfades_into_its_pre_roll(loops):
+    """No post-roll: the wrap fades in the audio before the region instead of hard-cutting."""
+    clip = sf.read(loops[1][2], dtype=np.float32)[0]
+    start, end, c = SAMPLE_RATE, len(clip), 2205
+    loop = RegionLoop(clip, [(start, end, 0)], c, SAMPLE_RATE)
+    length = end - start
+    assert loop.period == length  # Bars stay in phase
+
+    played = np.empty((2 * length, 2), dtype=np.float32)
+    loop.read(played, loop.start)
+    assert np.array_equal(played[:length - c], clip[start:end - c])
+    assert np.array_equal(played[length - c:length], compute_seam(clip[start - c:end], c))
+    assert np.array_equal(played[length:2 * length - c], clip[start:end - c])
+
+
+def test_dropped_regions_keep_their_label_index(loops):
+    labels = Labels([[5.0, 6.0, 'Past the end'], [0.0, 0.5, 'Loop A'], [1.0, 1.5, 'Loop B']])
+    loop = prepare_regions(loops[1], SAMPLE_RATE, labels).buffer
+    assert len(loop.regions) == 2
+    assert [labels.descriptions[loop.label_index(region)] for region in range(2)] == ['Loop A', 'Loop B']
+
+
+def test_mixer_scratch_is_never_reallocated(loops):
+    mixer = Mixer(2, 1024, max_layers=3)
+    stack = mixer._stack
+    for index, file_info in enumerate(loops[:3]):
+        channel = mixer.add_channel(f"layer{index}")
+        channel.assign('current', prepare_loop(file_info, SAMPLE_RATE, 4))
+        channel.volume = 1.0
+    with pytest.raises(ValueError):
+        mixer.add_channel('one too many')
+
+    reference = Mixer(2, 4096, max_layers=3)
+    for index, file_info in enumerate(loops[:3]):
+        channel = reference.add_channel(f"layer{index}")
+        channel.assign('current', prepare_loop(file_info, SAMPLE_RATE, 4))
+        channel.volume = 1.0
+
+    long_block = mixer.mix(np.zeros((3000, 2), dtype=np.float32))  # Host asked for more than a block
+    assert mixer._stack is stack
+    np.testing.assert_allclose(long_block, reference.mix(np.zeros((3000, 2), dtype=np.float32)), atol=1e-6)
@@ -0,0 +1,85 @@
+"""Stream server: listeners over HTTP, Ogg header replay for late joiners, missing encoder."""
+
+import io
+import struct
+import time
+import types
+import urllib.request
+
+import numpy as np
+import pytest
+
+from stream_server import StreamServer, split_ogg_pages
+
+
+def ogg_page(granule, payload, sequence=0):
+    """Minimal Ogg page (CRC left zero: only the framing is parsed here)."""
+    lacing = bytes([255] * (len(payload) // 255) + [len(payload) % 255])
+    return (b'OggS' + bytes([0, 0]) + struct.pack('<qIII', granule, 1, sequence, 0)
+            + bytes([len(lacing)]) + lacing + payload)
+
+
+def listen(server):
+    response = urllib.request.urlopen(f"http://127.0.0.1:{server.port}/stream", timeout=5)
+    while server.client_count == 0:
+        time.sleep(0.01)
+    return response
+
+
+@pytest.mark.parametrize('audio_format, command', [('mp3', ['cat']), ('wav', None)])
+def test_listener_receives_pushed_audio(audio_format, command):
+    # `cat` stands in for ffmpeg as the encoder subprocess
+    server = StreamServer(port=0, audio_format=audio_format, encoder_command=command)
+    server.start()
+    try:
+        response = listen(server)
+        block = np.full((1024, 2), 0.25, dtype=np.float32)
+        for _ in range(20):
+            server.push(block)
+            time.sleep(0.002)
+
+        expected = len(server.header) + 20 * 1024 * 2 * 2
+        received = b''
+        while len(received) < expected:
+            received += response.read1(65536)
+    finally:
+        server.stop()
+
+    assert len(received) == expected
+    assert np.all(np.frombuffer(received[len(server.header):], dtype='<i2') == 8191)
+
+
+def test_split_ogg_pages_keeps_partial_pages():
+    pages = [ogg_page(0, b'OpusHead' + bytes(11)), ogg_page(960, bytes(300), 1)]
+    data = b''.join(pages)
+    assert split_ogg_pages(data) == (pages, b'')
+    assert split_ogg_pages(data[:-10]) == (pages[:1], pages[1][:-10])
+    assert split_ogg_pages(b'junk' + data)[0] == pages
+
+
+def test_late_opus_listener_gets_the_header_pages_first():
+    header = [ogg_page(0, b'OpusHead' + bytes(11)), ogg_page(0, b'OpusTags' + bytes(8), 1)]
+    audio = [ogg_page(960 * n, bytes(120), n + 1) for n in range(1, 4)]
+    server = StreamServer(port=0, audio_format='opus', encoder_command=['cat'])
+    try:
+        early, _ = server._add_client()
+        stream = b''.join(header + audio)
+        # Chunked at an odd size so pages straddle encoder reads
+        server.encoder = types.SimpleNamespace(stdout=io.BytesIO(stream))
+        server.encoder.stdout.read = lambda size, read=server.encoder.stdout.read: read(100)
+        server._read_encoder()
+        late, late_header = server._add_client()
+    finally:
+        server.httpd.server_close()
+
+    assert b''.join(list(early.queue)) == stream
+    assert late_header == b''.join(header)
+    assert late.empty()
+
+
+def test_missing_encoder_raises_and_frees_the_port():
+    server = StreamServer(port=0, encoder_command=['/nonexistent/ffmpeg'])
+    with pytest.raises(OSError):
+        server.start()
+    assert not server.running
+    assert server.httpd.socket.fileno() == -1
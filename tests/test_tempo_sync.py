@@ -0,0 +1,46 @@
+"""Offline MIDI clock sync: PLL lock on a jittery synthetic clock and the varispeed resampler."""
+
+import numpy as np
+import pytest
+
+from tempo_sync import PPQN, ClockTempoTracker, VarispeedReader, playback_rate
+
+
+def synthetic_clock(bpm, seconds, jitter_ms, seed=0):
+    """Tick times of a MIDI clock at bpm with Gaussian timing jitter."""
+    rng = np.random.default_rng(seed)
+    period = 60.0 / (bpm * PPQN)
+    ticks = np.arange(int(seconds / period)) * period
+    return ticks + rng.normal(0, jitter_ms / 1000.0, len(ticks))
+
+
+@pytest.mark.parametrize('bpm', [90.0, 120.0, 140.0])
+def test_tracker_locks_to_jittery_clock(bpm):
+    tracker = ClockTempoTracker()
+    for t in synthetic_clock(bpm, seconds=4.0, jitter_ms=1.0):
+        tracker.tick(t)
+    assert 60.0 / (tracker.period * PPQN) == pytest.approx(bpm, abs=0.5)
+
+
+def test_playback_rate_is_clamped():
+    assert playback_rate(120.0, 100.0) == pytest.approx(1.2)
+    assert playback_rate(None, 100.0) == 1.0
+    assert playback_rate(400.0, 100.0) == 2.0
+    assert playback_rate(20.0, 100.0) == 0.5
+
+
+def test_varispeed_reader_advances_at_rate():
+    """A ramp resampled block by block advances by the rate per output frame."""
+    rate = playback_rate(120.0, 100.0)
+    source = np.arange(100000, dtype=np.float32).reshape(-1, 1).repeat(2, axis=1)
+    position = [0]
+
+    def read(buffer):
+        buffer[:] = source[position[0]:position[0] + len(buffer)]
+        position[0] += len(buffer)
+
+    reader = VarispeedReader()
+    out = np.empty((1024, 2), dtype=np.float32)
+    for _ in range(20):
+        reader.render(out, rate, read)
+    assert np.mean(np.diff(out[:, 0])) == pytest.approx(rate, abs=1e-3)
@@ -0,0 +1,50 @@
+"""Diffed terminal frames: only changed lines are rewritten."""
+
+import io
+
+from terminal_renderer import CLEAR_SCREEN, TerminalRenderer
+
+ESC = '\x1b['
+
+
+def test_first_frame_is_a_full_redraw():
+    out = io.StringIO()
+    renderer = TerminalRenderer(out)
+    assert renderer.draw(['title', 'line 2']) == 2
+    frame = out.getvalue()
+    assert CLEAR_SCREEN.decode() in frame
+    assert f'{ESC}1;1Htitle{ESC}K' in frame and f'{ESC}2;1Hline 2{ESC}K' in frame
+
+
+def test_unchanged_frame_emits_nothing():
+    out = io.StringIO()
+    renderer = TerminalRenderer(out)
+    renderer.draw(['title', 'crossfader 50%'])
+    out.seek(0)
+    out.truncate()
+
+    assert renderer.draw(['title', 'crossfader 50%']) == 0
+    assert out.getvalue() == ''
+
+
+def test_changed_line_emits_only_a_cursor_move_and_that_line():
+    out = io.StringIO()
+    renderer = TerminalRenderer(out)
+    renderer.draw(['title', 'crossfader 50%', 'delay OFF'])
+    out.seek(0)
+    out.truncate()
+
+    assert renderer.draw(['title', 'crossfader 55% ✓', 'delay OFF']) == 1
+    # Line 2 rewritten, then the cursor parked below the frame
+    assert out.getvalue() == f'{ESC}2;1Hcrossfader 55% ✓{ESC}K{ESC}4;1H'
+
+
+def test_shorter_frame_clears_the_leftover_lines():
+    out = io.StringIO()
+    renderer = TerminalRenderer(out)
+    renderer.draw(['a', 'b', 'c'])
+    out.seek(0)
+    out.truncate()
+
+    assert renderer.draw(['a']) == 1
+    assert out.getvalue() == f'{ESC}2;1H{ESC}J{ESC}2;1H'
@@ -0,0 +1,90 @@
+"""Library transcoder: up-to-date skipping, --force, .part outputs and config carry-over."""
+
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+import transcode_library
+from library_manifest import MANIFEST_NAME, migrate_directory, read_config
+from loudness import analyze_file, gain_from_config
+
+
+@pytest.fixture
+def library(tmp_path):
+    """samples/ambient with one analysed clip (config in a .txt and labels next to it)."""
+    source_dir = tmp_path / 'samples' / 'ambient'
+    source_dir.mkdir(parents=True)
+    clip = source_dir / 'a_pad.wav'
+    t = np.arange(44100) / 44100
+    sf.write(str(clip), np.column_stack([0.1 * np.sin(2 * np.pi * 220 * t)] * 2), 44100)
+    with open(source_dir / 'a_pad.txt', 'w') as f:
+        json.dump({'crossfade_ms': 1500}, f)
+    (source_dir / 'a_pad_label.txt').write_text("0.0\t0.5\tIntro\n")
+    analyze_file(str(clip))
+    return tmp_path
+
+
+def run(monkeypatch, library, *options):
+    monkeypatch.setattr(sys, 'argv', ['transcode_library.py', str(library / 'samples'),
+                                      str(library / 'out'), '--format', 'flac', '--jobs', '1', *options])
+    transcode_library.main()
+    return str(library / 'out' / 'ambient' / 'a_pad.flac')
+
+
+def test_outputs_and_sidecars_are_written(monkeypatch, library):
+    target = run(monkeypatch, library)
+    assert sf.info(target).frames == 44100
+    assert not os.path.exists(target + '.part')
+    assert os.path.exists(target[:-len('.flac')] + '_label.txt')
+    assert read_config(target)['crossfade_ms'] == 1500
+
+
+def test_up_to_date_outputs_are_skipped_unless_forced(monkeypatch, library):
+    target = run(monkeypatch, library)
+    os.utime(target, (1e9, 2e9))  # Newer than the source
+    run(monkeypatch, library)
+    assert os.path.getmtime(target) == 2e9
+
+    run(monkeypatch, library, '--force')
+    assert os.path.getmtime(target) != 2e9
+
+
+def test_interrupted_encode_leaves_no_output(tmp_path, monkeypatch):
+    source = str(tmp_path / 'a.wav')
+    sf.write(source, np.zeros((1000, 2), dtype=np.float32), 44100)
+    target = str(tmp_path / 'a.flac')
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+    monkeypatch.setattr(sf.SoundFile, 'write', fail)
+    with pytest.raises(OSError):
+        transcode_library.transcode_file(source, target, 'flac')
+    assert not os.path.exists(target) and not os.path.exists(target + '.part')
+
+
+def test_cached_loudness_stays_valid_for_later_outputs(monkeypatch, library):
+    source = str(library / 'samples' / 'ambient' / 'a_pad.wav')
+    expected = gain_from_config(read_config(source), source)
+    assert expected != 1.0
+
+    target = run(monkeypatch, library)
+    later = os.path.getmtime(source) + 5  # Output written well after its source
+    os.utime(target, (later, later))
+    run(monkeypatch, library)  # Skipped, but its config is re-stamped
+    assert gain_from_config(read_config(target), target) == pytest.approx(expected)
+
+
+def test_manifest_is_carried_over(monkeypatch, library):
+    source_dir = library / 'samples' / 'ambient'
+    migrate_directory(str(source_dir))
+    os.remove(source_dir / 'a_pad.txt')
+
+    target = run(monkeypatch, library)
+    assert os.path.exists(os.path.join(os.path.dirname(target), MANIFEST_NAME))
+    config = read_config(target)
+    assert config['crossfade_ms'] == 1500
+    assert gain_from_config(config, target) != 1.0